@@ -27,10 +27,15 @@ class DotDict(dict):
     __delattr__ = dict.__delitem__
 
 class Bugzilla(object):
-    def __init__(self, url, api_key):
+    def __init__(self, url, api_key, timeout=None):
         self.api_key    = api_key
         if (url[-1] != '/'): url = url+'/'
         self.url        = url
+        self.timeout    = timeout
+
+    def get_session(self):
+        '''The object used to send the requests, override to use a pooled requests.Session'''
+        return requests
 
     def quick_search(self, terms):
         '''Wrapper for search_bugs, for simple string searches'''
@@ -116,8 +121,8 @@ class Bugzilla(object):
         '''Generic GET wrapper including the api_key'''
         if (q[-1] == '/'): q = q[:-1]
         headers = {'Content-Type': 'application/json'}
-        r = requests.get('{url}{q}?api_key={key}{params}'.format(url=self.url, q=q, key=self.api_key, params=params),
-                        headers=headers)
+        r = self.get_session().get('{url}{q}?api_key={key}{params}'.format(url=self.url, q=q, key=self.api_key, params=params),
+                        headers=headers, timeout=self.timeout)
         ret = DotDict(r.json())
         if (not r.ok or ('error' in ret and ret.error == True)):
             raise Exception(r.url, r.reason, r.status_code, r.json())
@@ -127,8 +132,8 @@ class Bugzilla(object):
         '''Generic POST wrapper including the api_key'''
         if (q[-1] == '/'): q = q[:-1]
         headers = {'Content-Type': 'application/json'}
-        r = requests.post('{url}{q}?api_key={key}{params}'.format(url=self.url, q=q, key=self.api_key, params=params),
-                        headers=headers, data=payload)
+        r = self.get_session().post('{url}{q}?api_key={key}{params}'.format(url=self.url, q=q, key=self.api_key, params=params),
+                        headers=headers, data=payload, timeout=self.timeout)
         ret = DotDict(r.json())
         if (not r.ok or ('error' in ret and ret.error == True)):
             raise Exception(r.url, r.reason, r.status_code, r.json())
@@ -138,8 +143,8 @@ class Bugzilla(object):
         '''Generic PUT wrapper including the api_key'''
         if (q[-1] == '/'): q = q[:-1]
         headers = {'Content-Type': 'application/json'}
-        r = requests.put('{url}{q}?api_key={key}{params}'.format(url=self.url, q=q, key=self.api_key, params=params),
-                        headers=headers, data=payload)
+        r = self.get_session().put('{url}{q}?api_key={key}{params}'.format(url=self.url, q=q, key=self.api_key, params=params),
+                        headers=headers, data=payload, timeout=self.timeout)
         ret = DotDict(r.json())
         if (not r.ok or ('error' in ret and ret.error == True)):
             raise Exception(r.url, r.reason, r.status_code, r.json())
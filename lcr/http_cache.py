@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HttpCache():
+    '''
+        Disk cache for the content of http responses, keyed by url.
+        Each entry is saved as a json file with the ETag/Last-Modified
+        validators of the response, so that it could be revalidated with
+        If-None-Match/If-Modified-Since when it is expired.
+        Files are evicted in LRU order(by mtime) when the total size
+        is more than max_size bytes.
+    '''
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.total_size = None
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0,          # fresh entry returned without request
+            'revalidated': 0,   # 304 returned for the conditional request
+            'misses': 0,        # no entry or changed on the server
+            'evictions': 0,
+        }
+
+    def get_entry_path(self, url):
+        return os.path.join(self.cache_dir, '%s.json' % hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] = self.stats[name] + 1
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def get(self, url):
+        entry_path = self.get_entry_path(url)
+        try:
+            with open(entry_path) as f_entry:
+                entry = json.load(f_entry)
+            # update mtime for the LRU eviction
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.info("Failed to read cache file %s for %s: %s" % (entry_path, url, e))
+            return None
+
+        if entry.get('url') != url:
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        expires = entry.get('expires')
+        return expires is None or expires > time.time()
+
+    def set(self, url, content, etag=None, last_modified=None, ttl=0):
+        '''
+            ttl: seconds before the entry needs to be revalidated,
+                 None means the entry never expires
+        '''
+        entry = {
+            'url': url,
+            'content': content,
+            'etag': etag,
+            'last_modified': last_modified,
+            'expires': None if ttl is None else time.time() + ttl,
+        }
+        entry_path = self.get_entry_path(url)
+        # the cache directory is shared by the web processes, the commands and the ingest workers
+        tmp_path = '%s.%s.%s.tmp' % (entry_path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            old_size = os.path.getsize(entry_path) if os.path.exists(entry_path) else 0
+            with open(tmp_path, 'w') as f_entry:
+                json.dump(entry, f_entry)
+            os.replace(tmp_path, entry_path)
+            new_size = os.path.getsize(entry_path)
+        except OSError as e:
+            logger.info("Failed to write cache file %s for %s: %s" % (entry_path, url, e))
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return entry
+
+        with self.lock:
+            if self.total_size is not None:
+                self.total_size = self.total_size + new_size - old_size
+        self.evict()
+        return entry
+
+    def touch(self, url, entry, ttl=0):
+        '''
+            Reset the expires time of the entry after it's revalidated
+        '''
+        return self.set(url, entry.get('content'), etag=entry.get('etag'),
+                        last_modified=entry.get('last_modified'), ttl=ttl)
+
+    def evict(self):
+        with self.lock:
+            if self.total_size is not None and self.total_size <= self.max_size:
+                return
+
+            entries = []
+            total_size = 0
+            for entry_name in os.listdir(self.cache_dir):
+                if not entry_name.endswith('.json'):
+                    continue
+                try:
+                    entry_stat = os.stat(os.path.join(self.cache_dir, entry_name))
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_name))
+                total_size = total_size + entry_stat.st_size
+
+            entries.sort()
+            while total_size > self.max_size and len(entries) > 0:
+                mtime, size, entry_name = entries.pop(0)
+                try:
+                    os.unlink(os.path.join(self.cache_dir, entry_name))
+                except FileNotFoundError:
+                    pass
+                total_size = total_size - size
+                self.stats['evictions'] = self.stats['evictions'] + 1
+
+            self.total_size = total_size
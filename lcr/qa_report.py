@@ -4,17 +4,101 @@ from __future__ import unicode_literals
 
 import json
 import logging
+import os
 import re
 import requests
+import threading
+import time
 import yaml
 
 from abc import abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from io import BytesIO, TextIOWrapper, StringIO
+from requests.adapters import HTTPAdapter
 from ruamel.yaml import YAML
-from urllib.parse import urlsplit
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from lcr.http_cache import HttpCache
+from lcr.settings import HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_MAX_BACKOFF, HTTP_TIMEOUT, HTTP_LIST_WORKERS
+from lcr.settings import HTTP_CACHE_ENABLED, HTTP_CACHE_DIR, HTTP_CACHE_MAX_SIZE, HTTP_CACHE_TTLS
 
 logger = logging.getLogger(__name__)
 
+# status codes that are worth to retry, 429 is retried for POST as well,
+# as the request is rejected before being processed by the server
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# one connection pool(HTTPAdapter) shared by all threads for each domain,
+# and one requests.Session per thread for each domain which mounts that pool,
+# as requests.Session itself is not guaranteed to be thread safe
+http_adapters = {}
+http_adapters_lock = threading.Lock()
+http_sessions = threading.local()
+
+if HTTP_CACHE_ENABLED:
+    http_cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_SIZE)
+else:
+    http_cache = None
+
+
+def get_http_adapter(domain):
+    with http_adapters_lock:
+        adapter = http_adapters.get(domain)
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            http_adapters[domain] = adapter
+        return adapter
+
+
+def get_http_session(domain):
+    sessions = getattr(http_sessions, 'sessions', None)
+    if sessions is None:
+        sessions = {}
+        http_sessions.sessions = sessions
+
+    session = sessions.get(domain)
+    if session is None:
+        adapter = get_http_adapter(domain)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        sessions[domain] = session
+    return session
+
+
+def reset_http_sessions():
+    '''
+        Drop the sessions and connection pools inherited from the parent process,
+        connections of the parent process must not be reused in the forked process
+    '''
+    global http_adapters_lock
+    http_adapters_lock = threading.Lock()
+    http_adapters.clear()
+    http_sessions.sessions = {}
+
+
+os.register_at_fork(after_in_child=reset_http_sessions)
+
+
+def get_retry_delay(response, attempt):
+    '''
+        Return seconds to wait before the next attempt,
+        use the Retry-After header when the server specifies it
+    '''
+    delay = HTTP_BACKOFF_FACTOR * (2 ** attempt)
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    return min(max(delay, 0), HTTP_MAX_BACKOFF)
+
 class DotDict(dict):
     '''dict.item notation for dict()'s'''
     __getattr__ = dict.__getitem__
@@ -52,12 +136,40 @@ class ParameterInvalidException(Exception):
 
 
 class RESTFullApi():
-    def __init__(self, domain, api_token, auth=None):
+    def __init__(self, domain, api_token, auth=None, timeout=HTTP_TIMEOUT, max_retries=HTTP_MAX_RETRIES):
         self.domain = domain
         self.api_token = api_token
         self.auth = auth
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def request_with_retry(self, request_url, method='GET', timeout=None, **kwargs):
+        session = get_http_session(self.domain)
+        if timeout is None:
+            timeout = self.timeout
 
-    def call_with_full_url(self, request_url='', method='GET', returnResponse=False, post_data=None):
+        attempt = 0
+        while True:
+            try:
+                r = session.request(method, request_url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # POST requests might be processed already by the server
+                if method != 'GET' or attempt >= self.max_retries:
+                    raise
+                delay = get_retry_delay(None, attempt)
+                logger.info("Failed to request %s: %s, retry in %s seconds" % (request_url, e, delay))
+            else:
+                if r.status_code not in RETRY_STATUS_CODES \
+                        or (method != 'GET' and r.status_code != 429) \
+                        or attempt >= self.max_retries:
+                    return r
+                delay = get_retry_delay(r, attempt)
+                logger.info("Got %s for %s, retry in %s seconds" % (r.status_code, request_url, delay))
+
+            time.sleep(delay)
+            attempt = attempt + 1
+
+    def call_with_full_url(self, request_url='', method='GET', returnResponse=False, post_data=None, timeout=None, extra_headers=None):
         headers = {
                 'Content-Type': 'application/json',
                 }
@@ -65,21 +177,19 @@ class RESTFullApi():
             headers['Authorization'] = 'Token %s' % self.api_token
             headers['Auth-Token'] = self.api_token
             headers['PRIVATE-TOKEN'] = self.api_token
+        if extra_headers:
+            headers.update(extra_headers)
 
         if method == 'GET':
-            r = requests.get(request_url, headers=headers, auth=self.auth)
+            r = self.request_with_retry(request_url, method='GET', timeout=timeout, headers=headers, auth=self.auth)
         else:
             headers['Content-Type'] = 'application/x-www-form-urlencoded'
-            r = requests.post(request_url, headers=headers, data=post_data)
+            r = self.request_with_retry(request_url, method='POST', timeout=timeout, headers=headers, data=post_data)
 
         if returnResponse:
             return r
 
-        if not r.ok and r.status_code == 404:
-            logger.info("url({}) not found".format(request_url))
-            raise UrlNotFoundException(r, url=request_url)
-        elif not r.ok or r.status_code != 200:
-            raise Exception(r.url, r.reason, r.status_code)
+        self.check_response(r, request_url)
 
         if r.content:
             ret = DotDict(r.json())
@@ -87,20 +197,133 @@ class RESTFullApi():
         else:
             return r
 
-    def call_with_api_url(self, api_url='', method='GET', returnResponse=False, post_data=None):
+    def check_response(self, r, request_url):
+        if not r.ok and r.status_code == 404:
+            logger.info("url({}) not found".format(request_url))
+            raise UrlNotFoundException(r, url=request_url)
+        elif not r.ok and r.status_code == 429:
+            raise TooManyRequestException(r, url=request_url)
+        elif not r.ok or r.status_code != 200:
+            raise Exception(r.url, r.reason, r.status_code)
+
+    def get_content_with_cache(self, request_url, ttl=0, is_final=None):
+        '''
+            Return the text content of the url, with the disk cache if enabled.
+            ttl: seconds before the cached content needs to be revalidated,
+                 None means it never expires
+            is_final: function to check the content, the cached content
+                      never expires if it returns True
+        '''
+        if http_cache is None:
+            r = self.call_with_full_url(request_url=request_url, returnResponse=True)
+            self.check_response(r, request_url)
+            return r.text
+
+        entry = http_cache.get(request_url)
+        if entry is not None and http_cache.is_fresh(entry):
+            http_cache.count('hits')
+            return entry.get('content')
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry.get('etag')
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry.get('last_modified')
+
+        r = self.call_with_full_url(request_url=request_url, returnResponse=True, extra_headers=headers)
+        if entry is not None and r.status_code == 304:
+            http_cache.count('revalidated')
+            http_cache.touch(request_url, entry, ttl=ttl)
+            return entry.get('content')
+
+        self.check_response(r, request_url)
+        http_cache.count('misses')
+        content = r.text
+        if is_final is not None and is_final(content):
+            ttl = None
+        http_cache.set(request_url, content,
+                       etag=r.headers.get('ETag'),
+                       last_modified=r.headers.get('Last-Modified'),
+                       ttl=ttl)
+        return content
+
+    def call_with_api_url(self, api_url='', method='GET', returnResponse=False, post_data=None, timeout=None):
         full_url = '%s/%s' % (self.get_api_url_prefix().strip('/'), api_url.strip('/'))
-        return self.call_with_full_url(request_url=full_url, method=method, returnResponse=returnResponse, post_data=post_data)
+        return self.call_with_full_url(request_url=full_url, method=method, returnResponse=returnResponse, post_data=post_data, timeout=timeout)
+
+    def get_list_results(self, api_url='', only_first=False, max_workers=HTTP_LIST_WORKERS):
+        return list(self.iter_list_results(api_url=api_url, only_first=only_first, max_workers=max_workers))
+
+    def get_offset_page_urls(self, first_page):
+        '''
+            Return the urls for all the remaining pages, calculated with
+            the count of the first page and the limit/offset of its next url.
+            None is returned if the api does not use the limit/offset pagination.
+        '''
+        next_url = first_page.get('next')
+        count = first_page.get('count')
+        if not next_url or count is None:
+            return None
 
-    def get_list_results(self, api_url='', only_first=False):
+        url_parts = urlsplit(next_url)
+        query = dict(parse_qsl(url_parts.query))
+        try:
+            limit = int(query.get('limit'))
+            offset = int(query.get('offset'))
+        except (TypeError, ValueError):
+            return None
+        if limit <= 0:
+            return None
+
+        page_urls = []
+        for page_offset in range(offset, count, limit):
+            query['offset'] = page_offset
+            page_urls.append(urlunsplit(url_parts._replace(query=urlencode(query))))
+        return page_urls
+
+    def iter_list_results(self, api_url='', only_first=False, max_workers=HTTP_LIST_WORKERS):
+        '''
+            Yield the items of the list api in order as the pages arrive,
+            so that the caller could stop early without fetching all pages.
+            Pages are fetched with max_workers threads when the total count is
+            returned by the api, otherwise the next urls are followed one by one.
+        '''
         result = self.call_with_api_url(api_url=api_url)
-        list_results = result.get('results')
-        if not only_first:
+        yield from result.get('results')
+        if only_first:
+            return
+
+        page_urls = None
+        if max_workers > 1:
+            page_urls = self.get_offset_page_urls(result)
+
+        if page_urls is None:
             next_url = result.get('next')
             while next_url:
                 result = self.call_with_full_url(request_url=next_url)
                 next_url = result.get('next')
-                list_results.extend(result.get('results'))
-        return list_results
+                yield from result.get('results')
+            return
+
+        page_urls = iter(page_urls)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # only max_workers pages are requested ahead of the page being yielded
+            futures = deque()
+            for page_url in page_urls:
+                futures.append(executor.submit(self.call_with_full_url, request_url=page_url))
+                if len(futures) >= max_workers:
+                    break
+            try:
+                while futures:
+                    result = futures.popleft().result()
+                    page_url = next(page_urls, None)
+                    if page_url is not None:
+                        futures.append(executor.submit(self.call_with_full_url, request_url=page_url))
+                    yield from result.get('results')
+            finally:
+                for future in futures:
+                    future.cancel()
 
     @abstractmethod
     def get_api_url_prefix(sefl):
@@ -192,7 +415,10 @@ class JenkinsApi(RESTFullApi):
         if build_url.find(self.domain) < 0:
             raise UrlNotFoundException(None, url=build_url)
         full_api_url = '%s/api/json/' % build_url
-        return self.call_with_full_url(request_url=full_api_url)
+        content = self.get_content_with_cache(full_api_url,
+                                              ttl=HTTP_CACHE_TTLS.get('jenkins_build'),
+                                              is_final=lambda content: json.loads(content).get('building') is False)
+        return DotDict(json.loads(content))
 
     def get_trigger_from_ci_build(self, jenkins_build):
         logger.info("Try to find the trigger build for build: %s" % jenkins_build.get('url'))
@@ -317,7 +543,7 @@ class LAVAApi(RESTFullApi):
         api_url = "/jobs/%s" % job_id
         return self.call_with_api_url(api_url=api_url)
 
-    def get_job_results(self, job_id=None, lava_config=None):
+    def get_job_results_content(self, job_id=None):
         #url_result_yaml = "https://%s/results/%s/yaml?user=%s&token=%s" % (self.domain, job_id, self.username, self.api_token)
         url_result_yaml = "https://%s/api/v0.2/jobs/%s/yaml/" % (self.domain, job_id)
         r = self.call_with_full_url(request_url=url_result_yaml, returnResponse=True)
@@ -326,7 +552,10 @@ class LAVAApi(RESTFullApi):
         elif not r.ok or r.status_code != 200:
             raise Exception(r.url, r.reason, r.status_code)
 
-        results = yaml.safe_load(r.content)
+        return r.content
+
+    def get_job_results(self, job_id=None, lava_config=None):
+        results = yaml.safe_load(self.get_job_results_content(job_id=job_id))
         return results
 
     def cancel_job(self, lava_job_id=None):
@@ -447,8 +676,12 @@ class QAReportApi(RESTFullApi):
         return "%s/%s" % (group_name, slug)
 
 
+    def get_builds_api_url(self, project_id):
+        return "api/projects/%s/builds" % project_id
+
+
     def get_all_builds(self, project_id, only_first=False, limit=-1):
-        builds_api_url = "api/projects/%s/builds" % project_id
+        builds_api_url = self.get_builds_api_url(project_id)
         if only_first:
             limit = 1
         if limit != -1:
@@ -476,14 +709,17 @@ class QAReportApi(RESTFullApi):
 
 
     def get_build_with_version(self, build_version, project_id):
-        for build in self.get_all_builds(project_id):
+        for build in self.iter_list_results(api_url=self.get_builds_api_url(project_id)):
             if build.get('version') == build_version:
                 return build
         return None
 
 
     def get_build_meta_with_url(self, build_meta_url):
-        return self.call_with_full_url(request_url=build_meta_url)
+        content = self.get_content_with_cache(build_meta_url, ttl=HTTP_CACHE_TTLS.get('build_meta'))
+        if content:
+            return DotDict(json.loads(content))
+        return DotDict()
 
 
     def get_jobs_for_build(self, build_id):
@@ -681,8 +917,8 @@ class QAReportApi(RESTFullApi):
             return job_url
 
     def get_job_definition(self, url_definition=None):
-        response = self.call_with_full_url(request_url=url_definition, returnResponse=True)
-        job_definition = yaml.safe_load(response.content)
+        content = self.get_content_with_cache(url_definition, ttl=HTTP_CACHE_TTLS.get('job_definition'))
+        job_definition = yaml.safe_load(content)
         return job_definition
 
     def get_lkft_qa_report_projects(self, include_archived=False):
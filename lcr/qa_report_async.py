@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import functools
+import logging
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+
+from lcr import qa_report
+from lcr.settings import HTTP_ASYNC_WORKERS, HTTP_ASYNC_CONCURRENCY_PER_HOST
+
+logger = logging.getLogger(__name__)
+
+# semaphores are bound to the event loop where they are used,
+# so keep one set of the per host semaphores for each loop
+host_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_host_semaphore(domain):
+    loop = asyncio.get_running_loop()
+    semaphores = host_semaphores.setdefault(loop, {})
+    semaphore = semaphores.get(domain)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(HTTP_ASYNC_CONCURRENCY_PER_HOST)
+        semaphores[domain] = semaphore
+    return semaphore
+
+
+def run_sync(coroutine):
+    '''
+        Sync facade for the django views and management commands:
+        run the coroutine in a new event loop and return its result
+    '''
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=HTTP_ASYNC_WORKERS)
+    loop.set_default_executor(executor)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+        executor.shutdown(wait=True)
+
+
+class AsyncRESTFullApi():
+    '''
+        asyncio client that mirrors the RESTFullApi instance it wraps.
+        The calls reuse the pooled sessions, retries and cache of lcr.qa_report
+        and run in the executor threads, with the number of concurrent
+        requests to the same host limited by a semaphore.
+    '''
+
+    def __init__(self, api):
+        self.api = api
+
+    async def call(self, func, *args, **kwargs):
+        async with get_host_semaphore(self.api.domain):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class AsyncLAVAApi(AsyncRESTFullApi):
+    def __init__(self, lava_config=None):
+        super().__init__(qa_report.LAVAApi(lava_config=lava_config))
+
+    async def get_job(self, job_id=None):
+        return await self.call(self.api.get_job, job_id=job_id)
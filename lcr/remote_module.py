@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import types
+
+from urllib.parse import urlsplit
+
+from lcr.qa_report import get_http_session
+from lcr.settings import HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteModule():
+    '''
+        Python module loaded from the source file at url, like the androidreportconfig.py on gitlab.
+        The compiled module is kept in memory, and the source is only revalidated with
+        If-None-Match/If-Modified-Since after ttl seconds. The last good source is saved
+        to cache_path, so that the module is still available when the url is not accessible.
+        version is the sha256 of the source that the current module is compiled from.
+    '''
+
+    def __init__(self, module_name, url, cache_path, ttl=600):
+        self.module_name = module_name
+        self.url = url
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self.module = None
+        self.version = None
+        self.etag = None
+        self.last_modified = None
+        self.checked_at = 0
+        # mtime of cache_path when it was loaded or saved by this process,
+        # the copy is loaded again when it's saved by another process,
+        # like the refreshandroidreportconfig command
+        self.cache_mtime = None
+
+    def get_version(self, source):
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def compile_module(self, source):
+        module = types.ModuleType(self.module_name)
+        module.__file__ = self.url
+        exec(compile(source, self.module_name, 'exec'), module.__dict__)
+        return module
+
+    def get_cache_mtime(self):
+        try:
+            return os.stat(self.cache_path).st_mtime
+        except OSError:
+            return None
+
+    def is_cache_changed(self):
+        cache_mtime = self.get_cache_mtime()
+        return cache_mtime is not None and cache_mtime != self.cache_mtime
+
+    def load_from_disk(self):
+        cache_mtime = self.get_cache_mtime()
+        try:
+            with open(self.cache_path) as f_cache:
+                entry = json.load(f_cache)
+            module = self.module
+            if module is None or entry.get('version') != self.version:
+                module = self.compile_module(entry.get('source'))
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.info("Failed to load %s from %s: %s" % (self.module_name, self.cache_path, e))
+            # not loaded again until it's saved again
+            self.cache_mtime = cache_mtime
+            return False
+
+        if self.version is not None and self.version != entry.get('version'):
+            logger.info("%s updated from version %s to %s from %s" % (self.module_name, self.version, entry.get('version'), self.cache_path))
+        self.module = module
+        self.version = entry.get('version')
+        self.etag = entry.get('etag')
+        self.last_modified = entry.get('last_modified')
+        self.checked_at = entry.get('checked_at', 0)
+        self.cache_mtime = cache_mtime
+        return True
+
+    def save_to_disk(self, source):
+        entry = {
+            'url': self.url,
+            'source': source,
+            'version': self.version,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'checked_at': self.checked_at,
+        }
+        tmp_path = '%s.%s.%s.tmp' % (self.cache_path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, 'w') as f_cache:
+                json.dump(entry, f_cache)
+            os.replace(tmp_path, self.cache_path)
+            self.cache_mtime = self.get_cache_mtime()
+        except OSError as e:
+            logger.info("Failed to save %s to %s: %s" % (self.module_name, self.cache_path, e))
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def fetch(self, force=False):
+        '''
+            Get the source from url, and replace the module if the source is changed.
+            The current module is kept if the source could not be fetched or compiled.
+            Return True if the module is replaced.
+        '''
+        headers = {}
+        if not force and self.module is not None:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+
+        r = get_http_session(urlsplit(self.url).netloc).get(self.url, headers=headers, timeout=HTTP_TIMEOUT)
+        self.checked_at = time.time()
+        if r.status_code == 304:
+            return False
+        if not r.ok:
+            raise Exception("Failed to get %s: %s %s" % (self.url, r.status_code, r.reason))
+
+        source = r.text
+        version = self.get_version(source)
+        if version != self.version:
+            module = self.compile_module(source)
+            logger.info("%s updated from version %s to %s" % (self.module_name, self.version, version))
+            self.module = module
+            self.version = version
+        self.etag = r.headers.get('ETag')
+        self.last_modified = r.headers.get('Last-Modified')
+        self.save_to_disk(source)
+        return True
+
+    def is_expired(self):
+        return time.time() - self.checked_at > self.ttl
+
+    def try_fetch(self, force=False):
+        '''
+            fetch with the current module kept when it fails, must be called with lock held
+        '''
+        try:
+            return self.fetch(force=force)
+        except Exception as e:
+            if self.module is None:
+                raise
+            # try again after ttl, the current module is used until then
+            self.checked_at = time.time()
+            logger.error("Failed to refresh %s, version %s is used: %s" % (self.module_name, self.version, e))
+            return False
+
+    def refresh(self, force=False):
+        with self.lock:
+            return self.try_fetch(force=force)
+
+    def get_module(self):
+        '''
+            Return the module, loaded again when the copy on disk is saved by another process,
+            and refreshed from url by only one of the callers after ttl
+        '''
+        if self.module is None or self.is_cache_changed():
+            with self.lock:
+                if self.module is None or self.is_cache_changed():
+                    self.load_from_disk()
+
+        if self.module is None or self.is_expired():
+            with self.lock:
+                # might be refreshed by another caller while waiting for the lock
+                if self.module is None or self.is_expired():
+                    self.try_fetch()
+        return self.module
@@ -43,12 +43,86 @@ irc_botnick = "android-bot" ## TO BE UPDATED
 irc_botpass = "" ## TO BE UPDATED
 
 BUGZILLA_API_KEY = '' ## TO BE UPDATED
+# the LKFT bugs are synced from bugzilla into the database, and pages only read the synced bugs.
+# seconds before the changed bugs are synced again in the background when the bugs are read,
+# the synclkftbugs command could be run by cron as well
+BUGZILLA_SYNC_INTERVAL = 300
+# seconds between the full syncs, which remove the bugs that do not match the search any more
+BUGZILLA_FULL_SYNC_INTERVAL = 24 * 3600
+# (connect timeout, read timeout) in seconds for the bugzilla requests
+BUGZILLA_TIMEOUT = (10, 60)
 
 # old file might be removed from archive.validation.linaro.org already
 # so only list numbers for the recent 20 builds
 BUILD_WITH_JOBS_NUMBER = 10
 BUILD_WITH_BENCHMARK_JOBS_NUMBER = 5
 
+# number of processes used to download and save the job results of a build,
+# set to 1 to save them one by one in the current process
+INGEST_WORKERS = 4
+
+# only save the fail and ASSUMPTION_FAILURE testcases of cts/vts jobs as records in database,
+# results of all the tests are kept in the per job results artifact file beside the result zip file
+TESTCASE_SAVE_FAILURES_ONLY = False
+
+# save the failed testcases of all the jobs of a finished build on the ReportBuild record
+# when the jobs are ingested, so that the failures of the build are listed without querying the testcases
+BUILD_FAILURES_SUMMARY_ENABLED = True
+
+# number of threads shared by the process to get the information of the projects, builds and jobs,
+# and the seconds that each of the tasks could take
+TASK_EXECUTOR_WORKERS = 10
+TASK_TIMEOUT = 600
+
+# queue the jobs to be ingested into the IngestTask table instead of ingesting them
+# in the web requests of the jobs and builds pages, the queued jobs are ingested by the
+# runingestworkers command. the management commands always ingest the jobs themselves.
+# set to False to ingest the jobs in the web requests when no worker is running
+INGEST_QUEUE_ENABLED = True
+# seconds that a claimed task is hidden from the other workers,
+# the task is claimed again after that if the worker did not finish it, like when the worker died
+INGEST_TASK_VISIBILITY_TIMEOUT = 1800
+# times that a task is tried before it's marked as FAILED,
+# and the seconds to wait before the first retry, doubled for each retry after that
+INGEST_TASK_MAX_ATTEMPTS = 5
+INGEST_TASK_RETRY_BACKOFF = 60
+
+# settings for the http connections to qa-reports/jenkins/lava/gitlab
+# number of keep-alive connections kept in the pool for each domain
+HTTP_POOL_SIZE = 20
+# retries for connection errors, 429 and 5xx responses, with exponential backoff
+# HTTP_BACKOFF_FACTOR * (2 ** attempt) seconds, or the value of the Retry-After header
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 1
+HTTP_MAX_BACKOFF = 120
+# (connect timeout, read timeout) in seconds
+HTTP_TIMEOUT = (10, 120)
+# number of pages fetched at the same time for the paginated list apis,
+# set to 1 to follow the next links one by one
+HTTP_LIST_WORKERS = 4
+# threads used by the asyncio client of lcr.qa_report_async,
+# and the number of concurrent requests it sends to the same host
+HTTP_ASYNC_WORKERS = 32
+HTTP_ASYNC_CONCURRENCY_PER_HOST = 10
+
+# disk cache for the qa-reports/jenkins content that is not changed after the build finished,
+# entries are revalidated with If-None-Match/If-Modified-Since after they are expired
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_DIR = os.path.join(DATA_FILE_DIR, "httpcache")
+HTTP_CACHE_MAX_SIZE = 512 * 1024 * 1024 # in bytes
+HTTP_CACHE_TTLS = {
+    # seconds before revalidation, None for never expire
+    'build_meta': 600,
+    'job_definition': None,
+    # jenkins builds never expire once building is false
+    'jenkins_build': 60,
+}
+
+# androidreportconfig.py from gitlab is kept compiled in memory, and revalidated after the ttl seconds,
+# the last good copy is saved in the cache file for when gitlab is not accessible
+ANDROIDREPORTCONFIG_TTL = 600
+ANDROIDREPORTCONFIG_CACHE_PATH = os.path.join(DATA_FILE_DIR, "androidreportconfig.json")
+
 # indicate if the instance is deployed with apache or run as single django instance
 DEPLOYED_WITH_APACHE = False
 
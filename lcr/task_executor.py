@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+from django.db import close_old_connections
+
+from lcr.settings import TASK_EXECUTOR_WORKERS, TASK_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# one executor shared by the whole process, so the number of threads
+# is bounded no matter how many requests or commands use it at the same time
+task_executor = None
+task_executor_lock = threading.Lock()
+# set in the worker threads, tasks started from a task are run in the same thread
+# instead of waiting for a free worker, which might never come when all workers wait
+worker_state = threading.local()
+
+
+def get_task_executor():
+    global task_executor
+    with task_executor_lock:
+        if task_executor is None:
+            task_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TASK_EXECUTOR_WORKERS,
+                                                                  thread_name_prefix='lcr-task',
+                                                                  initializer=mark_worker_thread)
+        return task_executor
+
+
+def mark_worker_thread():
+    worker_state.is_worker = True
+
+
+def reset_task_executor():
+    '''
+        The threads of the executor are not there in the forked process
+    '''
+    global task_executor, task_executor_lock
+    task_executor = None
+    task_executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_task_executor)
+
+
+class Task():
+    '''
+        func(element) run by the executor, with the result or the exception captured
+    '''
+
+    def __init__(self, func, element, name=None):
+        self.func = func
+        self.element = element
+        self.name = name or getattr(func, '__name__', str(func))
+        self.result = None
+        self.exception = None
+        self.timed_out = False
+        self.started_at = None
+        self.duration = None
+
+    def run(self):
+        self.started_at = time.time()
+        # the database connections are per thread, and would not be closed by django
+        # for the threads that are not handling requests
+        close_old_connections()
+        try:
+            self.result = self.func(self.element)
+        except Exception as e:
+            self.exception = e
+            logger.exception("Task %s failed for %s" % (self.name, self.element))
+        finally:
+            close_old_connections()
+            self.duration = time.time() - self.started_at
+            logger.info("Task %s finished in %.2f seconds" % (self.name, self.duration))
+        return self
+
+    def failed(self):
+        return self.exception is not None or self.timed_out
+
+
+def map_tasks(func, elements=[], timeout=TASK_TIMEOUT, name=None):
+    '''
+        Run func(element) for each element with the shared executor, a free worker
+        takes the next element once it finishes the previous one.
+        timeout: seconds that each task could run, the task is reported as timed out
+                 after that, but it keeps the worker until it returns
+        Return the list of Task in the same order as elements, with the result, exception
+        and timed_out set. Exceptions are not raised here.
+    '''
+    tasks = [Task(func, element, name=name) for element in elements]
+    if len(tasks) == 0:
+        return tasks
+
+    if getattr(worker_state, 'is_worker', False):
+        for task in tasks:
+            task.run()
+        return tasks
+
+    start_time = time.time()
+    executor = get_task_executor()
+    future_tasks = {executor.submit(task.run): task for task in tasks}
+    pending = set(future_tasks.keys())
+    while len(pending) > 0:
+        done, pending = concurrent.futures.wait(pending, timeout=min(timeout, 1), return_when=concurrent.futures.FIRST_COMPLETED)
+        now = time.time()
+        for future in list(pending):
+            task = future_tasks.get(future)
+            if task.started_at is not None and now - task.started_at > timeout:
+                task.timed_out = True
+                pending.discard(future)
+                logger.error("Task %s timed out after %d seconds for %s" % (task.name, timeout, task.element))
+
+    number_failed = len([task for task in tasks if task.failed()])
+    logger.info("Finished %d tasks of %s in %.2f seconds, %d failed" % (len(tasks), tasks[0].name, time.time() - start_time, number_failed))
+    return tasks
+
+
+def submit_task(func, element, name=None):
+    '''
+        Run func(element) with the shared executor without waiting for it,
+        like the ingestion of a job queued by a callback request.
+        Return the future of the Task, exceptions are logged by the Task.
+    '''
+    task = Task(func, element, name=name)
+    if getattr(worker_state, 'is_worker', False):
+        future = concurrent.futures.Future()
+        future.set_result(task.run())
+        return future
+    return get_task_executor().submit(task.run)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class BugSummaryIndex():
+    '''
+        Index of the bugs with the keys in the "<key> failed" parts of the bug summaries,
+        like "CtsXXXTestCases android.xxx.XXXTest#testXXX failed", so that the bugs for
+        a failure are found with dict lookups instead of matching every bug summary.
+        The keys are the same as what r'\b(<key>)\s+failed\b' would match, that is,
+        every substring that starts at a word boundary and ends before the " failed".
+        The bugs for each key are kept in the same order as the bugs passed in.
+    '''
+    rx_failed = re.compile(r'\s+failed\b')
+
+    def __init__(self, bugs=[]):
+        self.bugs_by_key = {}
+        for bug in bugs:
+            self.add(bug)
+
+    def add(self, bug):
+        summary = bug.summary
+        if not summary:
+            return
+        for m in self.rx_failed.finditer(summary):
+            end = m.start()
+            for start in range(end):
+                # same as \b before the key
+                is_word_start = is_word_char(summary[start])
+                is_word_before = start > 0 and is_word_char(summary[start - 1])
+                if is_word_start == is_word_before:
+                    continue
+                bugs = self.bugs_by_key.setdefault(summary[start:end], [])
+                if len(bugs) == 0 or bugs[-1] is not bug:
+                    bugs.append(bug)
+
+    def get_bugs(self, key):
+        '''
+            Return the list of bugs that have "<key> failed" in the summary
+        '''
+        return self.bugs_by_key.get(key, [])
+
+    def find_bug(self, keys=[]):
+        '''
+            Return the first bug found for the keys, checked in the order of keys
+        '''
+        for key in keys:
+            bugs = self.get_bugs(key)
+            if len(bugs) > 0:
+                return bugs[0]
+        return None
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import logging
+import threading
+
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from lcr.bugzilla import DotDict
+from lcr.settings import BUGZILLA_SYNC_INTERVAL, BUGZILLA_FULL_SYNC_INTERVAL
+
+from .models import LKFTBug, LKFTBugSync
+
+logger = logging.getLogger(__name__)
+
+BUGZILLA_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# fields of LKFTBug updated when the bug is synced again
+BUG_SYNC_FIELDS = ['summary', 'status', 'resolution', 'version', 'platform', 'last_change_time', 'data']
+
+# only one sync is run in the background for each process
+background_sync_lock = threading.Lock()
+
+
+def get_bugzilla_datetime(datetime_str):
+    if not datetime_str:
+        return None
+    return datetime.datetime.strptime(datetime_str, BUGZILLA_DATETIME_FORMAT).replace(tzinfo=datetime.timezone.utc)
+
+
+def get_sync_state():
+    sync_state = LKFTBugSync.objects.order_by('id').first()
+    if sync_state is None:
+        sync_state = LKFTBugSync()
+    return sync_state
+
+
+def sync_bugs(bugzilla_instance, terms=[], full=False):
+    '''
+        Sync the bugs found with the search terms from bugzilla into the LKFTBug table.
+        Only the bugs changed since the last sync are searched, unless full is True
+        or the bugs have not been fully synced before. The full sync removes the bugs
+        that are not found with the terms any more, like bugs with the LKFT keyword removed.
+        Return the number of bugs synced.
+    '''
+    sync_state = get_sync_state()
+    sync_started_at = timezone.now()
+    full = full or sync_state.full_synced_at is None
+
+    # search_bugs pops the items of the terms
+    search_terms = [dict(term) for term in terms]
+    if not full:
+        last_change_time = LKFTBug.objects.aggregate(Max('last_change_time')).get('last_change_time__max')
+        if last_change_time is not None:
+            # bugs changed at this time or later
+            search_terms.append({'last_change_time': last_change_time.astimezone(datetime.timezone.utc).strftime(BUGZILLA_DATETIME_FORMAT)})
+
+    bugs = bugzilla_instance.search_bugs(search_terms).bugs
+    records = []
+    for bug in bugs:
+        records.append(LKFTBug(bug_id=bug.get('id'),
+                               summary=(bug.get('summary') or '')[:512],
+                               status=bug.get('status'),
+                               resolution=bug.get('resolution'),
+                               version=bug.get('version'),
+                               platform=bug.get('platform'),
+                               last_change_time=get_bugzilla_datetime(bug.get('last_change_time')),
+                               data=bug))
+    if len(records) > 0:
+        LKFTBug.objects.bulk_create(records, update_conflicts=True, unique_fields=['bug_id'], update_fields=BUG_SYNC_FIELDS, batch_size=1000)
+
+    if full:
+        LKFTBug.objects.exclude(bug_id__in=[record.bug_id for record in records]).delete()
+        sync_state.full_synced_at = sync_started_at
+    sync_state.synced_at = sync_started_at
+    sync_state.save()
+
+    logger.info("Synced %d bugs from bugzilla, full sync: %s" % (len(records), full))
+    return len(records)
+
+
+def sync_bugs_in_background(bugzilla_instance, terms=[], full=False):
+    if not background_sync_lock.acquire(blocking=False):
+        # already syncing
+        return
+
+    def run_sync():
+        try:
+            sync_bugs(bugzilla_instance, terms=terms, full=full)
+        except Exception as e:
+            # the bugs synced before are still used when bugzilla is not available
+            logger.error("Failed to sync bugs from bugzilla: %s" % e)
+        finally:
+            # the thread has its own database connection
+            connection.close()
+            background_sync_lock.release()
+
+    threading.Thread(target=run_sync, name="lkft-bug-sync", daemon=True).start()
+
+
+def sync_bugs_if_stale(bugzilla_instance, terms=[]):
+    '''
+        Sync the bugs in the background when they are out of date,
+        the bugs are only synced in the current thread when they have never been synced
+    '''
+    sync_state = get_sync_state()
+    if sync_state.full_synced_at is None:
+        try:
+            sync_bugs(bugzilla_instance, terms=terms, full=True)
+        except Exception as e:
+            logger.error("Failed to sync bugs from bugzilla: %s" % e)
+        return
+
+    now = timezone.now()
+    if (now - sync_state.full_synced_at).total_seconds() > BUGZILLA_FULL_SYNC_INTERVAL:
+        sync_bugs_in_background(bugzilla_instance, terms=terms, full=True)
+    elif sync_state.synced_at is None or (now - sync_state.synced_at).total_seconds() > BUGZILLA_SYNC_INTERVAL:
+        sync_bugs_in_background(bugzilla_instance, terms=terms)
+
+
+def mark_bugs_stale():
+    '''
+        Have the bugs synced again the next time they are read, like when a new bug is filed
+    '''
+    LKFTBugSync.objects.update(synced_at=None)
+
+
+def get_bugs(summary_keyword=None, platform=None):
+    '''
+        Return the synced bugs as DotDict like the ones returned by bugzilla,
+        with summary_keyword in the summary and on the platform if specified, sorted by the summary
+    '''
+    records = LKFTBug.objects.all()
+    if platform is not None:
+        records = records.filter(platform=platform)
+
+    bugs = []
+    for bug_data in records.values_list('data', flat=True):
+        bug = DotDict(bug_data)
+        # the LIKE of sqlite is case insensitive, so check the keyword here
+        if summary_keyword is not None and bug.get('summary').find(summary_keyword) < 0:
+            continue
+        bugs.append(bug)
+
+    def get_bug_summary(item):
+        return item.get('summary')
+
+    return sorted(bugs, key=get_bug_summary)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import itertools
+import logging
+import re
+
+from django.db import connection
+from django.db.models.functions import MD5
+
+from lcr.settings import DB_USE_POSTGRES
+
+from .models import TestCase, TestName
+
+logger = logging.getLogger(__name__)
+
+# fields of the rows passed to load_testcases, in order
+TESTCASE_FIELDS = ('name', 'result', 'measurement', 'unit', 'suite', 'job_id', 'lava_nick', 'testsuite', 'message', 'stacktrace')
+# fields filled by load_testcases with the ids of TestName for the name and suite
+TESTCASE_INTERNED_FIELDS = ('interned_name', 'interned_suite')
+# fields filled by load_testcases with the values derived from the row
+TESTCASE_DERIVED_FIELDS = ('normalized_suite',)
+
+# rows saved for each batch, the names of the rows in one batch
+# are resolved to TestName ids before the rows are saved
+LOAD_BATCH_SIZE = 100000
+# rows for each executemany call when COPY is not available(sqlite)
+EXECUTEMANY_BATCH_SIZE = 10000
+# size of the data passed to COPY each time
+COPY_CHUNK_SIZE = 1024 * 1024
+# number of names kept in the TestNameCache
+TEST_NAME_CACHE_SIZE = 500000
+
+
+class TestNameCache():
+    '''
+        In-memory cache of the TestName ids for the names,
+        names not cached are looked up or created in batch
+    '''
+
+    def __init__(self, max_size=TEST_NAME_CACHE_SIZE):
+        self.max_size = max_size
+        self.name_ids = {}
+
+    def resolve(self, names):
+        '''
+            Make sure the ids for the names are cached,
+            return the dict of name to id for all the names
+        '''
+        names = set(names)
+        names.discard(None)
+        missing_names = [name for name in names if name not in self.name_ids]
+        if len(missing_names) > 0:
+            if len(self.name_ids) + len(missing_names) > self.max_size:
+                # simply start again, the names of the current batch are added back below
+                self.name_ids = {}
+                missing_names = list(names)
+            for i in range(0, len(missing_names), EXECUTEMANY_BATCH_SIZE):
+                batch_names = missing_names[i:i + EXECUTEMANY_BATCH_SIZE]
+                # names might be created by other processes at the same time
+                TestName.objects.bulk_create([TestName(name=name) for name in batch_names], ignore_conflicts=True)
+                self.name_ids.update(TestName.objects.filter(name__in=batch_names).values_list('name', 'id'))
+        return {name: self.name_ids.get(name) for name in names}
+
+
+test_name_cache = TestNameCache()
+
+
+def normalize_suite(suite):
+    '''
+        Remove the index prefix like "0_" that LAVA adds to the suite name
+    '''
+    if suite is None:
+        return None
+    return re.sub(r'^\d+_', '', suite)
+
+
+def get_testcase_columns():
+    return [TestCase._meta.get_field(field_name).column for field_name in TESTCASE_FIELDS + TESTCASE_INTERNED_FIELDS + TESTCASE_DERIVED_FIELDS]
+
+
+def copy_value(value):
+    # https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.2
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class CopyRowsReader():
+    '''
+        File-like object that returns the rows in the text format of COPY,
+        the rows are only converted when they are read by the COPY command
+    '''
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+        self.number_rows = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = COPY_CHUNK_SIZE
+        lines = [self.buffer]
+        length = len(self.buffer)
+        while length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = '%s\n' % '\t'.join([copy_value(value) for value in row])
+            lines.append(line)
+            length = length + len(line)
+            self.number_rows = self.number_rows + 1
+        data = ''.join(lines)
+        self.buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def load_testcases(rows, name_cache=test_name_cache):
+    '''
+        Save the testcase rows into the lkft_testcase table without model instances.
+        rows: iterable of tuples with values for TESTCASE_FIELDS, where testsuite
+              is the id of the TestSuite record, could be a generator
+        name_cache: TestNameCache used to resolve the name and suite to TestName ids
+        Return the number of rows saved.
+    '''
+    index_name = TESTCASE_FIELDS.index('name')
+    index_suite = TESTCASE_FIELDS.index('suite')
+    table = TestCase._meta.db_table
+    columns = get_testcase_columns()
+    rows = iter(rows)
+    number_rows = 0
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(itertools.islice(rows, LOAD_BATCH_SIZE))
+            if not batch:
+                break
+            # resolve the names before COPY, as no other query could be run during COPY
+            name_ids = name_cache.resolve([row[index_name] for row in batch] + [row[index_suite] for row in batch])
+            batch_rows = (tuple(row) + (name_ids.get(row[index_name]), name_ids.get(row[index_suite]), normalize_suite(row[index_suite])) for row in batch)
+
+            if DB_USE_POSTGRES:
+                # the rows are streamed to the server, with only one chunk in memory
+                reader = CopyRowsReader(batch_rows)
+                sql_copy = 'COPY %s (%s) FROM STDIN' % (table, ', '.join(columns))
+                cursor.copy_expert(sql_copy, reader, size=COPY_CHUNK_SIZE)
+                number_rows = number_rows + reader.number_rows
+                continue
+
+            sql_insert = 'INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(columns), ', '.join(['%s'] * len(columns)))
+            while True:
+                insert_rows = list(itertools.islice(batch_rows, EXECUTEMANY_BATCH_SIZE))
+                if not insert_rows:
+                    break
+                cursor.executemany(sql_insert, insert_rows)
+                number_rows = number_rows + len(insert_rows)
+    return number_rows
+
+
+def normalize_value(value):
+    if value is None:
+        return None
+    return str(value)
+
+
+def hash_value(value):
+    '''
+        Return the same md5 hex digest as the MD5 database function, None for None
+    '''
+    if value is None:
+        return None
+    return hashlib.md5(str(value).encode('utf-8')).hexdigest()
+
+
+class TestCaseSync():
+    '''
+        Apply the new testcase rows to the existing records, so that only the
+        changed records are inserted, updated or deleted, instead of deleting
+        all the records and inserting them again.
+        existing_testcases: queryset of the records to be synced, like the records of one module
+        key_fields: fields of TESTCASE_FIELDS to match the new rows with the existing records
+    '''
+    compare_fields = ('result', 'measurement', 'unit')
+    # compared with the md5 computed by the database,
+    # so that the long messages and stacktraces are not loaded for all the records
+    compare_hash_fields = ('message', 'stacktrace')
+
+    def __init__(self, existing_testcases, key_fields=('name',)):
+        self.key_fields = key_fields
+        self.key_indexes = [TESTCASE_FIELDS.index(field_name) for field_name in key_fields]
+        self.compare_indexes = [TESTCASE_FIELDS.index(field_name) for field_name in self.compare_fields]
+        self.compare_hash_indexes = [TESTCASE_FIELDS.index(field_name) for field_name in self.compare_hash_fields]
+        self.update_fields = self.compare_fields + self.compare_hash_fields
+        self.update_indexes = self.compare_indexes + self.compare_hash_indexes
+        self.number_inserted = 0
+        self.number_updated = 0
+        self.number_deleted = 0
+
+        hash_annotations = dict([('%s_hash' % field_name, MD5(field_name)) for field_name in self.compare_hash_fields])
+        # tests with the same name might be there, so keep a list for each key
+        self.existing = {}
+        for record in existing_testcases.annotate(**hash_annotations) \
+                .values_list('id', *(self.key_fields + self.compare_fields + tuple(hash_annotations.keys()))):
+            key = tuple(record[1:len(self.key_fields) + 1])
+            values = tuple([normalize_value(value) for value in record[len(self.key_fields) + 1:]])
+            self.existing.setdefault(key, []).append((record[0], values))
+
+    def get_values(self, row):
+        return tuple([normalize_value(row[index]) for index in self.compare_indexes] +
+                     [hash_value(row[index]) for index in self.compare_hash_indexes])
+
+    def apply(self, rows):
+        rows_to_insert = []
+        testcases_to_update = []
+        for row in rows:
+            key = tuple([row[index] for index in self.key_indexes])
+            values = self.get_values(row)
+            records = self.existing.get(key)
+            if not records:
+                rows_to_insert.append(row)
+                continue
+
+            (testcase_id, existing_values) = records.pop()
+            if len(records) == 0:
+                del self.existing[key]
+            if existing_values != values:
+                testcase = TestCase(id=testcase_id)
+                for field_name, index in zip(self.update_fields, self.update_indexes):
+                    setattr(testcase, field_name, row[index])
+                testcases_to_update.append(testcase)
+
+        if len(rows_to_insert) > 0:
+            self.number_inserted = self.number_inserted + load_testcases(rows_to_insert)
+        if len(testcases_to_update) > 0:
+            TestCase.objects.bulk_update(testcases_to_update, self.update_fields, batch_size=EXECUTEMANY_BATCH_SIZE)
+            self.number_updated = self.number_updated + len(testcases_to_update)
+
+    def finish(self):
+        '''
+            Delete the existing records that are not in the new rows
+        '''
+        ids_to_delete = [testcase_id for records in self.existing.values() for (testcase_id, values) in records]
+        for i in range(0, len(ids_to_delete), EXECUTEMANY_BATCH_SIZE):
+            TestCase.objects.filter(id__in=ids_to_delete[i:i + EXECUTEMANY_BATCH_SIZE]).delete()
+        self.number_deleted = self.number_deleted + len(ids_to_delete)
+        self.existing = {}
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from lcr.settings import INGEST_TASK_VISIBILITY_TIMEOUT, INGEST_TASK_MAX_ATTEMPTS, INGEST_TASK_RETRY_BACKOFF
+
+from .models import IngestTask, ReportJob
+
+logger = logging.getLogger(__name__)
+
+# the callbacks for the finished jobs are ingested before the jobs queued by the pages
+PRIORITY_CALLBACK = 20
+PRIORITY_VIEW = 10
+PRIORITY_DEFAULT = 0
+
+ACTIVE_STATUSES = ['QUEUED', 'RUNNING']
+
+# lava_config has the token of the lava server, and is set again when the job is ingested
+JOB_FIELDS_NOT_QUEUED = ['lava_config']
+
+
+def get_worker_name(index=0):
+    return "%s:%s:%s" % (socket.gethostname(), os.getpid(), index)
+
+
+def enqueue_jobs(jobs=[], priority=PRIORITY_DEFAULT, fetch_latest=False):
+    '''
+        Queue the jobs from qa-report to be ingested by the runingestworkers command,
+        jobs that are queued or being ingested already are not queued again,
+        but the priority of the queued ones is raised if needed.
+        Return the set of the job urls that are queued or being ingested.
+    '''
+    jobs_to_queue = {}
+    for job in jobs:
+        if job.get('external_url') is None:
+            continue
+        jobs_to_queue.setdefault(job.get('external_url'), job)
+    if len(jobs_to_queue) == 0:
+        return set()
+
+    # the tasks queued by enqueue_qa_job have no job_url until the worker fetches the job
+    qa_job_urls = {str(job.get('id')): job_url for job_url, job in jobs_to_queue.items() if job.get('id') is not None}
+    active_tasks = IngestTask.objects.filter(Q(job_url__in=list(jobs_to_queue.keys())) | Q(job_url__isnull=True, qa_job_id__in=list(qa_job_urls.keys())),
+                                             status__in=ACTIVE_STATUSES)
+    active_job_urls = set()
+    for (job_url, qa_job_id) in active_tasks.values_list('job_url', 'qa_job_id'):
+        active_job_urls.add(job_url if job_url is not None else qa_job_urls.get(str(qa_job_id)))
+    active_tasks.filter(status='QUEUED', priority__lt=priority).update(priority=priority)
+
+    new_tasks = []
+    for job_url, job in jobs_to_queue.items():
+        if job_url in active_job_urls:
+            continue
+        payload = {key: value for key, value in job.items() if key not in JOB_FIELDS_NOT_QUEUED}
+        new_tasks.append(IngestTask(qa_job_id=job.get('id'),
+                                    job_url=job_url,
+                                    job=payload,
+                                    fetch_latest=fetch_latest,
+                                    priority=priority))
+    if len(new_tasks) > 0:
+        IngestTask.objects.bulk_create(new_tasks, batch_size=1000)
+        logger.info("Queued %d jobs to be ingested" % len(new_tasks))
+
+    return set(jobs_to_queue.keys())
+
+
+def enqueue_qa_job(qa_job_id, priority=PRIORITY_CALLBACK):
+    '''
+        Queue the job with only the qa-report job id, the job is fetched from qa-report by the worker.
+        Return False if the job is queued or being ingested already.
+    '''
+    active_tasks = IngestTask.objects.filter(qa_job_id=qa_job_id, status__in=ACTIVE_STATUSES)
+    if active_tasks.exists():
+        active_tasks.filter(status='QUEUED', priority__lt=priority).update(priority=priority)
+        return False
+    IngestTask.objects.create(qa_job_id=qa_job_id, fetch_latest=True, priority=priority)
+    return True
+
+
+def set_task_job_url(task, job):
+    '''
+        Save the url of the job fetched by the worker for the task queued with only
+        the qa-report job id, so that the job is found by get_ingesting_job_urls and enqueue_jobs.
+        Return False if the task is not claimed by the worker any more
+    '''
+    task.job_url = job.get('external_url')
+    return update_claimed_task(task, job_url=task.job_url)
+
+
+def get_ingesting_job_urls(job_urls=[]):
+    '''
+        Return the set of the job urls that are queued or being ingested
+    '''
+    if len(job_urls) == 0:
+        return set()
+    return set(IngestTask.objects.filter(job_url__in=job_urls, status__in=ACTIVE_STATUSES).values_list('job_url', flat=True))
+
+
+def get_ingesting_report_build_ids(report_build_ids=[]):
+    '''
+        Return the set of the ReportBuild ids that have jobs queued or being ingested
+    '''
+    if len(report_build_ids) == 0:
+        return set()
+    active_job_urls = IngestTask.objects.filter(status__in=ACTIVE_STATUSES).values('job_url')
+    return set(ReportJob.objects.filter(report_build_id__in=report_build_ids, job_url__in=active_job_urls)
+                    .values_list('report_build_id', flat=True).distinct())
+
+
+def claim_tasks(worker_name, limit=1, visibility_timeout=INGEST_TASK_VISIBILITY_TIMEOUT):
+    '''
+        Claim the queued tasks with the highest priority, and the running tasks that were
+        not finished before claimed_until, like when the worker was killed.
+        The rows are locked with SELECT ... FOR UPDATE SKIP LOCKED when the database supports it,
+        so that workers on different hosts never claim the same task.
+    '''
+    now = timezone.now()
+    claimed_tasks = []
+    with transaction.atomic():
+        tasks = IngestTask.objects.filter(Q(status='QUEUED', run_after__lte=now) | Q(status='RUNNING', claimed_until__lt=now)) \
+                    .order_by('-priority', 'run_after', 'id')
+        tasks = tasks.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+        tasks = list(tasks[:limit])
+        for task in tasks:
+            # not set by bulk_update
+            task.updated_at = now
+            if task.status == 'RUNNING':
+                logger.info("Task %s claimed by %s was not finished before %s" % (task.id, task.claimed_by, task.claimed_until))
+                if task.attempts >= INGEST_TASK_MAX_ATTEMPTS:
+                    task.status = 'FAILED'
+                    task.last_error = "Not finished in %d seconds by %s" % (visibility_timeout, task.claimed_by)
+                    task.claimed_by = None
+                    task.claimed_until = None
+                    continue
+            task.status = 'RUNNING'
+            task.attempts = task.attempts + 1
+            task.claimed_by = worker_name
+            task.claimed_until = now + datetime.timedelta(seconds=visibility_timeout)
+            claimed_tasks.append(task)
+
+        if len(tasks) > 0:
+            IngestTask.objects.bulk_update(tasks, ['status', 'attempts', 'claimed_by', 'claimed_until', 'last_error', 'updated_at'])
+
+    return claimed_tasks
+
+
+def update_claimed_task(task, **fields):
+    '''
+        Update the task only when it's still claimed by the same worker,
+        it might be claimed by another worker already after the visibility timeout.
+    '''
+    fields['updated_at'] = timezone.now()
+    number_updated = IngestTask.objects.filter(id=task.id, status='RUNNING', claimed_by=task.claimed_by, attempts=task.attempts).update(**fields)
+    if number_updated == 0:
+        logger.info("Task %s is not claimed by %s any more" % (task.id, task.claimed_by))
+    return number_updated > 0
+
+
+def finish_task(task):
+    return update_claimed_task(task, status='DONE', claimed_until=None, last_error=None)
+
+
+def retry_task(task, error):
+    '''
+        Queue the task again with the retry delay doubled for each attempt,
+        or mark it as FAILED when it has been tried INGEST_TASK_MAX_ATTEMPTS times
+    '''
+    if task.attempts >= INGEST_TASK_MAX_ATTEMPTS:
+        logger.error("Task %s for job %s failed after %d attempts: %s" % (task.id, task.qa_job_id, task.attempts, error))
+        return update_claimed_task(task, status='FAILED', claimed_until=None, last_error=error)
+
+    delay = INGEST_TASK_RETRY_BACKOFF * (2 ** (task.attempts - 1))
+    logger.info("Task %s for job %s will be tried again in %d seconds: %s" % (task.id, task.qa_job_id, delay, error))
+    return update_claimed_task(task, status='QUEUED', claimed_until=None, last_error=error,
+                               run_after=timezone.now() + datetime.timedelta(seconds=delay))
+
+
+def delete_finished_tasks(days=7):
+    '''
+        Delete the DONE and FAILED tasks not updated in the last days
+    '''
+    updated_before = timezone.now() - datetime.timedelta(days=days)
+    number_deleted, _ = IngestTask.objects.filter(status__in=['DONE', 'FAILED'], updated_at__lt=updated_before).delete()
+    return number_deleted
+
+
+def extend_claim(task, visibility_timeout=INGEST_TASK_VISIBILITY_TIMEOUT):
+    task.claimed_until = timezone.now() + datetime.timedelta(seconds=visibility_timeout)
+    return update_claimed_task(task, claimed_until=task.claimed_until)
+
+
+def start_heartbeat(task, visibility_timeout=INGEST_TASK_VISIBILITY_TIMEOUT):
+    '''
+        Push claimed_until of the task forward every third of visibility_timeout,
+        so that a task that takes longer than visibility_timeout, like the CTS jobs,
+        is not claimed by another worker while it's still being ingested.
+        Return the event to be set to stop the heartbeat.
+    '''
+    stopped = threading.Event()
+
+    def heartbeat():
+        try:
+            while not stopped.wait(max(visibility_timeout // 3, 1)):
+                try:
+                    if not extend_claim(task, visibility_timeout=visibility_timeout):
+                        return
+                except Exception as e:
+                    logger.error("Failed to extend the claim of task %s: %s" % (task.id, e))
+        finally:
+            # the heartbeat thread has its own database connection
+            connection.close()
+
+    thread = threading.Thread(target=heartbeat, name="ingest-heartbeat-%s" % task.id, daemon=True)
+    thread.start()
+    return stopped
+
+
+def run_task(task, handler):
+    # the tasks claimed in the same batch wait for the ones before them,
+    # and might be claimed by another worker after the visibility timeout
+    if not extend_claim(task):
+        return False
+    stopped = start_heartbeat(task)
+    try:
+        handler(task)
+    except Exception as e:
+        stopped.set()
+        logger.exception("Failed to ingest job %s for task %s" % (task.qa_job_id, task.id))
+        return retry_task(task, str(e))
+    stopped.set()
+    return finish_task(task)
+
+
+def run_worker(handler, worker_name, batch_size=1, poll_interval=5, exit_when_empty=False):
+    '''
+        Claim the tasks and run handler(task) for them until there is no task
+        when exit_when_empty is True, or forever otherwise.
+        A task is tried again later when handler raises an exception.
+        Return the number of tasks run.
+    '''
+    number_run = 0
+    while True:
+        try:
+            tasks = claim_tasks(worker_name, limit=batch_size)
+        except Exception as e:
+            # like the database is restarted
+            logger.error("Worker %s failed to claim tasks: %s" % (worker_name, e))
+            connection.close()
+            tasks = []
+
+        if len(tasks) == 0:
+            if exit_when_empty:
+                return number_run
+            time.sleep(poll_interval)
+            continue
+
+        for task in tasks:
+            run_task(task, handler)
+            number_run = number_run + 1
@@ -0,0 +1,41 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from lkft.bulkload import normalize_suite
+from lkft.models import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Fill the normalized_suite field for the TestCase records saved before it was added'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size",
+                            help="Specify the range of TestCase ids updated each time",
+                            dest="batch_size",
+                            type=int,
+                            default=100000,
+                            required=False)
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+        id_range = TestCase.objects.filter(normalized_suite__isnull=True).aggregate(min_id=Min('id'), max_id=Max('id'))
+        min_id = id_range.get('min_id')
+        max_id = id_range.get('max_id')
+        if min_id is None:
+            logger.info("All TestCase records have the normalized suite already")
+            return
+
+        number_updated = 0
+        for start_id in range(min_id, max_id + 1, batch_size):
+            end_id = start_id + batch_size - 1
+            testcases = TestCase.objects.filter(id__gte=start_id, id__lte=end_id, normalized_suite__isnull=True)
+            # only a few suites for each job, so update the records suite by suite
+            for suite in testcases.values_list('suite', flat=True).distinct():
+                number_updated = number_updated + testcases.filter(suite=suite).update(normalized_suite=normalize_suite(suite))
+            logger.info("Updated TestCase records with id in [%d, %d], %d updated in total" % (start_id, end_id, number_updated))
@@ -0,0 +1,34 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from lkft.models import ReportProject
+from lkft.views import update_project_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Create the snapshots of the projects that do not have one yet, like the projects saved before ReportProjectSnapshot was added, \
+            the matrix and projects pages show no numbers for the projects without a snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all",
+                            help="Update the snapshots of all the projects, not only the missing ones",
+                            dest="all",
+                            action='store_true',
+                            default=False,
+                            required=False)
+
+    def handle(self, *args, **options):
+        db_report_projects = ReportProject.objects.order_by('id')
+        if not options.get('all'):
+            db_report_projects = db_report_projects.filter(snapshot__isnull=True)
+
+        number_updated = 0
+        for db_report_project in db_report_projects:
+            update_project_snapshot(db_report_project)
+            number_updated = number_updated + 1
+        logger.info("Updated the snapshots of %d projects" % number_updated)
@@ -0,0 +1,50 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+## https://docs.djangoproject.com/en/dev/ref/models/expressions/#subquery-expressions
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from lkft.bulkload import test_name_cache
+from lkft.models import TestCase, TestName
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Fill the interned_name and interned_suite fields for the TestCase records saved before TestName was added'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size",
+                            help="Specify the range of TestCase ids updated each time",
+                            dest="batch_size",
+                            type=int,
+                            default=100000,
+                            required=False)
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+        id_range = TestCase.objects.filter(interned_name__isnull=True).aggregate(min_id=Min('id'), max_id=Max('id'))
+        min_id = id_range.get('min_id')
+        max_id = id_range.get('max_id')
+        if min_id is None:
+            logger.info("All TestCase records have the interned names already")
+            return
+
+        number_updated = 0
+        for start_id in range(min_id, max_id + 1, batch_size):
+            end_id = start_id + batch_size - 1
+            testcases = TestCase.objects.filter(id__gte=start_id, id__lte=end_id, interned_name__isnull=True)
+            names = set()
+            for name, suite in testcases.values_list('name', 'suite').distinct():
+                names.add(name)
+                names.add(suite)
+            if len(names) == 0:
+                continue
+            test_name_cache.resolve(names)
+
+            number_updated = number_updated + testcases.update(
+                    interned_name=Subquery(TestName.objects.filter(name=OuterRef('name')).values('id')[:1]),
+                    interned_suite=Subquery(TestName.objects.filter(name=OuterRef('suite')).values('id')[:1]))
+            logger.info("Updated TestCase records with id in [%d, %d], %d updated in total" % (start_id, end_id, number_updated))
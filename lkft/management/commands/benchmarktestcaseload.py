@@ -0,0 +1,108 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+## https://docs.python.org/3/library/resource.html#resource.getrusage
+
+import multiprocessing
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from lkft.bulkload import load_testcases
+from lkft.models import TestCase
+from lkft.views import save_testcases_with_bulk_call
+
+BENCHMARK_LAVA_NICK = 'benchmark'
+
+
+def generate_rows(number_rows, job_id):
+    # similar to the rows of the CtsDeqpTestCases module
+    for index in range(number_rows):
+        if index % 100 == 0:
+            yield ('dEQP-VK.benchmark.TestClass#test_%d#arm64-v8a' % index, 'fail',
+                   None, None, 'CtsDeqpTestCases', job_id, BENCHMARK_LAVA_NICK, None,
+                   'failure message for test_%d' % index,
+                   'java.lang.AssertionError: test_%d failed\n\tat benchmark' % index)
+        else:
+            yield ('dEQP-VK.benchmark.TestClass#test_%d#arm64-v8a' % index, 'pass',
+                   None, None, 'CtsDeqpTestCases', job_id, BENCHMARK_LAVA_NICK, None,
+                   None, None)
+
+
+def run_bulk_create(number_rows, job_id):
+    testcase_objs = []
+    for (name, result, measurement, unit, suite, job_id, lava_nick, testsuite_id, message, stacktrace) in generate_rows(number_rows, job_id):
+        testcase_objs.append(TestCase(name=name,
+                                      result=result,
+                                      measurement=measurement,
+                                      unit=unit,
+                                      suite=suite,
+                                      job_id=job_id,
+                                      lava_nick=lava_nick,
+                                      testsuite_id=testsuite_id,
+                                      message=message,
+                                      stacktrace=stacktrace))
+    save_testcases_with_bulk_call(testcase_objs=testcase_objs)
+
+
+def run_load_testcases(number_rows, job_id):
+    load_testcases(generate_rows(number_rows, job_id))
+
+
+def run_method(method, number_rows, result_queue):
+    # run in a new process, so that the peak RSS is only for this method
+    job_id = 'bench-%s' % method[:10]
+    TestCase.objects.filter(lava_nick=BENCHMARK_LAVA_NICK, job_id=job_id).delete()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if method == 'bulk_create':
+        run_bulk_create(number_rows, job_id)
+    else:
+        run_load_testcases(number_rows, job_id)
+    duration = time.time() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    number_saved = TestCase.objects.filter(lava_nick=BENCHMARK_LAVA_NICK, job_id=job_id).count()
+    TestCase.objects.filter(lava_nick=BENCHMARK_LAVA_NICK, job_id=job_id).delete()
+    connection.close()
+    result_queue.put((method, number_saved, duration, rss_before, rss_peak))
+
+
+class Command(BaseCommand):
+    help = 'Compare the speed and memory of saving TestCase rows with bulk_create and with lkft.bulkload.load_testcases'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number-of-rows",
+                            help="Specify the number of testcase rows to be saved",
+                            dest="number_of_rows",
+                            type=int,
+                            default=100000,
+                            required=False)
+        parser.add_argument("--method",
+                            help="Specify the method to benchmark: bulk_create, load_testcases or all",
+                            dest="method",
+                            choices=['bulk_create', 'load_testcases', 'all'],
+                            default='all',
+                            required=False)
+
+    def handle(self, *args, **options):
+        number_rows = options.get('number_of_rows')
+        if options.get('method') == 'all':
+            methods = ['bulk_create', 'load_testcases']
+        else:
+            methods = [options.get('method')]
+
+        # the database connection must not be shared with the forked processes
+        connection.close()
+        ctx = multiprocessing.get_context('fork')
+        result_queue = ctx.Queue()
+        for method in methods:
+            process = ctx.Process(target=run_method, args=(method, number_rows, result_queue))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise CommandError("Failed to run the benchmark for %s" % method)
+
+            (method, number_saved, duration, rss_before, rss_peak) = result_queue.get()
+            print("%s: %d rows saved in %.2f seconds, %.0f rows/sec, peak RSS %d MB (%d MB before start)" % (
+                        method, number_saved, duration, number_saved / duration if duration > 0 else 0,
+                        rss_peak / 1024, rss_before / 1024))
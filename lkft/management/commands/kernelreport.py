@@ -14,6 +14,9 @@ import re
 import yaml
 import datetime
 import subprocess
+import copy
+import threading
+import time
 
 from django.core.management.base import BaseCommand, CommandError
 
@@ -23,7 +26,8 @@ from lkft.models import KernelChange, CiBuild, ReportBuild
 
 from lcr import qa_report
 
-from lcr.settings import QA_REPORT, QA_REPORT_DEFAULT, BUILD_WITH_JOBS_NUMBER
+from lcr.settings import QA_REPORT, QA_REPORT_DEFAULT, BUILD_WITH_JOBS_NUMBER, INGEST_WORKERS
+from lcr.task_executor import map_tasks
 
 from lkft.views import get_test_result_number_for_build, get_lkft_build_status, get_classified_jobs
 from lkft.views import extract
@@ -33,6 +37,7 @@ from lkft.views import get_build_metadata
 from lkft.views import get_build_kernel_version, parse_kernel_version_string
 from lkft.lkft_config import get_version_from_pname, get_kver_with_pname_env
 from lkft.reportconfig import get_all_report_kernels, get_all_report_projects
+from lkft.regressions import diff_failures
 
 logger = logging.getLogger(__name__)
 
@@ -161,7 +166,140 @@ def classifyTest(flakeDicts, testcasename, hardware, kernel, android):
     return 'I'
 
 
-def find_best_two_runs(builds, project_name, project, exact_ver1="", exact_ver2="", reverse_build_order=False, no_check_kernel_version=False):
+def check_deadline(deadline, project_name, build):
+    '''
+        Stop checking the combo when it has taken more time than --combo-timeout
+    '''
+    if deadline is not None and time.time() > deadline:
+        raise Exception("Timed out checking %s %s" % (project_name, build.get('version')))
+
+
+def check_build(build, project_name, workers=INGEST_WORKERS, deadline=None):
+    '''
+        Fetch and ingest the jobs of the build, and collect the numbers and the failures of the jobs.
+        deadline: time after which an exception is raised instead of checking the next job
+        Return the dict to update the build with, that has 'lkft_build_status' set,
+        and 'jobs', 'numbers', 'jobs_finished_number', 'failures_list' set
+        when the build has all the jobs submitted and finished.
+    '''
+    checked_build = {}
+    checked_build['created_at'] = qa_report_api.get_aware_datetime_from_str(build.get('created_at'))
+    jobs = qa_report_api.get_jobs_for_build(build.get("id"))
+    jobs_to_be_checked = get_classified_jobs(jobs=jobs).get('final_jobs')
+    # get_lkft_build_status sets the build_status and last_fetched_timestamp to the build
+    build_with_status = dict(build, created_at=checked_build['created_at'])
+    checked_build['lkft_build_status'] = get_lkft_build_status(build_with_status, jobs_to_be_checked)
+    checked_build['build_status'] = build_with_status.get('build_status')
+    if build_with_status.get('last_fetched_timestamp'):
+        checked_build['last_fetched_timestamp'] = build_with_status.get('last_fetched_timestamp')
+    if checked_build['lkft_build_status']['has_unsubmitted'] or checked_build['lkft_build_status']['is_inprogress']:
+        return checked_build
+
+    jobs = jobs_to_be_checked
+    checked_build['jobs'] = jobs
+    if not jobs:
+        return checked_build
+
+    check_deadline(deadline, project_name, build)
+    download_attachments_save_result(jobs=jobs, workers=workers)
+
+    failures = {}
+
+    total_jobs_finished_number = 0
+    checked_build['numbers'] = qa_report.TestNumbers()
+    for job in jobs:
+        jobstatus = job['job_status']
+        jobfailure = job['failure']
+        # for some failed cases, numbers are not set for the job
+        job_numbers = job.get('numbers', None)
+        if jobstatus == 'Complete' and jobfailure is None and \
+                job_numbers is not None and job_numbers.get('finished_successfully'):
+            total_jobs_finished_number = total_jobs_finished_number + 1
+
+        result_file_path = get_result_file_path(job=job)
+        if not result_file_path or not os.path.exists(result_file_path):
+            continue
+        check_deadline(deadline, project_name, build)
+        # now tally then move onto the next job
+        kernel_version = get_kver_with_pname_env(prj_name=project_name, env=job.get('environment'))
+
+        platform = job.get('environment').split('_')[0]
+        metadata = {
+                      'job_id': job.get('job_id'),
+                      'qa_job_id': qa_report_api.get_qa_job_id_with_url(job_url=job.get('url')),
+                      'result_url': job.get('attachment_url'),
+                      'lava_nick': job.get('lava_config').get('nick'),
+                      'kernel_version': kernel_version,
+                      'platform': platform,
+                    }
+        extract(result_file_path, failed_testcases_all=failures, metadata=metadata)
+        # this line overrides the numbers set within the function of download_attachments_save_result
+        test_numbers = qa_report.TestNumbers()
+        test_numbers.addWithHash(job['numbers'])
+        job['numbers'] = test_numbers
+        checked_build['numbers'].addWithTestNumbers(test_numbers)
+    checked_build['jobs_finished_number'] = total_jobs_finished_number
+
+    failures_list = []
+    for module_name in sorted(failures.keys()):
+        failures_in_module = failures.get(module_name)
+        for test_name in sorted(failures_in_module.keys()):
+            failure = failures_in_module.get(test_name)
+            abi_stacktrace = failure.get('abi_stacktrace')
+            abis = sorted(abi_stacktrace.keys())
+
+            stacktrace_msg = ''
+            if (len(abis) == 2) and (abi_stacktrace.get(abis[0]) != abi_stacktrace.get(abis[1])):
+                for abi in abis:
+                    stacktrace_msg = '%s\n\n%s:\n%s' % (stacktrace_msg, abi, abi_stacktrace.get(abi))
+            else:
+                stacktrace_msg = abi_stacktrace.get(abis[0])
+
+            failure['abis'] = abis
+            failure['stacktrace'] = stacktrace_msg.strip()
+            failure['module_name'] = module_name
+            failures_list.append(failure)
+    checked_build['failures_list'] = failures_list
+
+    return checked_build
+
+
+class ReportCache():
+    '''
+        Builds fetched and checked in one run of the command, shared by the combos checked
+        concurrently, so that projects sharing builds, or the same project checked again,
+        only fetch and ingest the builds once.
+        Copies are returned, as the builds are changed by the callers.
+    '''
+
+    def __init__(self, workers=INGEST_WORKERS):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.values = {}
+
+    def get(self, key, func):
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # the other threads wait for the value, instead of fetching it again
+        with key_lock:
+            if key not in self.values:
+                self.values[key] = func()
+        return copy.deepcopy(self.values[key])
+
+    def get_project(self, project_id=None, project_fullname=None):
+        if project_id is not None:
+            return self.get(('project', project_id), lambda: qa_report_api.get_project(project_id))
+        return self.get(('project', project_fullname), lambda: qa_report_api.get_project_with_name(project_fullname))
+
+    def get_builds(self, project_id):
+        return self.get(('builds', project_id), lambda: qa_report_api.get_all_builds(project_id))
+
+    def get_checked_build(self, build, project_name, deadline=None):
+        return self.get(('build', build.get('id')), lambda: check_build(build, project_name, workers=self.workers, deadline=deadline))
+
+
+def find_best_two_runs(builds, project_name, project, exact_ver1="", exact_ver2="", reverse_build_order=False, no_check_kernel_version=False, cache=None, deadline=None):
     goodruns = []
     bailaftertwo = 0
     number_of_build_with_jobs = 0
@@ -211,60 +349,23 @@ def find_best_two_runs(builds, project_name, project, exact_ver1="", exact_ver2=
                 pass
 
         logger.info("Checking for %s, %s", project_name, build.get('version'))
-        build['created_at'] = qa_report_api.get_aware_datetime_from_str(build.get('created_at'))
-        jobs = qa_report_api.get_jobs_for_build(build.get("id"))
-        jobs_to_be_checked = get_classified_jobs(jobs=jobs).get('final_jobs')
-        build_status = get_lkft_build_status(build, jobs_to_be_checked)
-        #build_status = get_lkft_build_status(build, jobs)
-        jobs=jobs_to_be_checked
+        check_deadline(deadline, project_name, build)
+        if cache is not None:
+            build.update(cache.get_checked_build(build, project_name, deadline=deadline))
+        else:
+            build.update(check_build(build, project_name, deadline=deadline))
+        build_status = build.get('lkft_build_status')
         if build_status['has_unsubmitted']:
             logger.info('Skip the check as the build has unsubmitted jobs: %s %s', project_name, build['version'])
             continue
         elif build_status['is_inprogress']:
             logger.info('Skip the check as the build is still inprogress: %s %s', project_name, build['version'])
             continue
-           
-        build['jobs'] = jobs
+
+        jobs = build.get('jobs')
         if not jobs:
             continue
-
-        download_attachments_save_result(jobs=jobs)
-            
-        failures = {}
-       
-        #pdb.set_trace()
-        total_jobs_finished_number = 0
-        build['numbers'] = qa_report.TestNumbers()
-        for job in jobs:
-            jobstatus = job['job_status']
-            jobfailure = job['failure']
-            # for some failed cases, numbers are not set for the job
-            job_numbers = job.get('numbers', None)
-            if jobstatus == 'Complete' and jobfailure is None and \
-                    job_numbers is not None and job_numbers.get('finished_successfully'):
-                total_jobs_finished_number = total_jobs_finished_number + 1
-
-            result_file_path = get_result_file_path(job=job)
-            if not result_file_path or not os.path.exists(result_file_path):
-                continue
-            # now tally then move onto the next job
-            kernel_version = get_kver_with_pname_env(prj_name=project_name, env=job.get('environment'))
-
-            platform = job.get('environment').split('_')[0]
-            metadata = {
-                          'job_id': job.get('job_id'),
-                          'qa_job_id': qa_report_api.get_qa_job_id_with_url(job_url=job.get('url')),
-                          'result_url': job.get('attachment_url'),
-                          'lava_nick': job.get('lava_config').get('nick'),
-                          'kernel_version': kernel_version,
-                          'platform': platform,
-                        }
-            extract(result_file_path, failed_testcases_all=failures, metadata=metadata)
-            # this line overrides the numbers set within the function of download_attachments_save_result
-            test_numbers = qa_report.TestNumbers()
-            test_numbers.addWithHash(job['numbers'])
-            job['numbers'] = test_numbers
-            build['numbers'].addWithTestNumbers(test_numbers)
+        total_jobs_finished_number = build.get('jobs_finished_number')
 
         # now let's see what we have. Do we have a complete yet?
         print("Total Finished Jobs Number / Total Jobs Number: %d / %d" % (total_jobs_finished_number, len(jobs)))
@@ -317,75 +418,22 @@ def find_best_two_runs(builds, project_name, project, exact_ver1="", exact_ver2=
             logger.info("Not one valid will continue: %s, %s", project_name, build.get('version'))
             continue
 
-        #pdb.set_trace()
-        failures_list = []
-        for module_name in sorted(failures.keys()):
-            failures_in_module = failures.get(module_name)
-            for test_name in sorted(failures_in_module.keys()):
-                failure = failures_in_module.get(test_name)
-                abi_stacktrace = failure.get('abi_stacktrace')
-                abis = sorted(abi_stacktrace.keys())
-
-                stacktrace_msg = ''
-                if (len(abis) == 2) and (abi_stacktrace.get(abis[0]) != abi_stacktrace.get(abis[1])):
-                    for abi in abis:
-                        stacktrace_msg = '%s\n\n%s:\n%s' % (stacktrace_msg, abi, abi_stacktrace.get(abi))
-                else:
-                    stacktrace_msg = abi_stacktrace.get(abis[0])
-
-                failure['abis'] = abis
-                failure['stacktrace'] = stacktrace_msg.strip()
-                failure['module_name'] = module_name
-                failures_list.append(failure)
-
-        #pdb.set_trace()
-        android_version = get_version_from_pname(pname=project.get('name'))
-        build['failures_list'] = failures_list
-
     return goodruns
 
 # Try to find the regressions in goodruns[1]
 # compared to the result in goodruns[0]
 def find_regressions(goodruns):
-    runA = goodruns[1]
-    failuresA = runA['failures_list']
-    runB = goodruns[0]
-    failuresB = runB['failures_list']
-    regressions = []
-    for failureA in failuresA:
-        match = 0
-        testAname = failureA['test_name']
-        for failureB in failuresB:
-            testBname = failureB['test_name']
-            if testAname == testBname:
-                match = 1
-                break
-        if match != 1 :
-            # for failures in goodruns[1],
-            # if they are not reported in goodruns[0],
-            # then they are regressions
-            regressions.append(failureA)
-    
-    return regressions
+    # for failures in goodruns[1],
+    # if they are not reported in goodruns[0],
+    # then they are regressions
+    return diff_failures(base_failures=goodruns[0]['failures_list'],
+                         target_failures=goodruns[1]['failures_list'],
+                         key=lambda failure: failure['test_name'])['regressions']
 
 def find_antiregressions(goodruns):
-    runA = goodruns[1]
-    failuresA = runA['failures_list']
-    runB = goodruns[0]
-    failuresB = runB['failures_list']
-    antiregressions = []
-    for failureB in failuresB:
-        match = 0
-        for failureA in failuresA:
-            testAname = failureA['test_name']
-            testBname = failureB['test_name']
-            if testAname == testBname:
-                match = 1
-                break
-        if match != 1 :
-            antiregressions.append(failureB)
-    
-    return antiregressions
+    return diff_failures(base_failures=goodruns[0]['failures_list'],
+                         target_failures=goodruns[1]['failures_list'],
+                         key=lambda failure: failure['test_name'])['fixes']
 
 
 """  Example project_info dict
@@ -590,6 +638,14 @@ class Command(BaseCommand):
                 default=None,
                 required=False)
 
+        parser.add_argument("--combo-timeout",
+                help="Specify the seconds that checking the builds of one combo could take, \
+                 no more builds or jobs of the combo are checked after that, and the combo is reported as failed",
+                dest="combo_timeout",
+                type=int,
+                default=7200,
+                required=False)
+
 
     def handle(self, *args, **options):
         kernel = options['kernel']
@@ -604,6 +660,7 @@ class Command(BaseCommand):
         trim_number = options.get('trim_number')
         reverse_build_order = options.get('reverse_build_order')
         qareport_project = options.get('qareport_project')
+        combo_timeout = options.get('combo_timeout')
 
         # map kernel to all available kernel, board, OS combos that match
         work = []
@@ -625,34 +682,55 @@ class Command(BaseCommand):
         output_errorprojects = open(f_errorprojects, "w")
         do_boilerplate(output)
 
-        work_total_numbers = qa_report.TestNumbers()
-        trimmed_lines = 0
-        for combo in work:
+        # builds are checked with one process for each combo, as the combos are checked concurrently
+        cache = ReportCache(workers=1)
+
+        def check_combo(combo):
+            deadline = time.time() + combo_timeout
             project_info = projectids[combo]
             project_id = project_info.get('project_id', None)
             if project_id is not None:
                 logger.info("Try to get project %s with project_id %s", combo, project_id)
-                project =  qa_report_api.get_project(project_id)
+                project = cache.get_project(project_id=project_id)
             else:
                 project_group = project_info.get('group', None)
                 project_slug = project_info.get('slug', None)
                 project_fullname = qa_report_api.get_project_full_name_with_group_and_slug(project_group, project_slug)
 
                 logger.info("Try to get project %s with project_fullname %s", combo, project_fullname)
-                project =  qa_report_api.get_project_with_name(project_fullname)
+                project = cache.get_project(project_fullname=project_fullname)
 
+            if project is None:
+                return (project, [])
+
+            builds = cache.get_builds(project.get('id'))
+            goodruns = find_best_two_runs(builds, project.get('name'), project,
+                                          exact_ver1=opt_exact_ver1, exact_ver2=opt_exact_ver2, reverse_build_order=reverse_build_order,
+                                          no_check_kernel_version=no_check_kernel_version,
+                                          cache=cache,
+                                          deadline=deadline)
+            return (project, goodruns)
+
+        combo_tasks = map_tasks(check_combo, work, timeout=combo_timeout, name='check_combo')
+
+        work_total_numbers = qa_report.TestNumbers()
+        trimmed_lines = 0
+        # reported in the order of the combos, no matter which one finished first
+        for combo, combo_task in zip(work, combo_tasks):
+            project_info = projectids[combo]
+            if combo_task.failed():
+                print("\nNOTE: failed to check project for " + combo + ", please check and try again\n")
+                output_errorprojects.write("\nNOTE: failed to check project " + combo + ", please check and try again\n\n")
+                continue
+
+            project, goodruns = combo_task.result
             if project is None:
                 print("\nNOTE: project for " + combo + " was not found, please check and try again\n")
                 output_errorprojects.write("\nNOTE: project " + combo+ " was not found, please check and try again\n\n")
                 continue
 
             project_id = project.get('id')
-            builds = qa_report_api.get_all_builds(project_id)
-            
             project_name = project.get('name')
-            goodruns = find_best_two_runs(builds, project_name, project,
-                                          exact_ver1=opt_exact_ver1, exact_ver2=opt_exact_ver2, reverse_build_order=reverse_build_order,
-                                          no_check_kernel_version=no_check_kernel_version)
             if len(goodruns) < 2 :
                 print("\nNOTE: project " + project_name+ " did not have 2 good runs\n")
                 if opt_exact_ver1 is not None:
@@ -10,8 +10,7 @@ from django.core.management.base import BaseCommand, CommandError
 from lcr import qa_report
 from lcr.settings import QA_REPORT, QA_REPORT_DEFAULT
 from lcr.settings import JENKINS, JENKINS_DEFAULT
-
-from lkft.views import thread_pool
+from lcr.task_executor import map_tasks
 
 logger = logging.getLogger(__name__)
 
@@ -89,7 +88,7 @@ class Command(BaseCommand):
                             'build_number': build_number,
                             'jenkins_jobname': jenkins_jobname})
 
-        thread_pool(func=self.get_build_info, elements=builds)
+        map_tasks(self.get_build_info, elements=builds)
             # print(f"{display_name}, {start_timestamp}, {duration_minutes}")
 
         #items = ['build_date', 'build_week', 'build_branch', 'build_describe', 'build_config']
@@ -21,11 +21,14 @@ from lkft.models import KernelChange, CiBuild, ReportBuild, ReportProject, Repor
 
 from lcr import qa_report
 from lkft import lkft_config
+from lkft.bug_index import BugSummaryIndex
 from lcr.irc import IRC
 
 from lcr.settings import QA_REPORT, QA_REPORT_DEFAULT
 
-from lkft.views import get_kernel_changes_info, cache_qajob_to_database
+from lkft.views import get_kernel_changes_info, cache_qajobs_to_database, update_project_snapshot_for_build
+from lkft.views import poll_lkft_projects, update_kernel_change_with_report_builds
+from lkft.views import enable_ingest_process_pool
 from lkft.views import extract, get_lkft_bugs, get_hardware_from_pname, get_result_file_path, get_kver_with_pname_env
 
 logger = logging.getLogger(__name__)
@@ -48,6 +51,12 @@ class Command(BaseCommand):
                         dest="irc_report_type",
                         default="ONLY_COMPLETED",
                         required=False)
+        parser.add_argument("--incremental",
+                        help="Only poll the builds changed since the last run, and report with the results saved in database",
+                        dest="incremental",
+                        action='store_true',
+                        default=False,
+                        required=False)
 
 
     def classify_bugs_and_failures(self, bugs=[], failures=[]):
@@ -55,29 +64,36 @@ class Command(BaseCommand):
         bugs_not_reproduced = []
         new_failures = []
 
+        bug_index = BugSummaryIndex(bugs)
+        bug_ids_reproduced = set()
         for module_name in sorted(failures.keys()):
             failures_in_module = failures.get(module_name)
             for test_name in sorted(failures_in_module.keys()):
                 failure = failures_in_module.get(test_name)
 
-                for bug in bugs:
-                    if test_name.find(module_name) >=0:
-                        # vts test, module name is the same as the test name.
-                        search_key = test_name
-                    else:
-                        search_key = '%s %s' % (module_name, test_name)
-
-                    if bug.summary.find(search_key) >= 0:
+                if test_name.find(module_name) >=0:
+                    # vts test, module name is the same as the test name.
+                    search_key = test_name
+                else:
+                    search_key = '%s %s' % (module_name, test_name)
+                search_key_exact = search_key.replace('#arm64-v8a', '').replace('#armeabi-v7a', '')
+
+                # bugs with "<key> failed" in the summary, with or without the abi
+                for bug in bug_index.get_bugs(search_key_exact) + bug_index.get_bugs(search_key):
+                    if failure.get('bugs') and bug in failure.get('bugs'):
+                        continue
+                    if bug.id not in bug_ids_reproduced:
+                        bug_ids_reproduced.add(bug.id)
                         bugs_reproduced.append(bug)
-                        if failure.get('bugs'):
-                            failure['bugs'].append(bug)
-                        else:
-                            failure['bugs'] = [bug]
+                    if failure.get('bugs'):
+                        failure['bugs'].append(bug)
+                    else:
+                        failure['bugs'] = [bug]
 
                 if failure.get('bugs') is None or len(failure.get('bugs')) == 0:
                     new_failures.append(failure)
 
-        bugs_not_reproduced = [ bug for bug in bugs if not (bug in bugs_reproduced) ]
+        bugs_not_reproduced = [ bug for bug in bugs if not (bug.id in bug_ids_reproduced) ]
 
         return {
                 'bugs_reproduced': bugs_reproduced,
@@ -93,6 +109,7 @@ class Command(BaseCommand):
         if bugs is None:
             bugs = get_lkft_bugs(summary_keyword=project_name, platform=platform_name)
             cachepool[project_platform_key] = bugs
+        return bugs
 
 
     def get_failures_for_build(self, project_name="", jobs=[]):
@@ -129,23 +146,7 @@ class Command(BaseCommand):
         target_qareport_build['classification'] = classification
 
 
-    def handle(self, *args, **options):
-        irc_report_type = options.get('irc_report_type')
-        option_branch = options.get('branch')
-        describe = options['describe']
-        if describe is not None:
-            db_kernelchanges = KernelChange.objects_needs_report.all().filter(describe=describe)
-        elif option_branch:
-            db_kernelchanges = KernelChange.objects_needs_report.all().filter(branch=option_branch)
-        else:
-            # db_kernelchanges = KernelChange.objects_needs_report.all().filter(branch="android-5.4")
-            db_kernelchanges = KernelChange.objects_needs_report.all()
-        kernelchanges = get_kernel_changes_info(db_kernelchanges=db_kernelchanges)
-        if len(kernelchanges) == 0:
-            logger.info("No kernel change report needs to be updated")
-            return
-
-        ## cache to database
+    def cache_kernel_changes_to_database(self, kernelchanges=[]):
         for kernel_change_report in kernelchanges:
             kernel_change = kernel_change_report.get('kernel_change')
             if kernel_change.reported and kernel_change.result == 'ALL_COMPLETED':
@@ -214,14 +215,67 @@ class Command(BaseCommand):
                 report_build.status = qareport_build.get('build_status')
                 qa_report.TestNumbers.setHashValueForDatabaseRecord(report_build, result_numbers)
                 report_build.save()
+                update_project_snapshot_for_build(report_build)
 
                 final_jobs = qareport_build.get('final_jobs')
                 resubmitted_or_duplicated_jobs = qareport_build.get('resubmitted_or_duplicated_jobs')
 
                 # save qareport job to database
-                for job in final_jobs + resubmitted_or_duplicated_jobs:
-                    cache_qajob_to_database(job)
+                cache_qajobs_to_database(final_jobs + resubmitted_or_duplicated_jobs, report_build=report_build)
+
+
+    def get_kernel_changes_incrementally(self, db_kernelchanges=[]):
+        '''
+            Only poll the builds changed since the last run from qa-report,
+            and update the kernel changes with the builds saved in database,
+            instead of fetching all the builds and jobs for every kernel change again
+        '''
+        db_kernelchanges = list(db_kernelchanges)
+        if len(db_kernelchanges) == 0:
+            return []
 
+        versions = set([db_kernelchange.describe for db_kernelchange in db_kernelchanges])
+        db_report_builds = poll_lkft_projects(versions=versions)
+        logger.info("%d builds polled for %d kernel changes" % (len(db_report_builds), len(db_kernelchanges)))
+
+        version_report_builds = {}
+        for db_report_build in ReportBuild.objects.filter(version__in=versions, qa_project__isnull=False).select_related('qa_project'):
+            version_report_builds.setdefault(db_report_build.version, []).append(db_report_build)
+
+        kernelchanges = []
+        for db_kernelchange in db_kernelchanges:
+            status = update_kernel_change_with_report_builds(db_kernelchange, db_report_builds=version_report_builds.get(db_kernelchange.describe, []))
+            kernelchanges.append({
+                    'kernel_change': db_kernelchange,
+                    'kernel_change_status': status,
+                })
+        return kernelchanges
+
+
+    def handle(self, *args, **options):
+        enable_ingest_process_pool()
+        irc_report_type = options.get('irc_report_type')
+        option_branch = options.get('branch')
+        describe = options['describe']
+        if describe is not None:
+            db_kernelchanges = KernelChange.objects_needs_report.all().filter(describe=describe)
+        elif option_branch:
+            db_kernelchanges = KernelChange.objects_needs_report.all().filter(branch=option_branch)
+        else:
+            # db_kernelchanges = KernelChange.objects_needs_report.all().filter(branch="android-5.4")
+            db_kernelchanges = KernelChange.objects_needs_report.all()
+        incremental = options.get('incremental')
+        if incremental:
+            kernelchanges = self.get_kernel_changes_incrementally(db_kernelchanges=db_kernelchanges)
+        else:
+            kernelchanges = get_kernel_changes_info(db_kernelchanges=db_kernelchanges)
+        if len(kernelchanges) == 0:
+            logger.info("No kernel change report needs to be updated")
+            return
+
+        ## cache to database
+        if not incremental:
+            self.cache_kernel_changes_to_database(kernelchanges)
 
         # print out the reports
         print("########## REPORTS FOR KERNEL CHANGES#################")
@@ -358,6 +412,9 @@ class Command(BaseCommand):
                 for failure in new_failures:
                     print("\t\t\t\t %s %s: %s" % (failure.get('module_name'), failure.get('test_name'), failure.get('message')))
 
+        if qa_report.http_cache is not None:
+            logger.info("http cache stats: %s" % qa_report.http_cache.get_stats())
+
         ircMsgList.append("KERNEL CHANGES STATUS REPORT FINISHED: %d in total" % num_kernelchanges)
         if len(ircMsgList) > 2:
             irc = IRC.getInstance()
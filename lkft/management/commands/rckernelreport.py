@@ -26,7 +26,9 @@ from lcr.settings import QA_REPORT, QA_REPORT_DEFAULT, BUILD_WITH_JOBS_NUMBER
 from lkft.views import get_test_result_number_for_build, get_projects_info
 from lkft.views import extract
 from lkft.views import download_attachments_save_result
+from lkft.views import enable_ingest_process_pool
 from lkft.lkft_config import get_version_from_pname, get_kver_with_pname_env
+from lkft.regressions import diff_failures
 
 qa_report_def = QA_REPORT[QA_REPORT_DEFAULT]
 qa_report_api = qa_report.QAReportApi(qa_report_def.get('domain'), qa_report_def.get('token'))
@@ -402,23 +404,10 @@ def find_best_two_runs(builds, project_name, project):
 
 
 def find_regressions(goodruns):
-    runA = goodruns[0]
-    failuresA = runA['failures_list']
-    runB = goodruns[1]
-    failuresB = runB['failures_list']
-    regressions = []
-    for failureA in failuresA:
-        match = 0
-        for failureB in failuresB:
-            testAname = failureA['test_name']
-            testBname = failureB['test_name']
-            if testAname == testBname:
-                match = 1
-                break
-        if match != 1 :
-            regressions.append(failureA)
-    
-    return regressions
+    # failures in goodruns[0] that are not reported in goodruns[1]
+    return diff_failures(base_failures=goodruns[1]['failures_list'],
+                         target_failures=goodruns[0]['failures_list'],
+                         key=lambda failure: failure['test_name'])['regressions']
 
 
 def add_unique_kernel(unique_kernels, kernel_version):
@@ -468,6 +457,7 @@ class Command(BaseCommand):
   #     parser.add_argument('kernel', type=str, help='Kernel version')
 
     def handle(self, *args, **options):
+        enable_ingest_process_pool()
         work = []
         unique_kernels=[]
 
@@ -0,0 +1,27 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lkft.views import androidreportconfig_remote_module
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Download androidreportconfig.py from gitlab again and save it as the last good copy, \
+            the running instances load it from the saved copy the next time it is used'
+
+    def handle(self, *args, **options):
+        androidreportconfig_remote_module.load_from_disk()
+        old_version = androidreportconfig_remote_module.version
+        try:
+            androidreportconfig_remote_module.fetch(force=True)
+        except Exception as e:
+            raise CommandError("Failed to refresh androidreportconfig: %s" % e)
+
+        if old_version == androidreportconfig_remote_module.version:
+            logger.info("androidreportconfig is not changed, version %s" % old_version)
+        else:
+            logger.info("androidreportconfig updated from version %s to %s" % (old_version, androidreportconfig_remote_module.version))
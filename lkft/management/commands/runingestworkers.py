@@ -0,0 +1,84 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+## https://www.postgresql.org/docs/current/sql-select.html#SQL-FOR-UPDATE-SHARE
+
+import logging
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from lkft import ingest_queue
+from lkft.views import ingest_queued_task
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Ingest the jobs queued in the IngestTask table, could be run on multiple hosts at the same time'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers",
+                            help="Specify the number of worker threads",
+                            dest="workers",
+                            type=int,
+                            default=1,
+                            required=False)
+
+        parser.add_argument("--batch-size",
+                            help="Specify the number of tasks claimed by a worker each time",
+                            dest="batch_size",
+                            type=int,
+                            default=1,
+                            required=False)
+
+        parser.add_argument("--poll-interval",
+                            help="Specify the seconds to wait before checking the queue again when it's empty",
+                            dest="poll_interval",
+                            type=int,
+                            default=5,
+                            required=False)
+
+        parser.add_argument("--exit-when-empty",
+                            help="Exit when there is no task queued, instead of waiting for new tasks",
+                            dest="exit_when_empty",
+                            action='store_true',
+                            default=False,
+                            required=False)
+
+        parser.add_argument("--keep-days",
+                            help="Specify the days that the finished tasks are kept before they are deleted",
+                            dest="keep_days",
+                            type=int,
+                            default=7,
+                            required=False)
+
+    def handle(self, *args, **options):
+        workers = max(options.get('workers'), 1)
+        batch_size = max(options.get('batch_size'), 1)
+        poll_interval = options.get('poll_interval')
+        exit_when_empty = options.get('exit_when_empty')
+
+        number_deleted = ingest_queue.delete_finished_tasks(days=options.get('keep_days'))
+        logger.info("Deleted %d finished tasks" % number_deleted)
+
+        def run_worker(index):
+            worker_name = ingest_queue.get_worker_name(index)
+            logger.info("Worker %s started" % worker_name)
+            try:
+                number_run = ingest_queue.run_worker(ingest_queued_task, worker_name,
+                                                     batch_size=batch_size,
+                                                     poll_interval=poll_interval,
+                                                     exit_when_empty=exit_when_empty)
+                logger.info("Worker %s finished, %d tasks run" % (worker_name, number_run))
+            finally:
+                # each thread has its own database connection
+                connection.close()
+
+        threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=run_worker, args=(index,), name="ingest-worker-%d" % index, daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,27 @@
+## https://docs.djangoproject.com/en/dev/howto/custom-management-commands/#howto-custom-management-commands
+## https://bugzilla.readthedocs.io/en/latest/api/core/v1/bug.html#search-bugs
+
+import logging
+
+from django.core.management.base import BaseCommand
+
+from lkft import bug_store
+from lkft.views import bugzilla_instance, get_lkft_bug_terms
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Sync the LKFT bugs from bugzilla into the database, could be run periodically with cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full",
+                            help="Sync all the bugs instead of only the changed ones, and remove the bugs not found any more",
+                            dest="full",
+                            action='store_true',
+                            default=False,
+                            required=False)
+
+    def handle(self, *args, **options):
+        number_synced = bug_store.sync_bugs(bugzilla_instance, terms=get_lkft_bug_terms(), full=options.get('full'))
+        logger.info("%d bugs synced" % number_synced)
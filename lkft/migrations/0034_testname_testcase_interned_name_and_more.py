@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0033_alter_cibuild_number_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestName',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=320, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='interned_name',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='lkft.testname'),
+        ),
+        migrations.AddField(
+            model_name='testcase',
+            name='interned_suite',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='lkft.testname'),
+        ),
+    ]
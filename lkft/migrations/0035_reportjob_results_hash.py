@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0034_testname_testcase_interned_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='results_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0035_reportjob_results_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='normalized_suite',
+            field=models.CharField(db_index=True, max_length=256, null=True),
+        ),
+    ]
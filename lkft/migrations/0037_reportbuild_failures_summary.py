@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0036_testcase_normalized_suite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportbuild',
+            name='failures_summary',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0037_reportbuild_failures_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LKFTBug',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bug_id', models.IntegerField(unique=True)),
+                ('summary', models.CharField(max_length=512)),
+                ('status', models.CharField(blank=True, max_length=64, null=True)),
+                ('resolution', models.CharField(blank=True, max_length=64, null=True)),
+                ('version', models.CharField(blank=True, max_length=64, null=True)),
+                ('platform', models.CharField(blank=True, db_index=True, max_length=64, null=True)),
+                ('last_change_time', models.DateTimeField(db_index=True, null=True)),
+                ('data', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LKFTBugSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('synced_at', models.DateTimeField(null=True)),
+                ('full_synced_at', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
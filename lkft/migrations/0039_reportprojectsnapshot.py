@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-18 14:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0038_lkftbug_lkftbugsync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportProjectSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_qa_build_id', models.IntegerField(null=True)),
+                ('previous_qa_build_id', models.IntegerField(null=True)),
+                ('numbers', models.JSONField(default=dict)),
+                ('status', models.CharField(max_length=100, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_build', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='lkft.reportbuild')),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='lkft.reportproject')),
+            ],
+        ),
+    ]
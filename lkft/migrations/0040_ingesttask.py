@@ -0,0 +1,36 @@
+# Generated by Django 4.2.8 on 2026-10-18 15:37
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0039_reportprojectsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qa_job_id', models.IntegerField(db_index=True)),
+                ('job_url', models.URLField(blank=True, db_index=True, null=True)),
+                ('job', models.JSONField(blank=True, null=True)),
+                ('fetch_latest', models.BooleanField(default=False)),
+                ('priority', models.IntegerField(default=0)),
+                ('status', models.CharField(default='QUEUED', max_length=16)),
+                ('attempts', models.IntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=256, null=True)),
+                ('claimed_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'priority', 'run_after'], name='lkft_ingesttask_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0040_ingesttask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportproject',
+            name='polled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportproject',
+            name='polled_qa_build_id',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0041_reportproject_polled'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testcase',
+            name='name',
+            field=models.CharField(max_length=320),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='suite',
+            field=models.CharField(max_length=256),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.8 on 2026-10-18 18:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_failures_summaries(apps, schema_editor):
+    ReportBuild = apps.get_model('lkft', 'ReportBuild')
+    ReportBuildFailuresSummary = apps.get_model('lkft', 'ReportBuildFailuresSummary')
+    report_build_ids = ReportBuild.objects.filter(failures_summary__isnull=False).values_list('id', flat=True)
+    # one by one, the summaries of the CTS builds are large
+    for report_build_id in list(report_build_ids):
+        failures = ReportBuild.objects.filter(id=report_build_id).values_list('failures_summary', flat=True).first()
+        ReportBuildFailuresSummary.objects.create(report_build_id=report_build_id, failures=failures)
+
+
+def move_failures_summaries_back(apps, schema_editor):
+    ReportBuild = apps.get_model('lkft', 'ReportBuild')
+    ReportBuildFailuresSummary = apps.get_model('lkft', 'ReportBuildFailuresSummary')
+    for report_build_id in list(ReportBuildFailuresSummary.objects.values_list('report_build_id', flat=True)):
+        failures = ReportBuildFailuresSummary.objects.filter(report_build_id=report_build_id).values_list('failures', flat=True).first()
+        ReportBuild.objects.filter(id=report_build_id).update(failures_summary=failures)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0042_testcase_name_suite_not_indexed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportBuildFailuresSummary',
+            fields=[
+                ('report_build', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='lkft.reportbuild')),
+                ('failures', models.JSONField()),
+            ],
+        ),
+        migrations.RunPython(move_failures_summaries, move_failures_summaries_back),
+        migrations.RemoveField(
+            model_name='reportbuild',
+            name='failures_summary',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lkft', '0043_reportbuildfailuressummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testcase',
+            name='normalized_suite',
+            field=models.CharField(max_length=256, null=True),
+        ),
+    ]
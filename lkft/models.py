@@ -85,6 +85,12 @@ class ReportProject(models.Model):
     is_public = models.BooleanField(default=True)
     is_archived = models.BooleanField(default=True)
 
+    # watermark of the incremental polling of the lkftreport command:
+    # the largest qa-report build id seen, builds with larger ids are new builds,
+    # and the time the builds of the project were polled the last time
+    polled_qa_build_id = models.IntegerField(default=0)
+    polled_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         permissions = (
             ("view_eap_projects", "Can see available eap projects"),
@@ -175,6 +181,10 @@ class ReportJob(models.Model):
     modules_total = models.IntegerField(default=0)
     finished_successfully = models.BooleanField(default=False)
 
+    # sha256 of the test_result.xml or the LAVA results yaml that the saved testcases are from,
+    # used to skip the ingestion when the results are not changed
+    results_hash = models.CharField(max_length=64, null=True, blank=True)
+
     def __str__(self):
         if self.report_build:
             return "%s#%s" % (self.job_name, self.report_build.version)
@@ -212,6 +222,20 @@ class TestSuite(models.Model):
     number_total = models.IntegerField(default=0)
 
 
+class TestName(models.Model):
+    # names of testcases and testsuites are repeated for every build of every project,
+    # so they are saved only once here, and referenced by id from TestCase
+    name = models.CharField(max_length=320, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    def __unicode__(self):
+        return self.name
+
+    objects = models.Manager()
+
+
 class TestCase(models.Model):
     # multiple index might be enabled later
     # when the problem is not improved too much
@@ -221,11 +245,13 @@ class TestCase(models.Model):
     # refer to https://qa.1r1g.com/sf/ask/4300189841/
     # https://stackoverflow.com/questions/61431283/django-reached-maximum-value-of-sequence
     id = models.BigAutoField(primary_key=True)
-    name = models.CharField(max_length=320, db_index=True)
+    # not indexed, the testcases are looked up by name with interned_name instead
+    name = models.CharField(max_length=320)
     result = models.CharField(max_length=64, db_index=True)
     measurement = models.DecimalField(max_digits=20, decimal_places=2, null=True)
     unit = models.CharField(max_length=128, null=True)
-    suite = models.CharField(max_length=256, db_index=True)
+    # not indexed, the testcases are looked up by suite with interned_suite instead
+    suite = models.CharField(max_length=256)
     job_id = models.CharField(max_length=16, db_index=True)
     lava_nick = models.CharField(max_length=64, db_index=True)
 
@@ -235,8 +261,100 @@ class TestCase(models.Model):
     message = models.TextField(null=True, blank=True)
     stacktrace = models.TextField(null=True, blank=True)
 
+    # the interned name and suite, null for records saved before TestName was added
+    # and not backfilled yet with the backfilltestnames command
+    interned_name = models.ForeignKey(TestName, null=True, related_name='+', on_delete=models.PROTECT)
+    interned_suite = models.ForeignKey(TestName, null=True, related_name='+', on_delete=models.PROTECT)
+
+    # suite without the index prefix like "0_" added by LAVA, so that the benchmark
+    # results could be looked up with the suite name in the benchmark config.
+    # null for records saved before it was added and not backfilled yet with the backfillnormalizedsuites command
+    normalized_suite = models.CharField(max_length=256, null=True)
+
     def __unicode__(self):
         if self.measurement:
             return "%s %s %s %s" % (self.name, self.result, self.measurement, self.unit)
         else:
             return "%s %s" % (self.name, self.result)
+
+
+class LKFTBug(models.Model):
+    # the LKFT bugs synced from bugzilla, see lkft.bug_store
+    bug_id = models.IntegerField(unique=True)
+    summary = models.CharField(max_length=512)
+    status = models.CharField(max_length=64, null=True, blank=True)
+    resolution = models.CharField(max_length=64, null=True, blank=True)
+    version = models.CharField(max_length=64, null=True, blank=True)
+    platform = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    last_change_time = models.DateTimeField(null=True, db_index=True)
+    # all the fields returned by bugzilla
+    data = models.JSONField(default=dict)
+
+    def __str__(self):
+        return "%s: %s" % (self.bug_id, self.summary)
+
+
+class LKFTBugSync(models.Model):
+    # only one record, for when the bugs were synced from bugzilla the last time
+    synced_at = models.DateTimeField(null=True)
+    full_synced_at = models.DateTimeField(null=True)
+
+
+class ReportBuildFailuresSummary(models.Model):
+    # failed testcases of the jobs when the build is finished, like
+    # {"<qa_job_id>": [[module_name, abi, test_name, result, message, stacktrace], ...]}
+    # not saved when the build is not finished or the summary is not computed yet.
+    # kept out of ReportBuild as it's megabytes for the CTS builds, and only read for the jobs page
+    # and the build comparison, see lkft.views.get_build_failures_summary
+    report_build = models.OneToOneField(ReportBuild, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    failures = models.JSONField()
+
+    def __str__(self):
+        return "%s" % self.report_build_id
+
+
+class ReportProjectSnapshot(models.Model):
+    # information of the latest builds of the project for the matrix and projects pages,
+    # updated when the builds of the project are saved, see lkft.views.update_project_snapshot
+    project = models.OneToOneField(ReportProject, on_delete=models.CASCADE, related_name='snapshot')
+    last_build = models.ForeignKey(ReportBuild, null=True, on_delete=models.SET_NULL, related_name='+')
+    last_qa_build_id = models.IntegerField(null=True)
+    previous_qa_build_id = models.IntegerField(null=True)
+    # qa_report.TestNumbers.toHash() of the last build,
+    # with number_regressions compared with the previous build
+    numbers = models.JSONField(default=dict)
+    status = models.CharField(max_length=100, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "%s#%s" % (self.project, self.last_qa_build_id)
+
+
+class IngestTask(models.Model):
+    # the job to be ingested by the runingestworkers command, see lkft.ingest_queue
+    qa_job_id = models.IntegerField(db_index=True)
+    job_url = models.URLField(null=True, blank=True, db_index=True)
+    # the job from qa-report, it's fetched again by the worker when not set
+    job = models.JSONField(null=True, blank=True)
+    fetch_latest = models.BooleanField(default=False)
+    # tasks with higher priority are claimed first
+    priority = models.IntegerField(default=0)
+    # QUEUED / RUNNING / DONE / FAILED
+    status = models.CharField(max_length=16, default='QUEUED')
+    attempts = models.IntegerField(default=0)
+    # the task is not claimed before this time, for the retries with backoff
+    run_after = models.DateTimeField(default=timezone.now)
+    # the RUNNING task could be claimed by other workers after claimed_until
+    claimed_by = models.CharField(max_length=256, null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_after'], name='lkft_ingesttask_claim_idx'),
+        ]
+
+    def __str__(self):
+        return "%s %s" % (self.qa_job_id, self.status)
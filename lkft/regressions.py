@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import connection
+
+from lcr.settings import BUILD_FAILURES_SUMMARY_ENABLED
+
+from .models import ReportBuildFailuresSummary, ReportJob, TestCase
+
+logger = logging.getLogger(__name__)
+
+FAILED_RESULTS = ['fail', 'ASSUMPTION_FAILURE']
+
+# fields of the failures returned by compare_builds
+FAILURE_FIELDS = ('module_name', 'abi', 'test_name', 'result', 'message')
+
+# the failures of both builds with one query, at most one row for each (module, abi, test) of each build,
+# the rows with status 'regression' are only in the target build, 'fix' only in the base build,
+# and 'persistent' in both builds, with the result and message of the target build
+COMPARE_BUILDS_SQL = '''
+    WITH base AS (
+        SELECT DISTINCT ON (ts.name, ts.abi, tc.name) ts.name AS module_name, ts.abi, tc.name AS test_name, tc.result, tc.message
+        FROM lkft_testcase tc JOIN lkft_testsuite ts ON tc.testsuite_id = ts.id
+        WHERE ts.report_job_id = ANY(%(base_report_job_ids)s) AND tc.result = ANY(%(failed_results)s)
+        ORDER BY ts.name, ts.abi, tc.name
+    ), target AS (
+        SELECT DISTINCT ON (ts.name, ts.abi, tc.name) ts.name AS module_name, ts.abi, tc.name AS test_name, tc.result, tc.message
+        FROM lkft_testcase tc JOIN lkft_testsuite ts ON tc.testsuite_id = ts.id
+        WHERE ts.report_job_id = ANY(%(target_report_job_ids)s) AND tc.result = ANY(%(failed_results)s)
+        ORDER BY ts.name, ts.abi, tc.name
+    )
+    SELECT CASE WHEN base.test_name IS NULL THEN 'regression'
+                WHEN target.test_name IS NULL THEN 'fix'
+                ELSE 'persistent' END,
+           COALESCE(target.module_name, base.module_name),
+           COALESCE(target.abi, base.abi),
+           COALESCE(target.test_name, base.test_name),
+           COALESCE(target.result, base.result),
+           COALESCE(target.message, base.message)
+    FROM target FULL OUTER JOIN base
+        ON target.module_name = base.module_name
+        AND target.abi IS NOT DISTINCT FROM base.abi
+        AND target.test_name = base.test_name
+    ORDER BY 2, 4, 3
+'''
+
+
+def get_failure_key(failure):
+    return (failure.get('module_name'), failure.get('test_name'), failure.get('abi'))
+
+
+def diff_failures(base_failures=[], target_failures=[], key=get_failure_key):
+    '''
+        Compare the failures of two builds with the keys of the failures in sets,
+        instead of checking every pair of failures.
+        key: function that returns the hashable key of a failure,
+             the failures with the same key are treated as the same failure
+        Return the dict of lists in the order of the failures passed in:
+            'regressions': failures of the target build that are not in the base build
+            'fixes': failures of the base build that are not in the target build
+            'persistent': failures of the target build that are in the base build too
+    '''
+    base_keys = set([key(failure) for failure in base_failures])
+    target_keys = set([key(failure) for failure in target_failures])
+
+    return {
+        'regressions': [failure for failure in target_failures if key(failure) not in base_keys],
+        'fixes': [failure for failure in base_failures if key(failure) not in target_keys],
+        'persistent': [failure for failure in target_failures if key(failure) in base_keys],
+        }
+
+
+def get_report_job_ids(report_build):
+    # the resubmitted and duplicated jobs are not used for the results of the build
+    return list(ReportJob.objects.filter(report_build=report_build, resubmitted=False).values_list('id', flat=True))
+
+
+def get_failures_for_build(report_build):
+    '''
+        Return the failures of the build as dicts with FAILURE_FIELDS, one for each (module, abi, test),
+        from the failures summary of the build if it's saved, otherwise from the TestCase records
+    '''
+    # the summaries are not updated any more when they are disabled, see views.get_build_failures_summary
+    failures_summary = None
+    if BUILD_FAILURES_SUMMARY_ENABLED and report_build.finished:
+        failures_summary = ReportBuildFailuresSummary.objects.filter(report_build=report_build).values_list('failures', flat=True).first()
+
+    if failures_summary is not None:
+        qa_job_ids = set(str(qa_job_id) for qa_job_id in ReportJob.objects.filter(report_build=report_build, resubmitted=False)
+                                                                         .values_list('qa_job_id', flat=True))
+        failed_testcases = []
+        for qa_job_id, job_failed_testcases in failures_summary.items():
+            if qa_job_id in qa_job_ids:
+                failed_testcases.extend(job_failed_testcases)
+    else:
+        failed_testcases = TestCase.objects.filter(testsuite__report_job_id__in=get_report_job_ids(report_build), result__in=FAILED_RESULTS) \
+                                .values_list('testsuite__name', 'testsuite__abi', 'name', 'result', 'message', 'stacktrace')
+
+    failures = {}
+    for (module_name, abi, test_name, result, message, stacktrace) in failed_testcases:
+        failure = {
+                    'module_name': module_name,
+                    'abi': abi,
+                    'test_name': test_name,
+                    'result': result,
+                    'message': message,
+                  }
+        failures.setdefault(get_failure_key(failure), failure)
+
+    def get_sort_key(failure):
+        return (failure.get('module_name'), failure.get('test_name'), failure.get('abi') or '')
+
+    return sorted(failures.values(), key=get_sort_key)
+
+
+def compare_builds_in_database(base_report_build, target_report_build):
+    '''
+        Compare the failures of the two builds with one query on Postgres, see COMPARE_BUILDS_SQL
+    '''
+    params = {
+        'base_report_job_ids': get_report_job_ids(base_report_build),
+        'target_report_job_ids': get_report_job_ids(target_report_build),
+        'failed_results': FAILED_RESULTS,
+        }
+    comparison = {
+        'regressions': [],
+        'fixes': [],
+        'persistent': [],
+        }
+    status_lists = {
+        'regression': comparison['regressions'],
+        'fix': comparison['fixes'],
+        'persistent': comparison['persistent'],
+        }
+    with connection.cursor() as cursor:
+        cursor.execute(COMPARE_BUILDS_SQL, params)
+        for row in cursor.fetchall():
+            status_lists[row[0]].append(dict(zip(FAILURE_FIELDS, row[1:])))
+    return comparison
+
+
+def compare_builds(base_report_build, target_report_build):
+    '''
+        Compare the failures of two builds saved in database, without parsing the attachments again.
+        The failures are compared by (module, test, abi), and the diff is done by the database
+        on Postgres, or with sets of the keys of the failures otherwise.
+        Return the dict of 'regressions', 'fixes' and 'persistent' failures, see diff_failures
+    '''
+    if connection.vendor == 'postgresql':
+        return compare_builds_in_database(base_report_build, target_report_build)
+
+    return diff_failures(base_failures=get_failures_for_build(base_report_build),
+                         target_failures=get_failures_for_build(target_report_build))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import SimpleTestCase
+
+from lkft.bug_index import BugSummaryIndex
+
+
+class Bug():
+    def __init__(self, bug_id, summary):
+        self.id = bug_id
+        self.summary = summary
+
+
+class BugSummaryIndexTests(SimpleTestCase):
+
+    def test_find_bugs_by_key(self):
+        bug1 = Bug(1, "CtsFooTestCases android.foo.FooTest#testFail failed on hikey")
+        bug2 = Bug(2, "android.foo.FooTest#testFail failed")
+        bug3 = Bug(3, "CtsBarTestCases failed, and CtsBazTestCases failed")
+        bug4 = Bug(4, None)
+        index = BugSummaryIndex([bug1, bug2, bug3, bug4])
+
+        self.assertEqual(index.get_bugs("android.foo.FooTest#testFail"), [bug1, bug2])
+        self.assertEqual(index.get_bugs("CtsFooTestCases android.foo.FooTest#testFail"), [bug1])
+        self.assertEqual(index.get_bugs("CtsBarTestCases"), [bug3])
+        self.assertEqual(index.get_bugs("CtsBazTestCases"), [bug3])
+        self.assertEqual(index.get_bugs("testFail"), [bug1, bug2])
+        self.assertEqual(index.get_bugs("oo.FooTest#testFail"), [])
+        self.assertEqual(index.get_bugs("FooTest failed"), [])
+
+    def test_find_bug_in_order_of_keys(self):
+        bug1 = Bug(1, "CtsFooTestCases failed")
+        bug2 = Bug(2, "android.foo.FooTest#testFail failed")
+        index = BugSummaryIndex([bug1, bug2])
+        self.assertIs(index.find_bug(["android.foo.FooTest#testFail", "CtsFooTestCases"]), bug2)
+        self.assertIs(index.find_bug(["unknown", "CtsFooTestCases"]), bug1)
+        self.assertIsNone(index.find_bug(["unknown"]))
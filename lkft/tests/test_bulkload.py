@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from lkft.bulkload import TestCaseSync, hash_value, load_testcases, test_name_cache
+from lkft.models import ReportJob, TestCase as TestCaseRecord, TestName, TestSuite
+
+
+class LoadTestcasesTests(TestCase):
+
+    def setUp(self):
+        # the ids cached by the other tests are rolled back
+        test_name_cache.name_ids = {}
+        self.report_job = ReportJob.objects.create(job_name='cts', job_url='https://lava.example.com/scheduler/job/1')
+        self.test_module = TestSuite.objects.create(report_job=self.report_job, name='CtsFooTestCases', abi='arm64-v8a')
+
+    def get_row(self, name, result, message=None, stacktrace=None):
+        return (name, result, None, None, self.test_module.name, '1', 'lkft', self.test_module.id, message, stacktrace)
+
+    def test_load_testcases_interns_names(self):
+        self.assertEqual(load_testcases([self.get_row('testA', 'pass'), self.get_row('testB', 'fail')]), 2)
+        testcase = TestCaseRecord.objects.get(testsuite=self.test_module, name='testA')
+        self.assertEqual(testcase.interned_name.name, 'testA')
+        self.assertEqual(testcase.interned_suite.name, 'CtsFooTestCases')
+        self.assertEqual(TestName.objects.filter(name='CtsFooTestCases').count(), 1)
+        # the names are interned once
+        load_testcases([self.get_row('testA', 'fail')])
+        self.assertEqual(TestName.objects.filter(name='testA').count(), 1)
+        self.assertEqual(set(TestCaseRecord.objects.filter(testsuite=self.test_module, name='testA').values_list('interned_name_id', flat=True)),
+                         set([testcase.interned_name_id]))
+
+
+class TestCaseSyncTests(TestCase):
+
+    def setUp(self):
+        # the ids cached by the other tests are rolled back
+        test_name_cache.name_ids = {}
+        self.report_job = ReportJob.objects.create(job_name='cts', job_url='https://lava.example.com/scheduler/job/1')
+        self.test_module = TestSuite.objects.create(report_job=self.report_job, name='CtsFooTestCases', abi='arm64-v8a')
+
+    def get_row(self, name, result, message=None, stacktrace=None):
+        return (name, result, None, None, self.test_module.name, '1', 'lkft', self.test_module.id, message, stacktrace)
+
+    def get_results(self):
+        return sorted(TestCaseRecord.objects.filter(testsuite=self.test_module).values_list('name', 'result', 'message'))
+
+    def test_only_changes_applied(self):
+        load_testcases([self.get_row('testA', 'pass'), self.get_row('testB', 'fail', 'old message'), self.get_row('testC', 'fail')])
+        testcase_a_id = TestCaseRecord.objects.get(testsuite=self.test_module, name='testA').id
+
+        testcase_sync = TestCaseSync(TestCaseRecord.objects.filter(testsuite=self.test_module))
+        testcase_sync.apply([self.get_row('testA', 'pass'), self.get_row('testB', 'fail', 'new message'), self.get_row('testD', 'pass')])
+        testcase_sync.finish()
+
+        self.assertEqual((testcase_sync.number_inserted, testcase_sync.number_updated, testcase_sync.number_deleted), (1, 1, 1))
+        self.assertEqual(self.get_results(), [('testA', 'pass', None), ('testB', 'fail', 'new message'), ('testD', 'pass', None)])
+        # the record not changed is kept
+        self.assertEqual(TestCaseRecord.objects.get(testsuite=self.test_module, name='testA').id, testcase_a_id)
+
+    def test_messages_compared_with_hash(self):
+        load_testcases([self.get_row('testA', 'fail', 'expected: ü', 'at Foo.testA'), self.get_row('testB', 'fail', 'message', 'at Foo.testB')])
+
+        testcase_sync = TestCaseSync(TestCaseRecord.objects.filter(testsuite=self.test_module))
+        # the hashes of the messages are loaded instead of the messages
+        self.assertEqual(sorted(values for records in testcase_sync.existing.values() for (testcase_id, values) in records),
+                         [('fail', None, None, hash_value('expected: ü'), hash_value('at Foo.testA')),
+                          ('fail', None, None, hash_value('message'), hash_value('at Foo.testB'))])
+        testcase_sync.apply([self.get_row('testA', 'fail', 'expected: ü', 'at Foo.testA'), self.get_row('testB', 'fail', 'message', 'at Bar.testB')])
+        testcase_sync.finish()
+
+        self.assertEqual((testcase_sync.number_inserted, testcase_sync.number_updated, testcase_sync.number_deleted), (0, 1, 0))
+        self.assertEqual(TestCaseRecord.objects.get(testsuite=self.test_module, name='testB').stacktrace, 'at Bar.testB')
+
+    def test_same_names_kept(self):
+        load_testcases([self.get_row('testA', 'pass'), self.get_row('testA', 'pass')])
+        testcase_sync = TestCaseSync(TestCaseRecord.objects.filter(testsuite=self.test_module))
+        testcase_sync.apply([self.get_row('testA', 'pass')])
+        testcase_sync.finish()
+        self.assertEqual((testcase_sync.number_inserted, testcase_sync.number_updated, testcase_sync.number_deleted), (0, 0, 1))
+        self.assertEqual(self.get_results(), [('testA', 'pass', None)])
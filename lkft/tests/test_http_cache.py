@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from lcr.http_cache import HttpCache
+
+
+class HttpCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_set_and_get(self):
+        cache = HttpCache(self.cache_dir, max_size=1024 * 1024)
+        cache.set('https://example.com/a', 'content a', etag='"a"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT', ttl=60)
+        entry = cache.get('https://example.com/a')
+        self.assertEqual(entry.get('content'), 'content a')
+        self.assertEqual(entry.get('etag'), '"a"')
+        self.assertTrue(cache.is_fresh(entry))
+        self.assertIsNone(cache.get('https://example.com/b'))
+        self.assertEqual([name for name in os.listdir(self.cache_dir) if not name.endswith('.json')], [])
+
+    def test_expired_and_never_expired(self):
+        cache = HttpCache(self.cache_dir, max_size=1024 * 1024)
+        self.assertFalse(cache.is_fresh(cache.set('https://example.com/a', 'a', ttl=-1)))
+        self.assertTrue(cache.is_fresh(cache.set('https://example.com/b', 'b', ttl=None)))
+        entry = cache.touch('https://example.com/a', cache.get('https://example.com/a'), ttl=60)
+        self.assertTrue(cache.is_fresh(entry))
+        self.assertEqual(cache.get('https://example.com/a').get('content'), 'a')
+
+    def test_evict_least_recently_used(self):
+        cache = HttpCache(self.cache_dir, max_size=1024 * 1024)
+        for index in range(3):
+            cache.set('https://example.com/%d' % index, 'x' * 1000)
+            entry_path = cache.get_entry_path('https://example.com/%d' % index)
+            os.utime(entry_path, (time.time() - 100 + index, time.time() - 100 + index))
+        # the sizes of the entries differ with the times saved in them
+        cache.max_size = sum([os.path.getsize(cache.get_entry_path('https://example.com/%d' % index)) for index in (1, 2)])
+        cache.total_size = None
+        cache.evict()
+        self.assertIsNone(cache.get('https://example.com/0'))
+        self.assertIsNotNone(cache.get('https://example.com/1'))
+        self.assertIsNotNone(cache.get('https://example.com/2'))
+        self.assertEqual(cache.get_stats().get('evictions'), 1)
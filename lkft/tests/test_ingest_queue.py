@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from unittest import mock
+
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+
+from lcr.settings import INGEST_TASK_MAX_ATTEMPTS, INGEST_TASK_RETRY_BACKOFF
+
+from lkft import ingest_queue
+from lkft.models import IngestTask
+
+
+class ClaimTasksTests(TestCase):
+
+    def create_task(self, qa_job_id, **fields):
+        return IngestTask.objects.create(qa_job_id=qa_job_id, job_url='https://lava.example.com/scheduler/job/%s' % qa_job_id, **fields)
+
+    def test_claimed_by_priority(self):
+        self.create_task(1, priority=ingest_queue.PRIORITY_DEFAULT)
+        self.create_task(2, priority=ingest_queue.PRIORITY_CALLBACK)
+        self.create_task(3, priority=ingest_queue.PRIORITY_VIEW)
+        # not to be retried yet
+        self.create_task(4, priority=ingest_queue.PRIORITY_CALLBACK, run_after=timezone.now() + datetime.timedelta(hours=1))
+
+        tasks = ingest_queue.claim_tasks('worker-1', limit=2)
+        self.assertEqual([task.qa_job_id for task in tasks], [2, 3])
+        for task in IngestTask.objects.filter(qa_job_id__in=[2, 3]):
+            self.assertEqual((task.status, task.claimed_by, task.attempts), ('RUNNING', 'worker-1', 1))
+
+        # the running tasks are not claimed by other workers
+        self.assertEqual([task.qa_job_id for task in ingest_queue.claim_tasks('worker-2', limit=10)], [1])
+        self.assertEqual(ingest_queue.claim_tasks('worker-3', limit=10), [])
+
+    def test_rows_locked_with_skip_locked(self):
+        self.create_task(1)
+        select_for_update = QuerySet.select_for_update
+        calls = []
+
+        def record_select_for_update(queryset, *args, **kwargs):
+            calls.append(kwargs)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=record_select_for_update):
+            ingest_queue.claim_tasks('worker-1')
+        self.assertEqual(calls, [{'skip_locked': connection.features.has_select_for_update_skip_locked}])
+
+    def test_expired_claim_claimed_again(self):
+        self.create_task(1, status='RUNNING', attempts=1, claimed_by='worker-dead',
+                         claimed_until=timezone.now() - datetime.timedelta(seconds=1))
+        tasks = ingest_queue.claim_tasks('worker-1')
+        self.assertEqual([(task.claimed_by, task.attempts) for task in tasks], [('worker-1', 2)])
+        self.assertFalse(ingest_queue.update_claimed_task(IngestTask(id=tasks[0].id, claimed_by='worker-dead', attempts=1), last_error='late'))
+
+    def test_expired_claim_failed_after_max_attempts(self):
+        self.create_task(1, status='RUNNING', attempts=INGEST_TASK_MAX_ATTEMPTS, claimed_by='worker-dead',
+                         claimed_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(ingest_queue.claim_tasks('worker-1'), [])
+        self.assertEqual(IngestTask.objects.get(qa_job_id=1).status, 'FAILED')
+
+    def test_retry_with_backoff(self):
+        self.create_task(1)
+        task = ingest_queue.claim_tasks('worker-1')[0]
+
+        before_retry = timezone.now()
+        self.assertTrue(ingest_queue.run_task(task, mock.Mock(side_effect=Exception("attachment not found"))))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_error, task.claimed_until), ('QUEUED', 'attachment not found', None))
+        self.assertGreaterEqual(task.run_after, before_retry + datetime.timedelta(seconds=INGEST_TASK_RETRY_BACKOFF))
+        # not claimed before run_after
+        self.assertEqual(ingest_queue.claim_tasks('worker-1'), [])
+
+        IngestTask.objects.filter(id=task.id).update(run_after=timezone.now(), attempts=INGEST_TASK_MAX_ATTEMPTS - 1)
+        task = ingest_queue.claim_tasks('worker-1')[0]
+        ingest_queue.run_task(task, mock.Mock(side_effect=Exception("still not found")))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_error), ('FAILED', 'still not found'))
+
+    def test_finished(self):
+        self.create_task(1)
+        task = ingest_queue.claim_tasks('worker-1')[0]
+        handler = mock.Mock()
+        self.assertTrue(ingest_queue.run_task(task, handler))
+        handler.assert_called_once_with(task)
+        self.assertEqual(IngestTask.objects.get(id=task.id).status, 'DONE')
+
+    def test_batch_task_claimed_by_another_worker(self):
+        self.create_task(1)
+        self.create_task(2)
+        first_task, second_task = ingest_queue.claim_tasks('worker-1', limit=2)
+
+        # the first task took longer than the visibility timeout of the second one
+        IngestTask.objects.filter(id=second_task.id).update(claimed_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual([task.id for task in ingest_queue.claim_tasks('worker-2')], [second_task.id])
+
+        handler = mock.Mock()
+        self.assertTrue(ingest_queue.run_task(first_task, handler))
+        self.assertFalse(ingest_queue.run_task(second_task, handler))
+        handler.assert_called_once_with(first_task)
+        self.assertEqual(IngestTask.objects.get(id=second_task.id).claimed_by, 'worker-2')
+
+    def test_callback_task_not_queued_again(self):
+        job_url = 'https://lava.example.com/scheduler/job/5'
+        self.assertTrue(ingest_queue.enqueue_qa_job(5))
+        self.assertFalse(ingest_queue.enqueue_qa_job(5))
+
+        # queued with only the qa-report job id
+        self.assertEqual(ingest_queue.enqueue_jobs([{'id': 5, 'external_url': job_url}]), set([job_url]))
+        self.assertEqual(IngestTask.objects.filter(qa_job_id=5).count(), 1)
+        self.assertEqual(IngestTask.objects.get(qa_job_id=5).priority, ingest_queue.PRIORITY_CALLBACK)
+
+        task = ingest_queue.claim_tasks('worker-1')[0]
+        self.assertEqual(ingest_queue.get_ingesting_job_urls([job_url]), set())
+        self.assertTrue(ingest_queue.set_task_job_url(task, {'id': 5, 'external_url': job_url}))
+        self.assertEqual(ingest_queue.get_ingesting_job_urls([job_url]), set([job_url]))
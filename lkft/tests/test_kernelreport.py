@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from lkft.management.commands.kernelreport import ReportCache
+
+
+class ReportCacheTests(SimpleTestCase):
+
+    def test_value_fetched_once_for_concurrent_callers(self):
+        cache = ReportCache(workers=1)
+        number_calls = []
+
+        def fetch():
+            number_calls.append(1)
+            time.sleep(0.1)
+            return {'id': 1, 'jobs': []}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(('build', 1), fetch))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(number_calls), 1)
+        self.assertEqual(results, [{'id': 1, 'jobs': []}] * 5)
+
+    def test_copies_returned(self):
+        cache = ReportCache(workers=1)
+        value = cache.get(('build', 1), lambda: {'jobs': []})
+        value['jobs'].append('changed')
+        self.assertEqual(cache.get(('build', 1), lambda: {'jobs': ['not called']}), {'jobs': []})
+
+    def test_value_fetched_again_after_failure(self):
+        cache = ReportCache(workers=1)
+
+        def fail():
+            raise Exception("failed")
+
+        with self.assertRaises(Exception):
+            cache.get(('build', 1), fail)
+        self.assertEqual(cache.get(('build', 1), lambda: {'id': 1}), {'id': 1})
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import email.utils
+import time
+
+from unittest import mock
+
+import requests
+
+from django.test import SimpleTestCase
+
+from lcr import qa_report
+from lcr.qa_report import QAReportApi, RESTFullApi, TooManyRequestException, get_retry_delay
+from lcr.settings import HTTP_BACKOFF_FACTOR, HTTP_MAX_BACKOFF
+
+
+def get_response(status_code, headers={}):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    response._content = b''
+    return response
+
+
+class RetryDelayTests(SimpleTestCase):
+
+    def test_exponential_backoff(self):
+        self.assertEqual(get_retry_delay(None, 0), HTTP_BACKOFF_FACTOR)
+        self.assertEqual(get_retry_delay(get_response(503), 2), min(HTTP_BACKOFF_FACTOR * 4, HTTP_MAX_BACKOFF))
+        self.assertEqual(get_retry_delay(None, 100), HTTP_MAX_BACKOFF)
+
+    def test_retry_after(self):
+        self.assertEqual(get_retry_delay(get_response(429, {'Retry-After': '7'}), 0), 7)
+        self.assertEqual(get_retry_delay(get_response(429, {'Retry-After': '%d' % (HTTP_MAX_BACKOFF + 1)}), 0), HTTP_MAX_BACKOFF)
+        retry_after = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(get_retry_delay(get_response(503, {'Retry-After': retry_after}), 0), 30, delta=2)
+        # a date in the past
+        retry_after = email.utils.formatdate(time.time() - 30, usegmt=True)
+        self.assertEqual(get_retry_delay(get_response(503, {'Retry-After': retry_after}), 0), 0)
+        # not a valid value
+        self.assertEqual(get_retry_delay(get_response(503, {'Retry-After': 'soon'}), 1), HTTP_BACKOFF_FACTOR * 2)
+
+
+class RequestWithRetryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        patcher = mock.patch.object(qa_report, 'get_http_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(qa_report.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.api = RESTFullApi('example.com', None, max_retries=2)
+
+    def test_get_retried(self):
+        self.session.request.side_effect = [requests.exceptions.ConnectionError("reset"),
+                                            get_response(503, {'Retry-After': '5'}),
+                                            get_response(200)]
+        self.assertEqual(self.api.request_with_retry('https://example.com/api/').status_code, 200)
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [get_retry_delay(None, 0), 5])
+
+    def test_not_retried_for_other_errors(self):
+        self.session.request.side_effect = [get_response(404)]
+        self.assertEqual(self.api.request_with_retry('https://example.com/api/').status_code, 404)
+        self.sleep.assert_not_called()
+
+    def test_post_only_retried_for_429(self):
+        self.session.request.side_effect = [get_response(429), get_response(503)]
+        self.assertEqual(self.api.request_with_retry('https://example.com/api/', method='POST').status_code, 503)
+        self.assertEqual(self.session.request.call_count, 2)
+
+        self.session.request.side_effect = [requests.exceptions.ConnectionError("reset")]
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.api.request_with_retry('https://example.com/api/', method='POST')
+
+    def test_too_many_requests_after_retries(self):
+        self.session.request.side_effect = [get_response(429)] * 3
+        with self.assertRaises(TooManyRequestException):
+            self.api.call_with_full_url('https://example.com/api/')
+        self.assertEqual(self.session.request.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+
+class OffsetPageUrlsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.qa_report_api = QAReportApi('qa-reports.example.com', None)
+
+    def test_page_urls(self):
+        first_page = {
+            'count': 120,
+            'next': 'https://qa-reports.example.com/api/builds/?limit=50&offset=50&ordering=-id',
+            'results': [],
+        }
+        self.assertEqual(self.qa_report_api.get_offset_page_urls(first_page), [
+            'https://qa-reports.example.com/api/builds/?limit=50&offset=50&ordering=-id',
+            'https://qa-reports.example.com/api/builds/?limit=50&offset=100&ordering=-id',
+        ])
+
+    def test_not_offset_pagination(self):
+        self.assertIsNone(self.qa_report_api.get_offset_page_urls({'count': 120, 'next': None}))
+        self.assertIsNone(self.qa_report_api.get_offset_page_urls({'next': 'https://qa-reports.example.com/api/builds/?limit=50&offset=50'}))
+        self.assertIsNone(self.qa_report_api.get_offset_page_urls({'count': 120, 'next': 'https://qa-reports.example.com/api/builds/?cursor=abc'}))
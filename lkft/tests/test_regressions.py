@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import SimpleTestCase, TestCase
+
+from lkft.bulkload import load_testcases, test_name_cache
+from lkft.models import ReportBuild, ReportBuildFailuresSummary, ReportJob, TestCase as TestCaseRecord, TestSuite
+from lkft.regressions import compare_builds, diff_failures
+from lkft.views import update_failures_summaries
+
+
+class DiffFailuresTests(SimpleTestCase):
+
+    def test_diff(self):
+        failure_a = {'module_name': 'CtsFoo', 'test_name': 'testA', 'abi': 'arm64-v8a'}
+        failure_a_32 = {'module_name': 'CtsFoo', 'test_name': 'testA', 'abi': 'armeabi-v7a'}
+        failure_b = {'module_name': 'CtsFoo', 'test_name': 'testB', 'abi': 'arm64-v8a'}
+        failure_c = {'module_name': 'CtsBar', 'test_name': 'testC', 'abi': None}
+
+        comparison = diff_failures(base_failures=[failure_a, failure_b], target_failures=[failure_c, failure_a_32, failure_b])
+        self.assertEqual(comparison.get('regressions'), [failure_c, failure_a_32])
+        self.assertEqual(comparison.get('fixes'), [failure_a])
+        self.assertEqual(comparison.get('persistent'), [failure_b])
+
+    def test_diff_with_key(self):
+        comparison = diff_failures(base_failures=[{'test_name': 'a'}, {'test_name': 'b'}],
+                                   target_failures=[{'test_name': 'b'}, {'test_name': 'c'}],
+                                   key=lambda failure: failure['test_name'])
+        self.assertEqual(comparison, {
+            'regressions': [{'test_name': 'c'}],
+            'fixes': [{'test_name': 'a'}],
+            'persistent': [{'test_name': 'b'}],
+        })
+
+
+class CompareBuildsTests(TestCase):
+
+    def setUp(self):
+        test_name_cache.name_ids = {}
+
+    def create_build(self, qa_build_id, failures, resubmitted_failures=[]):
+        report_build = ReportBuild.objects.create(version='build-%s' % qa_build_id, qa_build_id=qa_build_id)
+        for index, job_failures in enumerate((failures, resubmitted_failures)):
+            report_job = ReportJob.objects.create(job_name='cts', report_build=report_build, results_cached=True,
+                                                  resubmitted=(index == 1), qa_job_id=qa_build_id * 10 + index,
+                                                  job_url='https://lava.example.com/scheduler/job/%s%s' % (qa_build_id, index))
+            for (module_name, abi, test_name) in job_failures:
+                test_module, created = TestSuite.objects.get_or_create(report_job=report_job, name=module_name, abi=abi)
+                load_testcases([(test_name, 'fail', None, None, module_name, str(report_job.id), 'lkft', test_module.id, 'failed', None)])
+        return report_build
+
+    def get_keys(self, failures):
+        return [(failure.get('module_name'), failure.get('abi'), failure.get('test_name')) for failure in failures]
+
+    def test_compare_builds(self):
+        base_report_build = self.create_build(1, [('CtsFoo', 'arm64-v8a', 'testA'), ('CtsFoo', 'arm64-v8a', 'testB')])
+        target_report_build = self.create_build(2, [('CtsFoo', 'arm64-v8a', 'testB'), ('CtsFoo', 'armeabi-v7a', 'testA')],
+                                                # the failures of the resubmitted jobs are not compared
+                                                resubmitted_failures=[('CtsBar', 'arm64-v8a', 'testC')])
+
+        comparison = compare_builds(base_report_build, target_report_build)
+        self.assertEqual(self.get_keys(comparison.get('regressions')), [('CtsFoo', 'armeabi-v7a', 'testA')])
+        self.assertEqual(self.get_keys(comparison.get('fixes')), [('CtsFoo', 'arm64-v8a', 'testA')])
+        self.assertEqual(self.get_keys(comparison.get('persistent')), [('CtsFoo', 'arm64-v8a', 'testB')])
+
+    def test_compare_builds_with_failures_summaries(self):
+        base_report_build = self.create_build(1, [('CtsFoo', 'arm64-v8a', 'testA'), ('CtsFoo', 'arm64-v8a', 'testB')])
+        target_report_build = self.create_build(2, [('CtsFoo', 'arm64-v8a', 'testB'), ('CtsFoo', 'armeabi-v7a', 'testA')],
+                                                resubmitted_failures=[('CtsBar', 'arm64-v8a', 'testC')])
+        ReportBuild.objects.all().update(finished=True)
+        report_jobs = list(ReportJob.objects.select_related('report_build'))
+        update_failures_summaries(report_jobs, [])
+        self.assertEqual(ReportBuildFailuresSummary.objects.count(), 2)
+
+        # the failures are read from the summaries once they are saved
+        ReportJob.objects.all().update(results_cached=False)
+        TestCaseRecord.objects.all().delete()
+        base_report_build.refresh_from_db()
+        target_report_build.refresh_from_db()
+        comparison = compare_builds(base_report_build, target_report_build)
+        self.assertEqual(self.get_keys(comparison.get('regressions')), [('CtsFoo', 'armeabi-v7a', 'testA')])
+        self.assertEqual(self.get_keys(comparison.get('fixes')), [('CtsFoo', 'arm64-v8a', 'testA')])
+        self.assertEqual(self.get_keys(comparison.get('persistent')), [('CtsFoo', 'arm64-v8a', 'testB')])
+
+    def test_failures_summary_dropped_for_unfinished_build(self):
+        report_build = self.create_build(1, [('CtsFoo', 'arm64-v8a', 'testA')])
+        report_job = ReportJob.objects.filter(report_build=report_build, resubmitted=False).first()
+        ReportBuildFailuresSummary.objects.create(report_build=report_build, failures={})
+
+        # the summary is kept when the results of the jobs are not changed
+        update_failures_summaries([report_job], [])
+        self.assertTrue(ReportBuildFailuresSummary.objects.filter(report_build=report_build).exists())
+
+        update_failures_summaries([report_job], [{'job_url': report_job.job_url, 'result': 'saved'}])
+        self.assertFalse(ReportBuildFailuresSummary.objects.filter(report_build=report_build).exists())
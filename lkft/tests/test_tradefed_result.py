@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from lkft.tradefed_result import XmlCharRefFilter, iterparse_tradefed_result, ResultsArtifactWriter, ResultsArtifact
+
+
+TEST_RESULT_XML = b'''<?xml version='1.0' encoding='UTF-8' standalone='no' ?>
+<Result>
+  <Summary pass="2" failed="1" modules_done="2" modules_total="2" />
+  <Module name="CtsFooTestCases" abi="arm64-v8a" done="true" pass="2" total_tests="3">
+    <TestCase name="android.foo.FooTest">
+      <Test result="pass" name="testPass" />
+      <Test result="fail" name="testFail">
+        <Failure message="expected:&lt;1&gt; but was:&lt;2&gt;">
+          <StackTrace>java.lang.AssertionError</StackTrace>
+        </Failure>
+      </Test>
+      <Test result="pass" name="testPass2_64bit" />
+    </TestCase>
+  </Module>
+  <Module name="CtsBarTestCases" abi="armeabi-v7a" done="false" pass="0" total_tests="1">
+    <TestCase name="android.bar.BarTest">
+      <Test result="ASSUMPTION_FAILURE" name="testAssumption" />
+    </TestCase>
+  </Module>
+</Result>
+'''
+
+
+class IterparseTradefedResultTests(SimpleTestCase):
+
+    def get_events(self, batch_size=10000, chunk_size=16):
+        chunks = [TEST_RESULT_XML[i:i + chunk_size] for i in range(0, len(TEST_RESULT_XML), chunk_size)]
+        return list(iterparse_tradefed_result(chunks, batch_size=batch_size))
+
+    def test_events(self):
+        events = self.get_events()
+        self.assertEqual([event for event, value in events],
+                         ['module_start', 'tests', 'module_end', 'module_start', 'tests', 'module_end', 'summary'])
+
+        self.assertEqual(events[0][1], {'name': 'CtsFooTestCases', 'abi': 'arm64-v8a', 'done': 'true', 'pass': '2', 'total_tests': '3'})
+        self.assertEqual(events[1][1], [
+            {'name': 'android.foo.FooTest#testPass#arm64-v8a', 'result': 'pass', 'message': None, 'stacktrace': None},
+            {'name': 'android.foo.FooTest#testFail#arm64-v8a', 'result': 'fail',
+             'message': 'expected:<1> but was:<2>', 'stacktrace': 'java.lang.AssertionError'},
+            {'name': 'android.foo.FooTest#testPass2_64bit', 'result': 'pass', 'message': None, 'stacktrace': None},
+        ])
+        self.assertEqual(events[2][1], {'name': 'CtsFooTestCases', 'abi': 'arm64-v8a', 'number_tests': 3})
+        self.assertEqual(events[-1][1], {
+            'number_passed': 2,
+            'number_failed': 1,
+            'number_assumption_failure': 1,
+            'number_ignored': 0,
+            'number_total': 4,
+            'modules_done': 2,
+            'modules_total': 2,
+        })
+
+    def test_tests_in_batches(self):
+        events = self.get_events(batch_size=2)
+        self.assertEqual([len(value) for event, value in events if event == 'tests'], [2, 1, 1])
+
+    def test_invalid_content(self):
+        with self.assertRaises(Exception):
+            list(iterparse_tradefed_result([b'<Result><Module name="x">']))
+
+
+class XmlCharRefFilterTests(SimpleTestCase):
+
+    def read_filtered(self, content, chunk_size):
+        f_filtered = XmlCharRefFilter(io.BytesIO(content), chunk_size=chunk_size)
+        return (b''.join(f_filtered), f_filtered.number_removed)
+
+    def test_invalid_char_refs_removed(self):
+        content = b'<a>x&#27;y&#x1b;z&#9;&#xD7FF;&amp;</a>'
+        self.assertEqual(self.read_filtered(content, 1024), (b'<a>xyz&#9;&#xD7FF;&amp;</a>', 2))
+
+    def test_char_refs_split_across_chunks(self):
+        content = b'<a>' + b'x&#x1b;' * 100 + b'&#65;</a>'
+        for chunk_size in (1, 2, 3, 5, 7):
+            self.assertEqual(self.read_filtered(content, chunk_size), (b'<a>' + b'x' * 100 + b'&#65;</a>', 100))
+
+    def test_read_with_size(self):
+        f_filtered = XmlCharRefFilter(io.BytesIO(b'abc&#0;def'), chunk_size=2)
+        self.assertEqual(f_filtered.read(4), b'abcd')
+        self.assertEqual(f_filtered.read(), b'ef')
+        self.assertEqual(f_filtered.read(), b'')
+
+
+class ResultsArtifactTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_round_trip(self):
+        writer = ResultsArtifactWriter()
+        writer.append(30, 1, 'pass')
+        writer.append(10, 2, 'fail')
+        writer.append(20, 1, 'IGNORED')
+        writer.append(10, 3, 'ASSUMPTION_FAILURE')
+        writer.append(40, 1, 'unknown')
+        artifact_path = os.path.join(self.tmp_dir, 'results.bin')
+        writer.save(artifact_path)
+        self.assertEqual(os.listdir(self.tmp_dir), ['results.bin'])
+
+        with ResultsArtifact(artifact_path) as artifact:
+            self.assertEqual(len(artifact), 5)
+            self.assertEqual(sorted(artifact.find(10)), [(2, 'fail'), (3, 'ASSUMPTION_FAILURE')])
+            self.assertEqual(artifact.find(20), [(1, 'IGNORED')])
+            self.assertEqual(artifact.find(40), [(1, None)])
+            self.assertEqual(artifact.find(25), [])
+            self.assertEqual([name_id for (name_id, suite_id, result) in artifact], [10, 10, 20, 30, 40])
+
+    def test_not_an_artifact(self):
+        artifact_path = os.path.join(self.tmp_dir, 'results.bin')
+        with open(artifact_path, 'wb') as f_artifact:
+            f_artifact.write(b'NOTRESULTS' + b'\0' * 16)
+        with self.assertRaises(ValueError):
+            ResultsArtifact(artifact_path)
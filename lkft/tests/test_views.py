@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import io
+import lzma
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from lkft import views
+from lkft.models import IngestTask, KernelChange, ReportBuild, ReportJob, ReportProject, ReportProjectSnapshot
+from lkft.views import cache_qajobs_to_database, download_extract_save_result, get_projects_with_snapshot, poll_project_builds, update_project_snapshot_for_build
+
+
+def get_qa_job(qa_job_id, qa_build_id=1, **fields):
+    job = {
+        'id': qa_job_id,
+        'name': 'lkft-cts-%s' % qa_job_id,
+        'external_url': 'https://lava.example.com/scheduler/job/%s' % qa_job_id,
+        'job_status': 'Running',
+        'environment': 'hikey',
+        'target_build': 'https://qa-reports.example.com/api/builds/%s/' % qa_build_id,
+        'submitted_at': '2026-10-01T00:00:00Z',
+    }
+    job.update(fields)
+    return job
+
+
+class CacheQajobsToDatabaseTests(TestCase):
+
+    def setUp(self):
+        self.report_build = ReportBuild.objects.create(version='build-1', qa_build_id=1)
+
+    def test_new_jobs_created(self):
+        jobs = [get_qa_job(qa_job_id) for qa_job_id in range(1, 6)]
+        with self.assertNumQueries(2):
+            report_jobs = cache_qajobs_to_database(jobs, report_build=self.report_build)
+
+        self.assertEqual(sorted(report_jobs.keys()), sorted(job.get('external_url') for job in jobs))
+        self.assertEqual(ReportJob.objects.filter(report_build=self.report_build, status='Running').count(), 5)
+        report_job = ReportJob.objects.get(qa_job_id=1)
+        self.assertEqual((report_job.job_name, report_job.environment), ('lkft-cts-1', 'hikey'))
+
+    def test_only_changed_fields_updated(self):
+        cache_qajobs_to_database([get_qa_job(1), get_qa_job(2), get_qa_job(3)], report_build=self.report_build)
+        # ingested after the jobs were read from qa-report
+        ReportJob.objects.filter(qa_job_id=1).update(number_passed=10, results_cached=True, finished_successfully=True)
+
+        jobs = [get_qa_job(1, job_status='Complete'), get_qa_job(2, job_status='Complete'), get_qa_job(3)]
+        with CaptureQueriesContext(connection) as queries:
+            cache_qajobs_to_database(jobs, report_build=self.report_build)
+
+        updates = [query.get('sql') for query in queries.captured_queries if query.get('sql').startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status"', updates[0])
+        self.assertNotIn('"number_passed"', updates[0])
+        self.assertNotIn('"results_cached"', updates[0])
+
+        report_job = ReportJob.objects.get(qa_job_id=1)
+        self.assertEqual((report_job.status, report_job.number_passed, report_job.results_cached), ('Complete', 10, True))
+        self.assertEqual(ReportJob.objects.get(qa_job_id=3).status, 'Running')
+
+    def test_nothing_updated_when_not_changed(self):
+        jobs = [get_qa_job(1), get_qa_job(2)]
+        cache_qajobs_to_database(jobs, report_build=self.report_build)
+        with self.assertNumQueries(1):
+            report_jobs = cache_qajobs_to_database(jobs, report_build=self.report_build)
+        self.assertEqual(len(report_jobs), 2)
+        self.assertEqual(ReportJob.objects.count(), 2)
+
+
+class ProjectSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.db_report_project = ReportProject.objects.create(group='android-lkft', name='5.15-gki-android14-aosp', slug='5.15-gki-android14-aosp', project_id=1)
+
+    def create_build(self, qa_build_id, number_failed, status='JOBSCOMPLETED'):
+        db_report_build = ReportBuild.objects.create(qa_project=self.db_report_project, version='build-%s' % qa_build_id, qa_build_id=qa_build_id,
+                                                     number_passed=100, number_failed=number_failed, number_total=100 + number_failed, status=status)
+        update_project_snapshot_for_build(db_report_build)
+        return db_report_build
+
+    def get_snapshot(self):
+        return ReportProjectSnapshot.objects.get(project=self.db_report_project)
+
+    def test_updated_with_last_builds(self):
+        self.create_build(10, number_failed=5)
+        snapshot = self.get_snapshot()
+        self.assertEqual((snapshot.last_qa_build_id, snapshot.previous_qa_build_id, snapshot.status), (10, None, 'JOBSCOMPLETED'))
+        self.assertEqual(snapshot.numbers.get('number_regressions'), 0)
+
+        last_build = self.create_build(11, number_failed=8, status='JOBSINPROGRESS')
+        snapshot = self.get_snapshot()
+        self.assertEqual((snapshot.last_build, snapshot.previous_qa_build_id, snapshot.status), (last_build, 10, 'JOBSINPROGRESS'))
+        self.assertEqual((snapshot.numbers.get('number_failed'), snapshot.numbers.get('number_regressions')), (8, 3))
+
+        # the last build is updated after more jobs are ingested
+        last_build.number_failed = 4
+        last_build.status = 'JOBSCOMPLETED'
+        last_build.save()
+        update_project_snapshot_for_build(last_build)
+        snapshot = self.get_snapshot()
+        self.assertEqual((snapshot.numbers.get('number_failed'), snapshot.numbers.get('number_regressions'), snapshot.status), (4, -1, 'JOBSCOMPLETED'))
+
+    def test_not_updated_with_older_builds(self):
+        self.create_build(10, number_failed=5)
+        self.create_build(11, number_failed=8)
+        older_build = ReportBuild.objects.create(qa_project=self.db_report_project, version='build-9', qa_build_id=9, number_failed=1,
+                                                 status='JOBSCOMPLETED')
+        with self.assertNumQueries(1):
+            update_project_snapshot_for_build(older_build)
+        snapshot = self.get_snapshot()
+        self.assertEqual((snapshot.last_qa_build_id, snapshot.previous_qa_build_id), (11, 10))
+
+    def test_not_created_when_read(self):
+        ReportBuild.objects.create(qa_project=self.db_report_project, version='build-10', qa_build_id=10, number_failed=5, status='JOBSCOMPLETED')
+        with self.assertNumQueries(1):
+            db_report_projects = get_projects_with_snapshot(groups=['android-lkft'])
+        self.assertEqual([db_report_project.snapshot.last_qa_build_id for db_report_project in db_report_projects], [None])
+        self.assertFalse(ReportProjectSnapshot.objects.exists())
+
+        call_command('backfillprojectsnapshots')
+        self.assertEqual(self.get_snapshot().last_qa_build_id, 10)
+        with self.assertNumQueries(1):
+            db_report_projects = get_projects_with_snapshot(groups=['android-lkft'])
+        self.assertEqual([db_report_project.snapshot.numbers.get('number_failed') for db_report_project in db_report_projects], [5])
+
+
+class JobFinishedTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(views, 'submit_task')
+        self.submit_task = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(views.queued_qa_job_ids.clear)
+
+    def post_job_finished(self, qa_job_id):
+        return self.client.post('/lkft/jobfinished/%s/' % qa_job_id).content.decode()
+
+    @mock.patch.object(views, 'INGEST_QUEUE_ENABLED', False)
+    def test_ingested_once_in_process(self):
+        self.assertEqual(self.post_job_finished(123), '')
+        self.assertIn('ingestion of job 123 is already queued', self.post_job_finished(123))
+        self.assertEqual(self.post_job_finished(124), '')
+        self.assertEqual([call.args[1] for call in self.submit_task.call_args_list], ['123', '124'])
+
+        # queued again after the ingestion of the job
+        with mock.patch.object(views, 'ingest_finished_job') as ingest_finished_job:
+            views.ingest_submitted_job('123')
+        ingest_finished_job.assert_called_once_with('123')
+        self.assertEqual(self.post_job_finished(123), '')
+        self.assertEqual(self.submit_task.call_count, 3)
+
+    @mock.patch.object(views, 'INGEST_QUEUE_ENABLED', True)
+    def test_queued_once(self):
+        self.assertEqual(self.post_job_finished(123), '')
+        self.assertIn('already queued', self.post_job_finished(123))
+        self.submit_task.assert_not_called()
+        self.assertEqual(list(IngestTask.objects.values_list('qa_job_id', 'status')), [(123, 'QUEUED')])
+
+        # queued again after the ingestion of the job
+        IngestTask.objects.update(status='DONE')
+        self.assertEqual(self.post_job_finished(123), '')
+        self.assertEqual(IngestTask.objects.filter(qa_job_id=123, status='QUEUED').count(), 1)
+
+    @mock.patch.object(views, 'INGEST_QUEUE_ENABLED', True)
+    def test_lava_callback_for_cached_job(self):
+        lava_config = list(views.LAVA_SERVERS.values())[0]
+        ReportJob.objects.create(job_name='cts', qa_job_id=123, job_url='https://%s/scheduler/job/4567' % lava_config.get('hostname'))
+        lava_nick = list(views.LAVA_SERVERS.keys())[0]
+
+        self.assertIn('not cached yet', self.client.post('/lkft/jobfinished-lava/%s/4568/' % lava_nick).content.decode())
+        self.assertEqual(self.client.post('/lkft/jobfinished-lava/%s/4567/' % lava_nick).content.decode(), '')
+        # the same job from the qa-report callback
+        self.assertIn('already queued', self.post_job_finished(123))
+        self.assertEqual(IngestTask.objects.count(), 1)
+
+
+class PollProjectBuildsTests(TestCase):
+
+    def setUp(self):
+        self.qa_project = {'id': 1, 'name': '5.15-gki-android14-aosp', 'full_name': 'android-lkft/5.15-gki-android14-aosp'}
+        self.db_report_project = ReportProject.objects.create(group='android-lkft', name=self.qa_project.get('name'),
+                                                              slug=self.qa_project.get('name'), project_id=1)
+        self.qa_builds = {}
+        self.polled_qa_build_ids = []
+
+        patcher = mock.patch.object(views, 'qa_report_api')
+        qa_report_api = patcher.start()
+        self.addCleanup(patcher.stop)
+        qa_report_api.get_aware_datetime_from_str.side_effect = lambda created_at: created_at
+        qa_report_api.iter_list_results.side_effect = \
+                lambda api_url: iter(sorted(self.qa_builds.values(), key=lambda build: build.get('id'), reverse=True))
+        qa_report_api.get_build.side_effect = lambda qa_build_id: self.qa_builds.get(qa_build_id)
+
+        patcher = mock.patch.object(views, 'poll_build', side_effect=self.poll_build)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_build(self, qa_build_id, version=None, days_ago=0):
+        self.qa_builds[qa_build_id] = {
+            'id': qa_build_id,
+            'version': version or 'build-%s' % qa_build_id,
+            'project': 'https://qa-reports.example.com/api/projects/1/',
+            'created_at': timezone.now() - datetime.timedelta(days=days_ago),
+            'finished': False,
+        }
+
+    def poll_build(self, build, db_report_project=None, status='JOBSCOMPLETED'):
+        self.polled_qa_build_ids.append(build.get('id'))
+        db_report_build, created = ReportBuild.objects.get_or_create(qa_build_id=build.get('id'),
+                                                                     defaults={'qa_project': db_report_project, 'version': build.get('version')})
+        db_report_build.status = status
+        db_report_build.finished = (status == 'JOBSCOMPLETED')
+        db_report_build.number_passed = 10
+        db_report_build.save()
+        update_project_snapshot_for_build(db_report_build)
+        return db_report_build
+
+    def poll(self, versions=None):
+        self.polled_qa_build_ids = []
+        poll_project_builds(self.qa_project, versions=versions)
+        self.db_report_project.refresh_from_db()
+        return self.polled_qa_build_ids
+
+    def test_first_poll_back_to_oldest_kernel_change(self):
+        KernelChange.objects.create(branch='android14-5.15', describe='android14-5.15-1', trigger_name='trigger', timestamp=timezone.now() - datetime.timedelta(days=3))
+        KernelChange.objects.create(branch='android14-5.15', describe='android14-5.15-0', trigger_name='trigger', reported=True,
+                                    timestamp=timezone.now() - datetime.timedelta(days=30))
+        for qa_build_id, days_ago in ((10, 10), (11, 5), (12, 2), (13, 1)):
+            self.add_build(qa_build_id, days_ago=days_ago)
+
+        self.assertEqual(self.poll(), [13, 12])
+        self.assertEqual(self.db_report_project.polled_qa_build_id, 13)
+
+    def test_only_new_and_open_builds_polled(self):
+        self.add_build(10, days_ago=2)
+        self.add_build(11, days_ago=1)
+        self.db_report_project.polled_qa_build_id = 9
+        self.db_report_project.save()
+        self.assertEqual(self.poll(), [11, 10])
+        self.assertEqual(self.db_report_project.polled_qa_build_id, 11)
+
+        # nothing changed
+        self.assertEqual(self.poll(), [])
+
+        # a build not completed yet is polled again with the new builds
+        ReportBuild.objects.filter(qa_build_id=10).update(status='JOBSINPROGRESS')
+        self.add_build(12)
+        self.assertEqual(self.poll(), [12, 10])
+        self.assertEqual(self.db_report_project.polled_qa_build_id, 12)
+
+    def test_watermark_not_moved_when_failed(self):
+        self.db_report_project.polled_qa_build_id = 9
+        self.db_report_project.save()
+        self.add_build(10)
+        with mock.patch.object(views, 'poll_build', side_effect=Exception("qa-report is down")):
+            with self.assertRaises(Exception):
+                self.poll()
+        self.db_report_project.refresh_from_db()
+        self.assertEqual(self.db_report_project.polled_qa_build_id, 9)
+        self.assertEqual(self.poll(), [10])
+
+    def test_builds_of_other_versions_polled_later(self):
+        self.add_build(10, version='android14-5.15-1', days_ago=2)
+        self.poll_build(self.qa_builds[10], db_report_project=self.db_report_project)
+        self.db_report_project.polled_qa_build_id = 10
+        self.db_report_project.save()
+
+        self.add_build(11, version='android14-5.15-2', days_ago=1)
+        self.add_build(12, version='android14-5.15-3')
+        self.assertEqual(self.poll(versions=['android14-5.15-2']), [11])
+        self.assertEqual(self.db_report_project.polled_qa_build_id, 12)
+        # saved without the jobs, and not used for the snapshot
+        self.assertEqual(ReportBuild.objects.get(qa_build_id=12).status, 'NOINFO')
+        snapshot = ReportProjectSnapshot.objects.get(project=self.db_report_project)
+        self.assertEqual((snapshot.last_qa_build_id, snapshot.previous_qa_build_id), (11, 10))
+        self.assertEqual(snapshot.numbers.get('number_passed'), 10)
+
+        # below the watermark, but not completed yet
+        self.assertEqual(self.poll(versions=['android14-5.15-3']), [12])
+        self.assertEqual(ReportProjectSnapshot.objects.get(project=self.db_report_project).last_qa_build_id, 12)
+
+
+class DownloadExtractSaveResultTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.result_zip_path = os.path.join(self.tmp_dir, 'lkft-1234.zip')
+
+    def get_attachment(self, files):
+        f_tar = io.BytesIO()
+        with tarfile.open(fileobj=f_tar, mode='w') as tar:
+            for name, content in files:
+                tarinfo = tarfile.TarInfo(name)
+                tarinfo.size = len(content)
+                tar.addfile(tarinfo, io.BytesIO(content))
+        return lzma.compress(f_tar.getvalue())
+
+    def download(self, content):
+        response = mock.MagicMock(ok=True, raw=io.BytesIO(content))
+        with mock.patch.object(views.qa_report_api, 'request_with_retry', return_value=response):
+            return download_extract_save_result('https://example.com/tradefed-results.tar.xz', self.result_zip_path)
+
+    def test_test_result_saved(self):
+        attachment = self.get_attachment([('results/log.txt', b'log'), ('results/test_result.xml', b'<Result />')])
+        self.assertTrue(self.download(attachment))
+        with zipfile.ZipFile(self.result_zip_path) as f_zip:
+            self.assertEqual(f_zip.read('test_result.xml'), b'<Result />')
+        self.assertEqual(os.listdir(self.tmp_dir), ['lkft-1234.zip'])
+
+    def test_nothing_left_when_failed(self):
+        attachment = self.get_attachment([('results/test_result.xml', b'<Result>' + os.urandom(100000) + b'</Result>')])
+        self.assertFalse(self.download(attachment[:len(attachment) // 2]))
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+        self.assertFalse(self.download(self.get_attachment([('results/log.txt', b'log')])))
+        self.assertEqual(os.listdir(self.tmp_dir), [])
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import bisect
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import xml.etree.ElementTree as ET
+
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# the CtsDeqpTestCases module has about 1494348 testcases,
+# so the tests are returned in batches instead of all together
+TESTS_BATCH_SIZE = 10000
+
+
+# size of the chunks read from the result file
+READ_CHUNK_SIZE = 1024 * 1024
+
+# longest character reference that needs to be checked, like "&#x0010FFFF;",
+# anything longer than this would not be completed in the next chunk
+MAX_CHAR_REF_LENGTH = 32
+
+
+class XmlCharRefFilter():
+    '''
+        File-like filter for the xml content in bytes, which removes the
+        character references(like "&#x1b;") to characters not allowed by the XML spec.
+        The content is handled chunk by chunk in one pass, so it could be
+        put in front of the xml parser for the result files of any size.
+        The number of removed references is counted in number_removed.
+    '''
+    rx = re.compile(rb"&#([0-9]+);|&#x([0-9a-fA-F]+);")
+
+    def __init__(self, fileobj, chunk_size=READ_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.number_removed = 0
+        self.buffer = bytearray()
+        # bytes from the end of the last chunk that might be part of a character reference
+        self.pending = b''
+        self.eof = False
+
+    def replace_char_ref(self, m):
+        target = m.group(1)
+        if target:
+            num = int(target)
+        else:
+            num = int(m.group(2), 16)
+        # #x9 | #xA | #xD | [#x20-#xD7FF] | [#xE000-#xFFFD] | [#x10000-#x10FFFF]
+        if num in (0x9, 0xA, 0xD) \
+                or 0x20 <= num <= 0xD7FF \
+                or 0xE000 <= num <= 0xFFFD \
+                or 0x10000 <= num <= 0x10FFFF:
+            return m.group(0)
+        self.number_removed = self.number_removed + 1
+        return b''
+
+    def fill(self):
+        data = self.fileobj.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            content = self.pending
+            self.pending = b''
+        else:
+            content = self.pending + data
+            self.pending = b''
+            # keep the possible incomplete character reference at the end for the next chunk
+            index_amp = content.rfind(b'&', max(0, len(content) - MAX_CHAR_REF_LENGTH))
+            if index_amp >= 0 and content.find(b';', index_amp) < 0:
+                self.pending = content[index_amp:]
+                content = content[:index_amp]
+        self.buffer.extend(self.rx.sub(self.replace_char_ref, content))
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            self.fill()
+        if size is None or size < 0 or size >= len(self.buffer):
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        else:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                break
+            yield data
+
+
+def get_test_name(test_class_name, test_name, abi):
+    if test_name.endswith('_64bit') or test_name.endswith('_32bit'):
+        test_name = '%s#%s' % (test_class_name, test_name)
+    else:
+        test_name = '%s#%s#%s' % (test_class_name, test_name, abi)
+    # workaround for VtsHalAudioV7_0TargetTest module
+    # which has test case names longer than 320
+    return test_name[:320]
+
+
+def iterparse_tradefed_result(chunks, batch_size=TESTS_BATCH_SIZE):
+    '''
+        Parse the tradefed test_result.xml incrementally from chunks(str or bytes),
+        elements are removed once they are handled, so the memory used does not
+        depend on the size of the result file. The following events are yielded:
+            ('module_start', {'name', 'abi', 'done', 'pass', 'total_tests'})
+            ('tests', [{'name', 'result', 'message', 'stacktrace'}, ...])
+                at most batch_size tests of the current module each time
+            ('module_end', {'name', 'abi', 'number_tests'})
+            ('summary', {'number_passed', 'number_failed', 'number_assumption_failure',
+                         'number_ignored', 'number_total', 'modules_done', 'modules_total'})
+                at the end of the result file
+        ET.ParseError is raised when the content is not valid
+    '''
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    # ancestors of the current element, to remove the finished elements from their parent
+    elem_stack = []
+    summary = {}
+    numbers = {
+        'number_assumption_failure': 0,
+        'number_ignored': 0,
+        'number_total': 0,
+    }
+    module_attrib = None
+    module_number_tests = 0
+    test_class_name = None
+    tests = []
+
+    def parse_events():
+        nonlocal module_attrib, module_number_tests, test_class_name, tests
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if elem.tag == 'Module':
+                    module_attrib = {
+                        'name': elem.get('name'),
+                        'abi': elem.get('abi'),
+                        'done': elem.get('done'),
+                        'pass': elem.get('pass'),
+                        'total_tests': elem.get('total_tests'),
+                    }
+                    module_number_tests = 0
+                    yield ('module_start', module_attrib)
+                elif elem.tag == 'TestCase':
+                    test_class_name = elem.get('name')
+                elem_stack.append(elem)
+                continue
+
+            # event == 'end'
+            elem_stack.pop()
+            if elem.tag == 'Summary':
+                summary.update(elem.attrib)
+            elif elem.tag == 'Test' and module_attrib is not None:
+                test_result = elem.get('result')
+                #result is one of: 'pass', 'fail', 'IGNORED', ASSUMPTION_FAILURE'
+                test = {
+                    'name': get_test_name(test_class_name, elem.get('name'), module_attrib.get('abi')),
+                    'result': test_result,
+                    'message': None,
+                    'stacktrace': None,
+                }
+                if test_result == 'fail' or test_result == 'ASSUMPTION_FAILURE':
+                    failure_node = elem.find('.//Failure')
+                    if failure_node is not None:
+                        test['message'] = failure_node.get('message')
+                        stacktrace_node = failure_node.find('StackTrace')
+                        if stacktrace_node is not None:
+                            test['stacktrace'] = stacktrace_node.text
+
+                numbers['number_total'] = numbers['number_total'] + 1
+                if test_result == 'ASSUMPTION_FAILURE':
+                    numbers['number_assumption_failure'] = numbers['number_assumption_failure'] + 1
+                elif test_result == 'IGNORED':
+                    numbers['number_ignored'] = numbers['number_ignored'] + 1
+                module_number_tests = module_number_tests + 1
+
+                tests.append(test)
+                if len(tests) >= batch_size:
+                    yield ('tests', tests)
+                    tests = []
+            elif elem.tag == 'Module':
+                if len(tests) > 0:
+                    yield ('tests', tests)
+                    tests = []
+                yield ('module_end', {
+                                        'name': module_attrib.get('name'),
+                                        'abi': module_attrib.get('abi'),
+                                        'number_tests': module_number_tests,
+                                    })
+                module_attrib = None
+
+            # Summary and other elements before the modules are small, keep them
+            if elem.tag in ('Test', 'TestCase', 'Module'):
+                elem.clear()
+                if len(elem_stack) > 0:
+                    elem_stack[-1].remove(elem)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parse_events()
+    parser.close()
+    yield from parse_events()
+
+    numbers['number_passed'] = int(summary.get('pass', 0))
+    numbers['number_failed'] = int(summary.get('failed', 0))
+    numbers['modules_done'] = int(summary.get('modules_done', 0))
+    numbers['modules_total'] = int(summary.get('modules_total', 0))
+    yield ('summary', numbers)
+
+
+# codes of the test results saved in the results artifact
+RESULT_CODES = ('pass', 'fail', 'IGNORED', 'ASSUMPTION_FAILURE')
+RESULT_CODE_UNKNOWN = 255
+# header of the results artifact: magic, number of tests
+RESULTS_ARTIFACT_MAGIC = b'LKFTRES1'
+RESULTS_ARTIFACT_HEADER = struct.Struct('<8sQ')
+
+
+class ResultsArtifactWriter():
+    '''
+        Collect the results of all tests of a job, and save them as the columnar
+        results artifact, which has the following parts after the header:
+            uint32 array of the TestName ids for the test names, sorted
+            uint32 array of the TestName ids for the suite names
+            uint8 array of the result codes, index of RESULT_CODES
+        all in little endian, so that the file could be memory mapped by ResultsArtifact
+    '''
+
+    def __init__(self):
+        self.name_ids = array('I')
+        self.suite_ids = array('I')
+        self.result_codes = array('B')
+
+    def append(self, name_id, suite_id, result):
+        self.name_ids.append(name_id)
+        self.suite_ids.append(suite_id)
+        if result in RESULT_CODES:
+            self.result_codes.append(RESULT_CODES.index(result))
+        else:
+            self.result_codes.append(RESULT_CODE_UNKNOWN)
+
+    def save(self, path):
+        order = sorted(range(len(self.name_ids)), key=self.name_ids.__getitem__)
+        name_ids = array('I', [self.name_ids[i] for i in order])
+        suite_ids = array('I', [self.suite_ids[i] for i in order])
+        result_codes = array('B', [self.result_codes[i] for i in order])
+        if sys.byteorder != 'little':
+            name_ids.byteswap()
+            suite_ids.byteswap()
+
+        # the same job could be ingested by more than one process or thread at the same time
+        path_part = "%s.%d.%d.part" % (path, os.getpid(), threading.get_ident())
+        try:
+            with open(path_part, 'wb') as f_artifact:
+                f_artifact.write(RESULTS_ARTIFACT_HEADER.pack(RESULTS_ARTIFACT_MAGIC, len(order)))
+                name_ids.tofile(f_artifact)
+                suite_ids.tofile(f_artifact)
+                result_codes.tofile(f_artifact)
+            os.replace(path_part, path)
+        finally:
+            if os.path.exists(path_part):
+                os.unlink(path_part)
+
+
+class ResultsArtifact():
+    '''
+        Memory mapped results artifact saved by ResultsArtifactWriter,
+        the tests are looked up with binary search on the sorted name ids
+    '''
+
+    def __init__(self, path):
+        self.f_artifact = open(path, 'rb')
+        self.mmap = mmap.mmap(self.f_artifact.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.number_tests = RESULTS_ARTIFACT_HEADER.unpack_from(self.mmap, 0)
+        if magic != RESULTS_ARTIFACT_MAGIC:
+            self.close()
+            raise ValueError("%s is not a results artifact" % path)
+
+        offset = RESULTS_ARTIFACT_HEADER.size
+        size_ids = 4 * self.number_tests
+        buffer = memoryview(self.mmap)
+        if sys.byteorder == 'little':
+            self.name_ids = buffer[offset:offset + size_ids].cast('I')
+            self.suite_ids = buffer[offset + size_ids:offset + 2 * size_ids].cast('I')
+        else:
+            self.name_ids = array('I', buffer[offset:offset + size_ids])
+            self.name_ids.byteswap()
+            self.suite_ids = array('I', buffer[offset + size_ids:offset + 2 * size_ids])
+            self.suite_ids.byteswap()
+        self.result_codes = buffer[offset + 2 * size_ids:offset + 2 * size_ids + self.number_tests]
+        self.buffer = buffer
+
+    def __len__(self):
+        return self.number_tests
+
+    def get_result(self, result_code):
+        if result_code < len(RESULT_CODES):
+            return RESULT_CODES[result_code]
+        return None
+
+    def find(self, name_id):
+        '''
+            Return the list of (suite_id, result) for the tests with the name id
+        '''
+        results = []
+        index = bisect.bisect_left(self.name_ids, name_id)
+        while index < self.number_tests and self.name_ids[index] == name_id:
+            results.append((self.suite_ids[index], self.get_result(self.result_codes[index])))
+            index = index + 1
+        return results
+
+    def __iter__(self):
+        for index in range(self.number_tests):
+            yield (self.name_ids[index], self.suite_ids[index], self.get_result(self.result_codes[index]))
+
+    def close(self):
+        for view_name in ('name_ids', 'suite_ids', 'result_codes', 'buffer'):
+            view = getattr(self, view_name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        self.mmap.close()
+        self.f_artifact.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
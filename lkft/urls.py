@@ -19,6 +19,9 @@ urlpatterns = [
     url(r'^changereportstatus/(%s)/(%s)/$' % (basic_pat, basic_pat), views.mark_kernel_changes_reported, name='mark_kernel_changes_reported'),
     url(r'^builds/.*$', views.list_builds, name='list_builds'),
     url(r'^jobs/.*$', views.list_jobs, name='list_jobs'),
+    # compare-builds/?base_build_id=$qa_build_id&target_build_id=$qa_build_id
+    url(r'^compare-builds/$', views.compare_builds, name='compare_builds'),
+    url(r'^api/compare-builds/$', views.compare_builds_api, name='compare_builds_api'),
     url(r'^lavalog/(%s)/$' % (numerical_pat), views.get_job_lavalog, name='get_job_lavalog'),
     url(r'^lavalog-lavaurl/.*$', views.get_job_lavalog_lavaurl, name='get_job_lavalog_lavaurl'),
     url(r'^alljobs/.*$', views.list_all_jobs, name='list_all_jobs'),
@@ -34,6 +37,10 @@ urlpatterns = [
     url(r'^newchanges/(%s)/(%s)/(%s)/([0-9]+)' % (basic_pat, basic_pat, basic_pat), views.new_kernel_changes),
     # newchanges/$branch/$describe/$build_name/$build_number
     url(r'^newbuild/(%s)/(%s)/(%s)/([0-9]+)' % (basic_pat, basic_pat, basic_pat), views.new_build, name='new_build'),
+    # jobfinished/$qa_job_id/
+    url(r'^jobfinished/(%s)/$' % (numerical_pat), views.job_finished, name='job_finished'),
+    # jobfinished-lava/$lava_nick/$lava_job_id/
+    url(r'^jobfinished-lava/(%s)/(%s)/$' % (basic_pat, numerical_pat), views.lava_job_finished, name='lava_job_finished'),
 
     url(r'^gitlab/$', views.gitlab_projects, name='gitlab_projects'),
     url(r'^gitlab/(%s)/$' % gitlab_project_id_pat, views.gitlab_project_pipelines, name='gitlab_progect_pipelines'),
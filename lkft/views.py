@@ -3,23 +3,28 @@ from __future__ import unicode_literals
 
 
 from django import forms
+from django.db import connections
 from django.db.models import Q
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, redirect
+from django.views.decorators.csrf import csrf_exempt
 
+import asyncio
 import collections
 import concurrent.futures
 import datetime
 import functools
+import hashlib
 import logging
-import math
+import lzma
+import multiprocessing
 import os
 import re
 import requests
+import shutil
 import sys
 import tarfile
 import threading
-import tempfile
 import time
 import xml.etree.ElementTree as ET
 import yaml
@@ -27,22 +32,31 @@ import zipfile
 
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.models import User, AnonymousUser, Group as auth_group
+from django.utils import timezone
 from django.utils.timesince import timesince
 
-from lcr.settings import FILES_DIR, LAVA_SERVERS, BUGZILLA_API_KEY, BUILD_WITH_JOBS_NUMBER, BUILD_WITH_BENCHMARK_JOBS_NUMBER, DB_USE_POSTGRES
+from lcr.settings import FILES_DIR, LAVA_SERVERS, BUGZILLA_API_KEY, BUGZILLA_TIMEOUT, BUILD_WITH_JOBS_NUMBER, BUILD_WITH_BENCHMARK_JOBS_NUMBER, DB_USE_POSTGRES
 from lcr.settings import QA_REPORT, QA_REPORT_DEFAULT, JENKINS, JENKINS_DEFAULT, GITLAB, GITLAB_DEFAULT
-from lcr.settings import RESTRICTED_PROJECTS
+from lcr.settings import ANDROIDREPORTCONFIG_TTL, ANDROIDREPORTCONFIG_CACHE_PATH
+from lcr.settings import RESTRICTED_PROJECTS, INGEST_WORKERS, TESTCASE_SAVE_FAILURES_ONLY, BUILD_FAILURES_SUMMARY_ENABLED
+from lcr.settings import INGEST_QUEUE_ENABLED
 from lcr.irc import IRC
 
-from lcr import qa_report, bugzilla
+from lcr import qa_report, qa_report_async, bugzilla
+from lcr.remote_module import RemoteModule
+from lcr.task_executor import map_tasks, submit_task
 from lcr.qa_report import DotDict, UrlNotFoundException
-from lcr.utils import download_urllib, download_url_content
 from lkft.lkft_config import find_citrigger, find_cibuild, get_hardware_from_pname, get_version_from_pname, get_kver_with_pname_env
 from lkft.lkft_config import find_expect_cibuilds
 from lkft.lkft_config import get_qa_server_project, get_supported_branches
 from lkft.lkft_config import is_benchmark_job, is_cts_vts_job, is_kunit_job, get_benchmark_testsuites, get_expected_benchmarks
+from lkft.tradefed_result import iterparse_tradefed_result, XmlCharRefFilter, ResultsArtifactWriter, ResultsArtifact
 
-from .models import KernelChange, CiBuild, ReportBuild, ReportProject, ReportJob, TestSuite, TestCase, JobMeta
+from .models import KernelChange, CiBuild, ReportBuild, ReportProject, ReportJob, TestSuite, TestCase, TestName, JobMeta
+from .models import ReportBuildFailuresSummary, ReportProjectSnapshot
+from . import bug_store, ingest_queue, regressions
+from .bug_index import BugSummaryIndex
+from .bulkload import normalize_suite, test_name_cache, TestCaseSync
 
 qa_report_def = QA_REPORT[QA_REPORT_DEFAULT]
 qa_report_api = qa_report.QAReportApi(qa_report_def.get('domain'), qa_report_def.get('token'))
@@ -73,7 +87,7 @@ class LinaroAndroidLKFTBug(bugzilla.Bugzilla):
         self.op_sys = 'Android'
         self.keywords = "LKFT"
 
-        super(LinaroAndroidLKFTBug, self).__init__(self.rest_api_url, api_key)
+        super(LinaroAndroidLKFTBug, self).__init__(self.rest_api_url, api_key, timeout=BUGZILLA_TIMEOUT)
 
         #self.build_version = None
         #self.hardware = None
@@ -88,6 +102,10 @@ class LinaroAndroidLKFTBug(bugzilla.Bugzilla):
                                                                                                    self.keywords)
         return new_bug_url
 
+    def get_session(self):
+        # pooled keep-alive connections, like the qa-report apis
+        return qa_report.get_http_session(self.host_name)
+
 bugzilla_host_name = 'bugs.linaro.org'
 bugzilla_instance = LinaroAndroidLKFTBug(host_name=bugzilla_host_name, api_key=BUGZILLA_API_KEY)
 bugzilla_show_bug_prefix = bugzilla_instance.show_bug_prefix
@@ -100,6 +118,28 @@ def find_lava_config(job_url):
             return config
     return None
 
+def get_lava_jobs_info(jobs=[]):
+    '''
+        Return the LAVA job details of the jobs, keyed by the qa-report job id,
+        the details of all jobs are fetched concurrently.
+        Jobs that are not run with the LAVA servers in LAVA_SERVERS are ignored.
+    '''
+    async def fetch_lava_jobs():
+        qa_job_ids = []
+        lava_jobs = []
+        for job in jobs:
+            lava_config = find_lava_config(job.get('external_url'))
+            if lava_config is None:
+                continue
+            qa_job_ids.append(job.get('id'))
+            lava_jobs.append(qa_report_async.AsyncLAVAApi(lava_config=lava_config).get_job(job_id=job.get('job_id')))
+        return dict(zip(qa_job_ids, await asyncio.gather(*lava_jobs)))
+
+    if len(jobs) == 0:
+        return {}
+    return qa_report_async.run_sync(fetch_lava_jobs())
+
+
 def get_attachment_urls(jobs=[]):
     '''
         ALL JOBS must be belong to the same build
@@ -107,6 +147,13 @@ def get_attachment_urls(jobs=[]):
     if len(jobs) == 0:
         return
 
+    # load the records of all the jobs with one query
+    db_report_jobs = {}
+    job_urls = [job.get('external_url') for job in jobs if is_cts_vts_job(job.get('name'))]
+    if len(job_urls) > 0:
+        for db_report_job in ReportJob.objects.filter(job_url__in=job_urls).order_by('id'):
+            db_report_jobs.setdefault(db_report_job.job_url, db_report_job)
+
     needs_attachment_urls = False
     for job in jobs:
         lava_config = job.get('lava_config')
@@ -126,17 +173,16 @@ def get_attachment_urls(jobs=[]):
         if not is_cts_vts_job(job.get('name')):
             continue
 
-        try:
-            db_report_job = ReportJob.objects.get(job_url=job.get('external_url'))
+        db_report_job = db_report_jobs.get(job.get('external_url'))
+        if db_report_job is not None:
             if not job.get('job_status') or job.get('job_status') == 'Submitted' or job.get('job_status') == 'Running' \
                     or not db_report_job.status or db_report_job.status != 'Complete' or db_report_job.status != 'Incomplete' or db_report_job.status != 'Canceled':
                 needs_attachment_urls = True
                 continue
             else: # Complete
                 job["attachment_url"] = db_report_job.attachment_url
-        except ReportJob.DoesNotExist:
+        else:
             needs_attachment_urls = True
-            pass
 
     if not needs_attachment_urls:
         return
@@ -164,20 +210,53 @@ def get_attachment_urls(jobs=[]):
             pass
 
 
-def extract_save_result(tar_path, result_zip_path):
+def download_extract_save_result(attachment_url, result_zip_path, headers=None):
+    '''
+        Stream the tradefed result attachment(tar.xz) from attachment_url,
+        decompress it on the fly and save only the test_result.xml file
+        into the result zip file, without saving the tar file to disk.
+        Return True if the test_result.xml file is saved.
+    '''
     zip_parent = os.path.abspath(os.path.join(result_zip_path, os.pardir))
     if not os.path.exists(zip_parent):
         os.makedirs(zip_parent)
-    # https://pymotw.com/2/zipfile/
-    tar = tarfile.open(tar_path, "r")
-    for f_name in tar.getnames():
-        if f_name.endswith("/%s" % TEST_RESULT_XML_NAME):
-            result_fd = tar.extractfile(f_name)
-            with zipfile.ZipFile(result_zip_path, 'w') as f_zip_fd:
-                f_zip_fd.writestr(TEST_RESULT_XML_NAME, result_fd.read(), compress_type=zipfile.ZIP_DEFLATED)
-                logger.info('Save result in %s to %s' % (tar_path, result_zip_path))
 
-    tar.close()
+    # write to a partial file first, so that the result zip file
+    # is only there when the whole test_result.xml is saved.
+    # the same job could be downloaded by the web requests, the commands and the ingest workers at the same time
+    result_zip_path_part = "%s.%d.%d.part" % (result_zip_path, os.getpid(), threading.get_ident())
+    try:
+        r = qa_report_api.request_with_retry(attachment_url, headers=headers, stream=True)
+        if not r.ok:
+            logger.info("Failed to download %s: %s %s" % (attachment_url, r.status_code, r.reason))
+            r.close()
+            return False
+
+        with r:
+            # let urllib3 decode the content in case of Content-Encoding
+            r.raw.decode_content = True
+            # https://docs.python.org/3/library/tarfile.html#tarfile.open "r|" for the stream mode
+            with lzma.open(r.raw) as xz_fd, tarfile.open(fileobj=xz_fd, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile() or not member.name.endswith("/%s" % TEST_RESULT_XML_NAME):
+                        continue
+                    result_fd = tar.extractfile(member)
+                    with zipfile.ZipFile(result_zip_path_part, 'w', compression=zipfile.ZIP_DEFLATED) as f_zip_fd:
+                        with f_zip_fd.open(TEST_RESULT_XML_NAME, 'w') as f_result_fd:
+                            shutil.copyfileobj(result_fd, f_result_fd)
+                    os.replace(result_zip_path_part, result_zip_path)
+                    logger.info('Save result in %s to %s' % (attachment_url, result_zip_path))
+                    return True
+    except (requests.exceptions.RequestException, lzma.LZMAError, tarfile.TarError, EOFError, OSError) as e:
+        logger.info("Failed to extract %s from %s: %s" % (TEST_RESULT_XML_NAME, attachment_url, e))
+        return False
+    finally:
+        # left when the download failed or was interrupted
+        if os.path.exists(result_zip_path_part):
+            os.unlink(result_zip_path_part)
+
+    logger.info("%s not found in %s" % (TEST_RESULT_XML_NAME, attachment_url))
+    return False
 
 
 def get_result_file_path(job=None):
@@ -189,6 +268,58 @@ def get_result_file_path(job=None):
     return result_file_path
 
 
+def get_results_artifact_path(job=None):
+    result_file_path = get_result_file_path(job)
+    if result_file_path is None:
+        return None
+    return result_file_path.replace('.zip', '.results')
+
+
+def get_all_testcases_for_job(job=None):
+    '''
+        Return the results of all tests for the tradefed job as a list of dict with
+        name, suite, result, message and stacktrace, rebuilt from the results artifact
+        and the failure records if only the failures are saved as records for the job
+    '''
+    lava_nick = job.get('lava_config').get('nick')
+    job_id = job.get('job_id')
+    failures = {}
+    for testcase in TestCase.objects.filter(lava_nick=lava_nick, job_id=job_id):
+        failures[(testcase.name, testcase.suite)] = {
+                                                    'name': testcase.name,
+                                                    'suite': testcase.suite,
+                                                    'result': testcase.result,
+                                                    'message': testcase.message,
+                                                    'stacktrace': testcase.stacktrace,
+                                                }
+
+    results_artifact_path = get_results_artifact_path(job)
+    if results_artifact_path is None or not os.path.exists(results_artifact_path):
+        # all the results are saved as records
+        return list(failures.values())
+
+    testcases = []
+    with ResultsArtifact(results_artifact_path) as results_artifact:
+        name_ids = list(set(results_artifact.name_ids) | set(results_artifact.suite_ids))
+        names = {}
+        for i in range(0, len(name_ids), 10000):
+            names.update(TestName.objects.filter(id__in=name_ids[i:i + 10000]).values_list('id', 'name'))
+        for (name_id, suite_id, result) in results_artifact:
+            name = names.get(name_id)
+            suite = names.get(suite_id)
+            testcase = failures.get((name, suite))
+            if testcase is None:
+                testcase = {
+                                'name': name,
+                                'suite': suite,
+                                'result': result,
+                                'message': None,
+                                'stacktrace': None,
+                            }
+            testcases.append(testcase)
+    return testcases
+
+
 def save_testcases_with_bulk_call(testcase_objs=[]):
     if len(testcase_objs) < 1:
         return
@@ -217,16 +348,27 @@ def save_testcases_with_bulk_call(testcase_objs=[]):
         TestCase.objects.bulk_create(testcase_objs)
 
 
-def download_attachments_save_result(jobs=[], fetch_latest=False):
+def download_attachments_save_result(jobs=[], fetch_latest=False, workers=INGEST_WORKERS, queue=False):
+    '''
+        Save the results of the jobs into database if not cached yet,
+        the jobs are ingested with multiple processes when workers > 1
+        and it's allowed, see can_use_ingest_process_pool.
+        queue: queue the jobs to be ingested by the runingestworkers command instead,
+               and set job['ingesting'] for the jobs queued or being ingested,
+               used by the pages so that they are not blocked by the ingestion
+        Return the list of summaries for the jobs ingested, see ingest_job_with_summary
+    '''
     if len(jobs) == 0:
-        return
+        return []
 
     # https://lkft.validation.linaro.org/scheduler/job/566144
     get_attachment_urls(jobs=jobs)
+    # cache all the jobs, otherwise the status is not correct for the build
+    # if incomplete jobs are not cached.
+    report_jobs = cache_qajobs_to_database(jobs)
+    jobs_to_ingest = []
     for job in jobs:
-        # cache all the jobs, otherwise the status is not correct for the build
-        # if incomplete jobs are not cached.
-        report_job = cache_qajob_to_database(job)
+        report_job = report_jobs.get(job.get('external_url'))
         if report_job.results_cached:
             # so that places that use job['numbers'] would still work, like the lkftreport script
             job['numbers'] = qa_report.TestNumbers().addWithDatabaseRecord(report_job).toHash()
@@ -248,162 +390,296 @@ def download_attachments_save_result(jobs=[], fetch_latest=False):
         if job.get('job_status') != 'Complete':
             continue
 
-        if is_benchmark_job(job.get('name')) or is_kunit_job(job.get('name')):
-            # for benchmark jobs
-            lava_config = job.get('lava_config')
-            job_id = job.get('job_id')
-            qa_job_id = job.get('id')
-            job_results = qa_report.LAVAApi(lava_config=lava_config).get_job_results(job_id=job_id)
+        jobs_to_ingest.append(job)
 
-            TestCase.objects.filter(lava_nick=lava_config.get('nick'), job_id=job_id).delete()
+    if queue:
+        ingesting_job_urls = ingest_queue.enqueue_jobs(jobs_to_ingest, priority=ingest_queue.PRIORITY_VIEW, fetch_latest=fetch_latest)
+        for job in jobs:
+            if job.get('external_url') in ingesting_job_urls:
+                job['ingesting'] = True
+        return []
 
-            testcase_objs = []
-            job_numbers = qa_report.TestNumbers()
-            job_numbers.modules_done = 1  # only one test definition here
-            job_numbers.modules_total = 1  # only one test definition here
-            for test in job_results:
-                if test.get("suite") == "lava":
-                    continue
+    ingest_summaries = ingest_jobs(jobs_to_ingest, workers=workers)
+    update_failures_summaries(report_jobs.values(), ingest_summaries)
+    return ingest_summaries
 
-                if is_kunit_job(job.get('name')) and (not test.get("suite").endswith('android-kunit')):
-                    continue
 
-                # if pat_ignore.match(test.get("name")):
-                #     continue
+# forking a process with other threads running might deadlock on the locks held by those threads,
+# so the jobs are only ingested with the process pool in the main thread of the management
+# commands that enable it, and in the same process for the web requests and the worker threads
+ingest_process_pool_enabled = False
 
-                # if test.get("name") in names_ignore:
-                #     continue
-                if test.get("measurement") and test.get("measurement") == "None":
-                    test["measurement"] = None
-                else:
-                    test["measurement"] = "{:.2f}".format(float(test.get("measurement")))
-
-                testcase_objs.append((TestCase(name=test.get("name"),
-                                            result=test.get("result"),
-                                            measurement=test.get("measurement"),
-                                            unit=test.get("unit"),
-                                            suite=test.get("suite"),
-                                            lava_nick=lava_config.get('nick'),
-                                            job_id=job_id)))
-
-                test_result = test.get("result")
-                if test_result == "pass":
-                    job_numbers.number_passed = job_numbers.number_passed + 1
-                elif test_result == "fail":
-                    job_numbers.number_failed = job_numbers.number_failed + 1
-                elif test_result == "assumption_failure":
-                    job_numbers.number_assumption_failure = job_numbers.number_assumption_failure + 1
-                else:
-                    # test_result == "skip":
-                    job_numbers.number_ignored = job_numbers.number_ignored + 1
 
-            save_testcases_with_bulk_call(testcase_objs=testcase_objs)
+def enable_ingest_process_pool():
+    global ingest_process_pool_enabled
+    ingest_process_pool_enabled = True
 
-            report_job.finished_successfully = True
 
-            job_numbers.number_total = len(testcase_objs)
+def can_use_ingest_process_pool():
+    return ingest_process_pool_enabled and threading.current_thread() is threading.main_thread()
 
-            ## Note: report_job test numbers needs to be set here
-            job_numbers.setValueForDatabaseRecord(report_job)
 
-            job['numbers'] = job_numbers.toHash()
-            job['numbers']['finished_successfully'] = report_job.finished_successfully
+def ingest_jobs(jobs=[], workers=INGEST_WORKERS):
+    if len(jobs) == 0:
+        return []
 
-        elif is_cts_vts_job(job.get('name')):
-            # for cts /vts jobs
-            job_id = job.get('job_id')
-            job_url = job.get('external_url')
-            result_file_path = get_result_file_path(job)
-            if not result_file_path:
-                logger.info("Skip to get the attachment as the result_file_path is not found: %s %s" % (job_url, job.get('url')))
-                continue
+    if not can_use_ingest_process_pool():
+        workers = 1
 
-            attachment_url = job.get('attachment_url')
-            if not attachment_url:
-                logger.info("No attachment for job: %s %s" % (job_url, job.get('name')))
+    # the same ReportJob must only be written by one worker,
+    # so jobs with the same job url are only ingested once
+    unique_jobs = collections.OrderedDict()
+    for job in jobs:
+        unique_jobs.setdefault(job.get('external_url'), []).append(job)
+
+    summaries = []
+    if workers <= 1 or len(unique_jobs) <= 1:
+        for job_url, same_jobs in unique_jobs.items():
+            ingested_job, summary = ingest_job_with_summary(same_jobs[0])
+            for job in same_jobs[1:]:
+                job.update(ingested_job)
+            summaries.append(summary)
+        return summaries
+
+    # the database connections must not be shared with the forked worker processes,
+    # each worker opens its own connection when it's used the first time
+    connections.close_all()
+    mp_context = multiprocessing.get_context('fork')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(unique_jobs)), mp_context=mp_context) as executor:
+        future_to_jobs = {}
+        for job_url, same_jobs in unique_jobs.items():
+            future = executor.submit(ingest_job_with_summary, same_jobs[0])
+            future_to_jobs[future] = same_jobs
+
+        for future in concurrent.futures.as_completed(future_to_jobs):
+            same_jobs = future_to_jobs[future]
+            try:
+                ingested_job, summary = future.result()
+            except Exception as e:
+                # like the worker process was killed
+                logger.error("Failed to ingest job %s: %s" % (same_jobs[0].get('external_url'), e))
+                summaries.append({
+                                    'job_url': same_jobs[0].get('external_url'),
+                                    'job_name': same_jobs[0].get('name'),
+                                    'result': 'failed',
+                                    'error': str(e),
+                                    'duration': 0,
+                                })
                 continue
 
-            if not os.path.exists(result_file_path):
-                (temp_fd, temp_path) = tempfile.mkstemp(suffix='.tar.xz', text=False)
-                logger.info("Start downloading result file for job %s %s: %s" % (job_url, job.get('name'), temp_path))
-                qa_report_header = None
-                qa_report_token = qa_report_def.get("token", None)
-                if qa_report_token is not None and len(qa_report_token) > 0:
-                    qa_report_header = f"Authorization: token {qa_report_token}"
-                ret_err = download_urllib(attachment_url, temp_path, header=qa_report_header)
-                if ret_err:
-                    logger.info("There is a problem with the size of the file: %s" % attachment_url)
-                    continue
+            # the updates to the job in the worker process are not visible here
+            for job in same_jobs:
+                job.update(ingested_job)
+            summaries.append(summary)
 
-                tar_f = temp_path.replace(".xz", '')
-                ret = os.system("xz -d %s" % temp_path)
-                if ret != 0 :
-                    logger.info("Failed to decompress %s with xz -d command for job: %s " % (temp_path, job_url))
-                    continue
+    return summaries
 
-                extract_save_result(tar_f, result_file_path)
-                os.unlink(tar_f)
-
-            if os.path.exists(result_file_path):
-                logger.info("Before call save_tradeded_results_to_database: %s %s" % (job_url, job.get('name')))
-                save_tradeded_results_to_database(result_file_path, job, report_job)
-                logger.info("After call save_tradeded_results_to_database: %s %s" % (job_url, job.get('name')))
-
-                # job['numbers'] and job['numbers']['finished_successfully'] are set
-                # in the function of get_testcases_number_for_job
-                ### The following 3 lines may not necessary, as jobs_numbers is from report_job db object
-                job_numbers = get_testcases_number_for_job(job)
-                qa_report.TestNumbers.setHashValueForDatabaseRecord(report_job, job_numbers)
-                # need to set this finished_successfully explictly here
-                # as it depends on the value from job_numbers, and the above line does not set it correctly
-                # the finished_successfully depends on the real number of modules_total
-                report_job.finished_successfully = job_numbers.get('finished_successfully')
-            else:
-                # for cases that test_result.xml does not exist in the tradefed result attachment zip file
-                logger.info("Failed to save the test_result.xml file locally for : %s %s" % (job_url, job.get('name')))
-                continue
+
+def ingest_job_with_summary(job):
+    '''
+        Ingest the job and return the updated job with the summary like:
+            {'job_url', 'job_name', 'duration', 'error',
+             'result': one of 'saved', 'not_available', 'failed'}
+    '''
+    summary = {
+                'job_url': job.get('external_url'),
+                'job_name': job.get('name'),
+                'error': None,
+              }
+    start_time = time.time()
+    try:
+        if ingest_job(job):
+            summary['result'] = 'saved'
         else:
-            # for other jobs like the boot job and other benchmark jobs
-            report_job.finished_successfully = True
-            job['numbers'] = qa_report.TestNumbers().toHash()
+            summary['result'] = 'not_available'
+    except Exception as e:
+        logger.exception("Failed to ingest job %s" % job.get('external_url'))
+        summary['result'] = 'failed'
+        summary['error'] = str(e)
+    summary['duration'] = time.time() - start_time
+    logger.info("Job ingested: %s" % summary)
+    return job, summary
+
+
+def ingest_job(job):
+    '''
+        Save the results of the completed job into database.
+        Return False when the results are not available for the job.
+    '''
+    report_job = ReportJob.objects.get(job_url=job.get('external_url'))
+
+    if is_benchmark_job(job.get('name')) or is_kunit_job(job.get('name')):
+        # for benchmark jobs
+        lava_config = job.get('lava_config')
+        job_id = job.get('job_id')
+        qa_job_id = job.get('id')
+        job_results_content = qa_report.LAVAApi(lava_config=lava_config).get_job_results_content(job_id=job_id)
+        results_hash = hashlib.sha256(job_results_content).hexdigest()
+        if report_job.results_hash == results_hash:
+            # the records and numbers are from the same results already
+            logger.info("Results not changed for job %s, skip saving them again" % job.get('external_url'))
+            job['numbers'] = qa_report.TestNumbers().addWithDatabaseRecord(report_job).toHash()
             job['numbers']['finished_successfully'] = report_job.finished_successfully
+            report_job.results_cached = True
+            report_job.save()
+            return True
+        job_results = yaml.safe_load(job_results_content)
+
+        testcase_rows = []
+        job_numbers = qa_report.TestNumbers()
+        job_numbers.modules_done = 1  # only one test definition here
+        job_numbers.modules_total = 1  # only one test definition here
+        for test in job_results:
+            if test.get("suite") == "lava":
+                continue
 
-        report_job.results_cached = True
-        report_job.save()
+            if is_kunit_job(job.get('name')) and (not test.get("suite").endswith('android-kunit')):
+                continue
 
+            # if pat_ignore.match(test.get("name")):
+            #     continue
 
-def remove_xml_unsupport_character(etree_content=""):
-    rx = re.compile("&#([0-9]+);|&#x([0-9a-fA-F]+);")
-    endpos = len(etree_content)
-    pos = 0
-    while pos < endpos:
-        # remove characters that don't conform to XML spec
-        m = rx.search(etree_content, pos)
-        if not m:
-            break
-        mstart, mend = m.span()
-        target = m.group(1)
-        if target:
-            num = int(target)
-        else:
-            num = int(m.group(2), 16)
-        # #x9 | #xA | #xD | [#x20-#xD7FF] | [#xE000-#xFFFD] | [#x10000-#x10FFFF]
-        if not(num in (0x9, 0xA, 0xD)
-                or 0x20 <= num <= 0xD7FF
-                or 0xE000 <= num <= 0xFFFD
-                or 0x10000 <= num <= 0x10FFFF):
-            etree_content = etree_content[:mstart] + etree_content[mend:]
-            endpos = len(etree_content)
-            # next time search again from the same position as this time
-            # as the detected pattern was removed here
-            pos = mstart
+            # if test.get("name") in names_ignore:
+            #     continue
+            if test.get("measurement") and test.get("measurement") == "None":
+                test["measurement"] = None
+            else:
+                test["measurement"] = "{:.2f}".format(float(test.get("measurement")))
+
+            # rows in the order of TESTCASE_FIELDS, the name and suite are interned by load_testcases
+            testcase_rows.append((test.get("name"),
+                                    test.get("result"),
+                                    test.get("measurement"),
+                                    test.get("unit"),
+                                    test.get("suite"),
+                                    job_id,
+                                    lava_config.get('nick'),
+                                    None,
+                                    None,
+                                    None))
+
+            test_result = test.get("result")
+            if test_result == "pass":
+                job_numbers.number_passed = job_numbers.number_passed + 1
+            elif test_result == "fail":
+                job_numbers.number_failed = job_numbers.number_failed + 1
+            elif test_result == "assumption_failure":
+                job_numbers.number_assumption_failure = job_numbers.number_assumption_failure + 1
+            else:
+                # test_result == "skip":
+                job_numbers.number_ignored = job_numbers.number_ignored + 1
+
+        # only the changed records are saved, matched with the suite and name
+        testcase_sync = TestCaseSync(TestCase.objects.filter(lava_nick=lava_config.get('nick'), job_id=job_id),
+                                     key_fields=('suite', 'name'))
+        testcase_sync.apply(testcase_rows)
+        testcase_sync.finish()
+
+        report_job.finished_successfully = True
+        report_job.results_hash = results_hash
+
+        job_numbers.number_total = len(testcase_rows)
+
+        ## Note: report_job test numbers needs to be set here
+        job_numbers.setValueForDatabaseRecord(report_job)
+
+        job['numbers'] = job_numbers.toHash()
+        job['numbers']['finished_successfully'] = report_job.finished_successfully
+
+    elif is_cts_vts_job(job.get('name')):
+        # for cts /vts jobs
+        job_id = job.get('job_id')
+        job_url = job.get('external_url')
+        result_file_path = get_result_file_path(job)
+        if not result_file_path:
+            logger.info("Skip to get the attachment as the result_file_path is not found: %s %s" % (job_url, job.get('url')))
+            return False
+
+        attachment_url = job.get('attachment_url')
+        if not attachment_url:
+            logger.info("No attachment for job: %s %s" % (job_url, job.get('name')))
+            return False
+
+        if not os.path.exists(result_file_path):
+            logger.info("Start downloading result file for job %s %s: %s" % (job_url, job.get('name'), attachment_url))
+            qa_report_headers = None
+            qa_report_token = qa_report_def.get("token", None)
+            if qa_report_token is not None and len(qa_report_token) > 0:
+                qa_report_headers = {'Authorization': f"token {qa_report_token}"}
+            if not download_extract_save_result(attachment_url, result_file_path, headers=qa_report_headers):
+                logger.info("Failed to get the result file for job: %s %s" % (job_url, attachment_url))
+                return False
+
+        if os.path.exists(result_file_path):
+            logger.info("Before call save_tradeded_results_to_database: %s %s" % (job_url, job.get('name')))
+            save_tradeded_results_to_database(result_file_path, job, report_job)
+            logger.info("After call save_tradeded_results_to_database: %s %s" % (job_url, job.get('name')))
+
+            # job['numbers'] and job['numbers']['finished_successfully'] are set
+            # in the function of get_testcases_number_for_job
+            ### The following 3 lines may not necessary, as jobs_numbers is from report_job db object
+            job_numbers = get_testcases_number_for_job(job)
+            qa_report.TestNumbers.setHashValueForDatabaseRecord(report_job, job_numbers)
+            # need to set this finished_successfully explictly here
+            # as it depends on the value from job_numbers, and the above line does not set it correctly
+            # the finished_successfully depends on the real number of modules_total
+            report_job.finished_successfully = job_numbers.get('finished_successfully')
         else:
-            # continue from the end of this match
-            pos = mend
-    return etree_content
+            # for cases that test_result.xml does not exist in the tradefed result attachment zip file
+            logger.info("Failed to save the test_result.xml file locally for : %s %s" % (job_url, job.get('name')))
+            return False
+    else:
+        # for other jobs like the boot job and other benchmark jobs
+        report_job.finished_successfully = True
+        job['numbers'] = qa_report.TestNumbers().toHash()
+        job['numbers']['finished_successfully'] = report_job.finished_successfully
+
+    report_job.results_cached = True
+    report_job.save()
+    return True
+
+
+class UniqueList(list):
+    '''
+        List of the unique values in the order they are added,
+        with the membership checked with a set
+    '''
+
+    def __init__(self, values=[]):
+        super().__init__()
+        self.value_set = set()
+        for value in values:
+            self.add(value)
 
+    def add(self, value):
+        if value not in self.value_set:
+            self.value_set.add(value)
+            self.append(value)
 
-def extract(result_zip_path, failed_testcases_all={}, metadata={}):
+    def __contains__(self, value):
+        return value in self.value_set
+
+
+# fields of the failed testcases returned by get_failed_testcases_for_job, in order
+FAILED_TESTCASE_FIELDS = ('testsuite__name', 'testsuite__abi', 'name', 'result', 'message', 'stacktrace')
+
+
+def get_failed_testcases_for_job(lava_nick=None, job_id=None):
+    '''
+        Return the list of (module_name, abi, test_name, result, message, stacktrace)
+        for the failed testcases of the job, with the module loaded in the same query
+    '''
+    # testcases without testsuite are for cases like boot, boottime, benchmark jobs
+    return list(TestCase.objects.filter(lava_nick=lava_nick, job_id=job_id, result__in=['fail', 'ASSUMPTION_FAILURE'], testsuite__isnull=False)
+                                .values_list(*FAILED_TESTCASE_FIELDS))
+
+
+def extract(result_zip_path, failed_testcases_all={}, metadata={}, failed_testcases=None):
+    '''
+        Add the failed testcases of the job to failed_testcases_all, and return the test numbers of the job.
+        failed_testcases: the failed testcases of the job like from the build failures summary,
+                          queried from the database if not specified
+    '''
     kernel_version = metadata.get('kernel_version')
     platform = metadata.get('platform')
     qa_job_id = metadata.get('qa_job_id')
@@ -411,156 +687,246 @@ def extract(result_zip_path, failed_testcases_all={}, metadata={}):
     build_version = metadata.get('build_version')
 
     test_numbers = get_testcases_number_for_job_with_qa_job_id(qa_job_id)
-    test_cases = TestCase.objects.filter(lava_nick=metadata.get('lava_nick'), job_id=metadata.get('job_id')).filter(Q(result='fail')|Q(result='ASSUMPTION_FAILURE'))
-    for test_case in test_cases:
-        test_name = test_case.name
-        test_suite = test_case.testsuite
-        if test_suite is None:
-            # for cases like boot, boottime, benchmark jobs
-            continue
-
-        abi = test_suite.abi
-        module_name = test_suite.name
+    if failed_testcases is None:
+        failed_testcases = get_failed_testcases_for_job(lava_nick=metadata.get('lava_nick'), job_id=metadata.get('job_id'))
+    for (module_name, abi, test_name, result, message, stacktrace) in failed_testcases:
         failed_tests_module = failed_testcases_all.get(module_name)
         if not failed_tests_module:
             failed_tests_module = {}
             failed_testcases_all[module_name] = failed_tests_module
 
-        message = test_case.message
-        stacktrace = test_case.stacktrace
-
         failed_testcase = failed_tests_module.get(test_name)
         if failed_testcase:
             if failed_testcase.get('abi_stacktrace').get(abi) is None:
                 failed_testcase.get('abi_stacktrace')[abi] = stacktrace
 
-            if not qa_job_id in failed_testcase.get('qa_job_ids'):
-                failed_testcase.get('qa_job_ids').append(qa_job_id)
-
-            if not kernel_version in failed_testcase.get('kernel_versions'):
-                failed_testcase.get('kernel_versions').append(kernel_version)
-
-            if not platform in failed_testcase.get('platforms'):
-                failed_testcase.get('platforms').append(platform)
-            if not project_name in failed_testcase.get('project_names'):
-                failed_testcase.get('project_names').append(project_name)
-            if not build_version in failed_testcase.get('build_versions'):
-                failed_testcase.get('build_versions').append(build_version)
+            failed_testcase.get('qa_job_ids').add(qa_job_id)
+            failed_testcase.get('kernel_versions').add(kernel_version)
+            failed_testcase.get('platforms').add(platform)
+            failed_testcase.get('project_names').add(project_name)
+            failed_testcase.get('build_versions').add(build_version)
         else:
             (test_class, test_method) = test_name.split('#')[0:2]
             failed_tests_module[test_name]= {
                                                 'test_name': test_name,
                                                 'module_name': module_name,
-                                                'result': test_case.result,
+                                                'result': result,
                                                 'test_class': test_class,
                                                 'test_method': test_method,
                                                 'abi_stacktrace': {abi: stacktrace},
                                                 'message': message,
-                                                'qa_job_ids': [ qa_job_id ],
-                                                'kernel_versions': [ kernel_version ],
-                                                'platforms': [ platform ],
-                                                'project_names': [ project_name ],
-                                                'build_versions': [ build_version ],
+                                                'qa_job_ids': UniqueList([ qa_job_id ]),
+                                                'kernel_versions': UniqueList([ kernel_version ]),
+                                                'platforms': UniqueList([ platform ]),
+                                                'project_names': UniqueList([ project_name ]),
+                                                'build_versions': UniqueList([ build_version ]),
                                             }
 
     return test_numbers
 
 
+def cache_failures_summary_for_build(db_report_build):
+    '''
+        Save the failed testcases of all the jobs of the build
+        with one query, see ReportBuildFailuresSummary
+    '''
+    failures_summary = {}
+    for qa_job_id in ReportJob.objects.filter(report_build=db_report_build, results_cached=True).values_list('qa_job_id', flat=True):
+        failures_summary[str(qa_job_id)] = []
+
+    failed_testcases = TestCase.objects.filter(testsuite__report_job__report_build=db_report_build,
+                                               testsuite__report_job__results_cached=True,
+                                               result__in=['fail', 'ASSUMPTION_FAILURE'])
+    for failed_testcase in failed_testcases.values_list('testsuite__report_job__qa_job_id', *FAILED_TESTCASE_FIELDS):
+        failures_summary.setdefault(str(failed_testcase[0]), []).append(list(failed_testcase[1:]))
+
+    ReportBuildFailuresSummary.objects.update_or_create(report_build=db_report_build, defaults={'failures': failures_summary})
+    return failures_summary
+
+
+def get_build_failures_summary(db_report_build):
+    '''
+        Return the failures summary of the build, see ReportBuildFailuresSummary,
+        or None if the build is not finished or the summary is not saved
+    '''
+    if not BUILD_FAILURES_SUMMARY_ENABLED:
+        # the summaries saved before are not updated any more
+        return None
+    if db_report_build is None or not db_report_build.finished:
+        return None
+    return ReportBuildFailuresSummary.objects.filter(report_build=db_report_build).values_list('failures', flat=True).first()
+
+
+def get_failed_testcases_from_summary(failures_summary, qa_job_id):
+    '''
+        Return the failed testcases of the job from the build failures summary
+        returned by get_build_failures_summary, or None if they are not in the summary
+    '''
+    if failures_summary is None:
+        return None
+    return failures_summary.get(str(qa_job_id))
+
+
+def update_failures_summaries(report_jobs, ingest_summaries):
+    '''
+        Compute the failures summary for the finished builds of the jobs once the jobs are ingested,
+        and drop the summary when the results of the jobs have been changed for the unfinished builds
+    '''
+    if not BUILD_FAILURES_SUMMARY_ENABLED:
+        return
+
+    job_urls_saved = set([summary.get('job_url') for summary in ingest_summaries if summary.get('result') == 'saved'])
+    report_builds = {}
+    report_builds_changed = set()
+    for report_job in report_jobs:
+        if report_job.report_build is None:
+            continue
+        report_builds[report_job.report_build.id] = report_job.report_build
+        if report_job.job_url in job_urls_saved:
+            report_builds_changed.add(report_job.report_build.id)
+    if len(report_builds) == 0:
+        return
+
+    report_build_ids_summarized = set(ReportBuildFailuresSummary.objects.filter(report_build_id__in=list(report_builds.keys()))
+                                            .values_list('report_build_id', flat=True))
+    report_build_ids_to_drop = []
+    for report_build_id, report_build in report_builds.items():
+        if report_build.finished:
+            if report_build_id not in report_build_ids_summarized or report_build_id in report_builds_changed:
+                cache_failures_summary_for_build(report_build)
+        elif report_build_id in report_build_ids_summarized and report_build_id in report_builds_changed:
+            report_build_ids_to_drop.append(report_build_id)
+    if len(report_build_ids_to_drop) > 0:
+        ReportBuildFailuresSummary.objects.filter(report_build_id__in=report_build_ids_to_drop).delete()
+
+
+def get_zip_member_hash(zip_path, member_name=TEST_RESULT_XML_NAME, prefix=b''):
+    hash_sha256 = hashlib.sha256()
+    hash_sha256.update(prefix)
+    with zipfile.ZipFile(zip_path, 'r') as f_zip_fd:
+        with f_zip_fd.open(member_name) as f_member_fd:
+            for chunk in iter(functools.partial(f_member_fd.read, 1024 * 1024), b''):
+                hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
 # function to save testcase information to database for tradefed result
 def save_tradeded_results_to_database(result_file_path, job, report_job):
     lava_config = job.get('lava_config')
     job_id = job.get('job_id')
-    TestCase.objects.filter(lava_nick=lava_config.get('nick'), job_id=job_id).delete()
-    TestSuite.objects.filter(report_job=report_job).delete()
+
+    # the records saved are different when TESTCASE_SAVE_FAILURES_ONLY is changed
+    results_hash = get_zip_member_hash(result_file_path, prefix=("save_failures_only=%s\n" % TESTCASE_SAVE_FAILURES_ONLY).encode('utf-8'))
+    if report_job.results_hash == results_hash:
+        # the records and numbers are from the same test_result.xml already
+        logger.info("Results not changed for job %s, skip saving them again" % job.get('external_url'))
+        report_job.results_cached = True
+        report_job.save()
+        return True
+
+    # existing modules of the job, only records of the changed tests will be
+    # inserted, updated or deleted when the job is ingested again
+    existing_modules = {}
+    duplicated_modules = []
+    for test_module in TestSuite.objects.filter(report_job=report_job).order_by('id'):
+        if (test_module.name, test_module.abi) in existing_modules:
+            duplicated_modules.append(test_module.id)
+            continue
+        existing_modules[(test_module.name, test_module.abi)] = test_module
+    if len(duplicated_modules) > 0:
+        # like the ones saved by the ingestions of the same job at the same time before,
+        # the testcases of the modules are deleted with them
+        logger.info("Deleting %d duplicated modules of job %s" % (len(duplicated_modules), job.get('external_url')))
+        TestSuite.objects.filter(id__in=duplicated_modules).delete()
 
     with zipfile.ZipFile(result_file_path, 'r') as f_zip_fd:
         try:
-            # https://docs.python.org/3/library/xml.etree.elementtree.html
-            root = ET.fromstring(remove_xml_unsupport_character(f_zip_fd.read(TEST_RESULT_XML_NAME).decode('utf-8')))
-            summary_node = root.find('Summary')
-            number_passed = int(summary_node.attrib['pass'])
-            number_failed = int(summary_node.attrib['failed'])
-            assumption_failures = root.findall(".//Module/TestCase/Test[@result='ASSUMPTION_FAILURE']")
-            number_assumption_failure = len(assumption_failures)
-            ignored_testcases = root.findall(".//Module/TestCase/Test[@result='IGNORED']")
-            number_ignored = len(ignored_testcases)
-            all_testcases = root.findall(".//Module/TestCase/Test")
-            number_total = len(all_testcases)
-            modules_done = int(summary_node.attrib['modules_done'])
-            modules_total = int(summary_node.attrib['modules_total'])
-
-            testcase_objs = []
-            for elem in root.findall('Module'):
-                abi = elem.attrib['abi']
-                module_name = elem.attrib['name']
-                done = elem.attrib['done']
-                module_number_pass = elem.attrib['pass']
-                module_number_total = elem.get('total_tests', 0)
-                if module_number_total == 0:
-                    module_number_total = len(elem.findall('.//Test'))
-
-                test_module = TestSuite.objects.create(report_job=report_job,
-                                            name=module_name,
-                                            done=(done == "true"),
-                                            abi=abi,
-                                            number_pass=int(module_number_pass),
-                                            number_total=int(module_number_total))
-
-                # test classes
-                test_class_nodes = elem.findall('.//TestCase')
-                for test_class_node in test_class_nodes:
-                    test_class_name = test_class_node.get('name')
-                    test_case_nodes = test_class_node.findall('.//Test')
-                    for test_case in test_case_nodes:
-                        test_name = test_case.get("name")
-                        if test_name.endswith('_64bit') or test_name.endswith('_32bit'):
-                            test_name = '%s#%s' % (test_class_name, test_name)
-                        else:
-                            test_name = '%s#%s#%s' % (test_class_name, test_name, abi)
-                        # workaround for VtsHalAudioV7_0TargetTest module
-                        # which has test case names longer than 320
-                        test_name = test_name[:320]
-                        test_result = test_case.get('result')
-                        #result is one of: 'pass', 'fail', 'IGNORED', ASSUMPTION_FAILURE'
-
-                        if test_result == 'fail' or test_result == 'ASSUMPTION_FAILURE':
-                            message = test_case.find('.//Failure').get('message')
-                            stacktrace = test_case.find('.//Failure/StackTrace').text
-                            testcase_objs.append(TestCase(name=test_name,
-                                                result=test_result,
-                                                suite=module_name,
-                                                testsuite=test_module,
-                                                lava_nick=lava_config.get('nick'),
-                                                job_id=job_id,
-                                                message=message,
-                                                stacktrace=stacktrace))
-                        else:
-                            testcase_objs.append(TestCase(name=test_name,
-                                                result=test_result,
-                                                suite=module_name,
-                                                testsuite=test_module,
-                                                lava_nick=lava_config.get('nick'),
-                                                job_id=job_id))
-
-            save_testcases_with_bulk_call(testcase_objs=testcase_objs)
-
-            report_job.number_passed = number_passed
-            report_job.number_failed = number_failed
-            report_job.number_assumption_failure = number_assumption_failure
-            report_job.number_ignored = number_ignored
-            report_job.number_total = number_total
-            report_job.modules_done = modules_done
-            report_job.modules_total = modules_total
+            with f_zip_fd.open(TEST_RESULT_XML_NAME) as f_result_fd:
+                # parse the result file module by module, with the testcases saved in batches
+                # so that the memory used does not depend on the size of the result file
+                f_filtered_fd = XmlCharRefFilter(f_result_fd)
+                test_module = None
+                testcase_sync = None
+                numbers = {}
+                if TESTCASE_SAVE_FAILURES_ONLY:
+                    results_artifact = ResultsArtifactWriter()
+                for event, value in iterparse_tradefed_result(f_filtered_fd):
+                    if event == 'module_start':
+                        test_module = existing_modules.pop((value.get('name'), value.get('abi')), None)
+                        if test_module is None:
+                            test_module = TestSuite(report_job=report_job, name=value.get('name'), abi=value.get('abi'))
+                        test_module.done = (value.get('done') == "true")
+                        test_module.number_pass = int(value.get('pass'))
+                        test_module.number_total = int(value.get('total_tests') or 0)
+                        test_module.save()
+                        testcase_sync = TestCaseSync(TestCase.objects.filter(testsuite=test_module))
+                    elif event == 'tests':
+                        if TESTCASE_SAVE_FAILURES_ONLY:
+                            # all results are kept in the results artifact, only failures saved as records
+                            name_ids = test_name_cache.resolve([test.get('name') for test in value] + [test_module.name])
+                            for test in value:
+                                results_artifact.append(name_ids.get(test.get('name')), name_ids.get(test_module.name), test.get('result'))
+                            value = [test for test in value if test.get('result') == 'fail' or test.get('result') == 'ASSUMPTION_FAILURE']
+
+                        # rows in the order of TESTCASE_FIELDS, no model instances needed
+                        testcase_sync.apply([(test.get('name'),
+                                                test.get('result'),
+                                                None,
+                                                None,
+                                                test_module.name,
+                                                job_id,
+                                                lava_config.get('nick'),
+                                                test_module.id,
+                                                test.get('message'),
+                                                test.get('stacktrace')) for test in value])
+                    elif event == 'module_end':
+                        testcase_sync.finish()
+                        if testcase_sync.number_inserted + testcase_sync.number_updated + testcase_sync.number_deleted > 0:
+                            logger.info("Module %s %s of job %s: %d inserted, %d updated, %d deleted" % (
+                                            test_module.name, test_module.abi, job.get('external_url'),
+                                            testcase_sync.number_inserted, testcase_sync.number_updated, testcase_sync.number_deleted))
+                        if test_module.number_total == 0:
+                            test_module.number_total = value.get('number_tests')
+                            test_module.save()
+                        test_module = None
+                        testcase_sync = None
+                    elif event == 'summary':
+                        numbers = value
+                if f_filtered_fd.number_removed > 0:
+                    logger.info("Removed %d invalid character references from the result of job %s" % (f_filtered_fd.number_removed, job.get('external_url')))
+
+            # modules not in the result file any more
+            for test_module in existing_modules.values():
+                test_module.delete()
+
+            results_artifact_path = get_results_artifact_path(job)
+            if TESTCASE_SAVE_FAILURES_ONLY:
+                results_artifact.save(results_artifact_path)
+            elif os.path.exists(results_artifact_path):
+                # the results are all saved as records this time
+                os.unlink(results_artifact_path)
+
+            report_job.number_passed = numbers.get('number_passed')
+            report_job.number_failed = numbers.get('number_failed')
+            report_job.number_assumption_failure = numbers.get('number_assumption_failure')
+            report_job.number_ignored = numbers.get('number_ignored')
+            report_job.number_total = numbers.get('number_total')
+            report_job.modules_done = numbers.get('modules_done')
+            report_job.modules_total = numbers.get('modules_total')
+            report_job.results_hash = results_hash
             report_job.results_cached = True
             report_job.save()
 
-            # seem not much help on the memory buff/cache release
-            del testcase_objs
             return True
 
         except ET.ParseError as e:
             logger.error('xml.etree.ElementTree.ParseError: %s' % e)
-            logger.info('Please Check %s manually' % result_zip_path)
+            logger.info('Please Check %s manually' % result_file_path)
+            # the records are partly updated, remove them all
+            TestCase.objects.filter(lava_nick=lava_config.get('nick'), job_id=job_id).delete()
+            TestSuite.objects.filter(report_job=report_job).delete()
+            report_job.results_hash = None
+            report_job.save()
             return False
 
 
@@ -672,14 +1038,18 @@ def get_classified_jobs(jobs=[], environment=None):
         }
 
 
-def get_test_result_number_for_build(build, jobs=None, environment=None):
+def get_test_result_number_for_build(build, jobs=None, environment=None, queue=False):
+    '''
+        queue: queue the jobs not ingested yet instead of ingesting them, see download_attachments_save_result,
+               only for the pages, the numbers of the jobs queued are not counted
+    '''
     test_numbers = qa_report.TestNumbers()
 
     if not jobs:
         jobs = get_jobs_for_build_from_db_or_qareport(build_id=build.get("id"), force_fetch_from_qareport=True)
 
     jobs_to_be_checked = get_classified_jobs(jobs=jobs, environment=environment).get('final_jobs')
-    download_attachments_save_result(jobs=jobs_to_be_checked)
+    download_attachments_save_result(jobs=jobs_to_be_checked, queue=queue)
 
     jobs_finished = 0
     for job in jobs_to_be_checked:
@@ -703,6 +1073,7 @@ def get_test_result_number_for_build(build, jobs=None, environment=None):
         'modules_total': test_numbers.modules_total,
         'jobs_total': len(jobs_to_be_checked),
         'jobs_finished': jobs_finished,
+        'jobs_ingesting': len([job for job in jobs_to_be_checked if job.get('ingesting')]),
         }
 
 
@@ -941,26 +1312,6 @@ def get_project_info(project, environment=None):
     logger.info("%s: finished to get information for project", project.get('name'))
 
 
-def thread_pool(func=None, elements=[], subgroup_count=10):
-    number_of_elements = len(elements)
-    number_of_subgroup = math.ceil(number_of_elements/subgroup_count)
-    finished_count = 0
-    for i in range(number_of_subgroup):
-        subgroup_elements = elements[i*subgroup_count: (i+1)*subgroup_count]
-        finished_count = finished_count + len(subgroup_elements)
-
-        threads = list()
-        for element in subgroup_elements:
-            t = threading.Thread(target=func, args=(element,))
-            threads.append(t)
-            t.start()
-
-        for t in threads:
-            t.join()
-
-    logger.info("Finished getting information for all elements: number_of_elements=%d, number_of_subgroup=%d, finished_count=%d" % (number_of_elements, number_of_subgroup, finished_count))
-
-
 def is_project_accessible(project_full_name=None, user=AnonymousUser, is_public=False):
     if project_full_name is None:
         return False
@@ -1017,7 +1368,7 @@ def get_projects_info(groups=[], request=None):
 
         projects.append(project)
 
-    thread_pool(func=get_project_info, elements=projects)
+    map_tasks(get_project_info, elements=projects)
 
     def get_project_name(item):
         return item.get('name')
@@ -1091,7 +1442,7 @@ def list_projects(request):
     return list_group_projects(request, groups=groups, title_head=title_head)
 
 
-def get_build_info(db_reportproject=None, build=None, fetch_latest_from_qa_report=False, environment=None):
+def get_build_info(db_reportproject=None, build=None, fetch_latest_from_qa_report=False, environment=None, queue=False):
     if not build:
         return
 
@@ -1113,7 +1464,7 @@ def get_build_info(db_reportproject=None, build=None, fetch_latest_from_qa_repor
     trigger_build = get_trigger_from_qareport_build(build)
 
     get_lkft_build_status(build, jobs)
-    build['numbers'] = get_test_result_number_for_build(build, jobs, environment=environment)
+    build['numbers'] = get_test_result_number_for_build(build, jobs, environment=environment, queue=queue)
 
     if trigger_build:
         trigger_build['duration'] = datetime.timedelta(milliseconds=trigger_build['duration'])
@@ -1173,12 +1524,88 @@ def cache_qabuild_to_database(qareport_build, force=False):
             db_report_build.kernel_change = qareport_build.get("kernel_change")
 
         db_report_build.save()
+        update_project_snapshot_for_build(db_report_build)
     return db_report_build
 
 
-def cache_qajob_to_database(job):
-    report_job = ReportJob.objects.get_or_create(job_url=job.get('external_url'))[0]
+def update_project_snapshot(db_report_project):
+    '''
+        Save the numbers and status of the last build of the project into its snapshot,
+        with the regressions compared with the previous build.
+        The builds with the status NOINFO are not used, like the new builds saved without
+        their jobs by poll_project_builds, which have no numbers yet
+    '''
+    db_report_builds = list(ReportBuild.objects.filter(qa_project=db_report_project).exclude(status='NOINFO')
+                                .order_by('-qa_build_id')[:2])
+    numbers = qa_report.TestNumbers()
+    last_build = None
+    previous_build = None
+    if len(db_report_builds) > 0:
+        last_build = db_report_builds[0]
+        numbers = qa_report.TestNumbers().addWithDatabaseRecord(last_build)
+    if len(db_report_builds) > 1:
+        previous_build = db_report_builds[1]
+        numbers.number_regressions = numbers.number_failed - previous_build.number_failed
+
+    snapshot = ReportProjectSnapshot.objects.update_or_create(project=db_report_project,
+                    defaults={
+                        'last_build': last_build,
+                        'last_qa_build_id': last_build.qa_build_id if last_build else None,
+                        'previous_qa_build_id': previous_build.qa_build_id if previous_build else None,
+                        'numbers': numbers.toHash(),
+                        'status': last_build.status if last_build else None,
+                    })[0]
+    return snapshot
+
+
+def update_project_snapshot_for_build(db_report_build):
+    '''
+        Update the snapshot of the project when the build is one of the last two builds of the project
+    '''
+    if db_report_build.qa_project_id is None or db_report_build.status == 'NOINFO':
+        return
+    previous_qa_build_id = ReportProjectSnapshot.objects.filter(project_id=db_report_build.qa_project_id) \
+                                .values_list('previous_qa_build_id', flat=True).first()
+    if previous_qa_build_id is not None and db_report_build.qa_build_id < previous_qa_build_id:
+        # older builds do not change the snapshot
+        return
+    update_project_snapshot(db_report_build.qa_project)
+
+
+def get_projects_with_snapshot(groups=[]):
+    '''
+        Return the ReportProject records of the groups with the snapshot loaded in the same query,
+        the projects without a snapshot yet get an empty one that is not saved,
+        the snapshots are created by the backfillprojectsnapshots command and the ingestion
+    '''
+    db_report_projects = ReportProject.objects.select_related('snapshot').order_by('id')
+    if len(groups) > 0:
+        db_report_projects = db_report_projects.filter(group__in=groups)
+
+    db_report_projects = list(db_report_projects)
+    for db_report_project in db_report_projects:
+        if not hasattr(db_report_project, 'snapshot'):
+            db_report_project.snapshot = ReportProjectSnapshot(project=db_report_project)
+    return db_report_projects
+
+
+# the fields of the existing ReportJob records updated with the jobs from qa-report,
+# the numbers and results_cached are only updated by the ingestion of the job,
+# which might be done by another worker at the same time
+REPORT_JOB_SYNC_FIELDS = ['job_name', 'qa_job_id', 'attachment_url', 'parent_job', 'environment', 'status',
+                          'failure_msg', 'submitted_at', 'fetched_at', 'report_build', 'resubmitted']
+
 
+def get_report_job_sync_values(report_job):
+    return [getattr(report_job, 'report_build_id' if field == 'report_build' else field) for field in REPORT_JOB_SYNC_FIELDS]
+
+
+def update_report_job_with_qajob(report_job, job, report_builds):
+    '''
+        Set the fields of report_job with the job from qa-report,
+        report_builds is the dict of build id to ReportBuild record shared by the jobs,
+        so that the same build is only queried once
+    '''
     report_job.job_name = job.get('name')
     report_job.qa_job_id = job.get('id')
     report_job.attachment_url = job.get('attachment_url')
@@ -1205,24 +1632,87 @@ def cache_qajob_to_database(job):
 
     if report_job.report_build is None:
         target_build_id = job.get('target_build').strip('/').split('/')[-1]
-        db_report_build =  get_build_from_database_or_qareport(target_build_id)[1]
-        report_job.report_build = db_report_build
+        if target_build_id not in report_builds:
+            report_builds[target_build_id] = get_build_from_database_or_qareport(target_build_id)[1]
+        report_job.report_build = report_builds[target_build_id]
 
     if job.get('resubmitted'):
         resubmitted = job.get('resubmitted')
         report_job.resubmitted = resubmitted
 
+    # only saved for the new records by cache_qajobs_to_database, the numbers of
+    # the existing records are not in REPORT_JOB_SYNC_FIELDS, they are only
+    # updated by the ingestion of the job
     #if not report_job.results_cached and \
     if job.get('numbers') is not None:
         qa_report.TestNumbers.setHashValueForDatabaseRecord(report_job, job.get('numbers'))
         report_job.results_cached = True
         report_job.finished_successfully = True
 
-    report_job.save()
-
     return report_job
 
 
+def cache_qajobs_to_database(jobs=[], report_build=None):
+    '''
+        Save the jobs from qa-report to database with a constant number of queries:
+        the existing ReportJob records are loaded with one query, then the new records
+        are saved with bulk_create, and the fields of the existing ones that are changed
+        with bulk_update, see REPORT_JOB_SYNC_FIELDS.
+        report_build: the ReportBuild of the jobs if it's known already,
+                      otherwise it's resolved once for each build of the jobs
+        Return the dict of job url to the ReportJob record
+    '''
+    job_urls = []
+    for job in jobs:
+        if job.get('external_url') not in job_urls:
+            job_urls.append(job.get('external_url'))
+    if len(job_urls) == 0:
+        return {}
+
+    report_jobs = {}
+    for report_job in ReportJob.objects.filter(job_url__in=job_urls).select_related('report_build').order_by('id'):
+        # the first record is used when there are duplicated records for the same job url
+        report_jobs.setdefault(report_job.job_url, report_job)
+
+    report_builds = {}
+    if report_build is not None:
+        report_builds[str(report_build.qa_build_id)] = report_build
+
+    old_values = {}
+    for job_url, report_job in report_jobs.items():
+        old_values[job_url] = get_report_job_sync_values(report_job)
+
+    new_report_jobs = {}
+    for job in jobs:
+        job_url = job.get('external_url')
+        report_job = report_jobs.get(job_url) or new_report_jobs.get(job_url)
+        if report_job is None:
+            report_job = ReportJob(job_url=job_url)
+            new_report_jobs[job_url] = report_job
+        update_report_job_with_qajob(report_job, job, report_builds)
+
+    # only the fields changed are updated, grouped by the fields so that
+    # the records with the same fields changed are updated with one bulk_update
+    report_jobs_changed = collections.OrderedDict()
+    for job_url, report_job in report_jobs.items():
+        new_values = get_report_job_sync_values(report_job)
+        fields_changed = tuple(field for field, old_value, new_value in zip(REPORT_JOB_SYNC_FIELDS, old_values[job_url], new_values)
+                                if old_value != new_value)
+        if len(fields_changed) > 0:
+            report_jobs_changed.setdefault(fields_changed, []).append(report_job)
+    for fields_changed, report_jobs_to_update in report_jobs_changed.items():
+        ReportJob.objects.bulk_update(report_jobs_to_update, list(fields_changed), batch_size=1000)
+    if len(new_report_jobs) > 0:
+        ReportJob.objects.bulk_create(list(new_report_jobs.values()), batch_size=1000)
+        report_jobs.update(new_report_jobs)
+
+    return report_jobs
+
+
+def cache_qajob_to_database(job):
+    return cache_qajobs_to_database([job]).get(job.get('external_url'))
+
+
 def get_project_from_database_or_qareport(project_id, force_fetch_from_qareport=False):
     try:
         db_reportproject = ReportProject.objects.get(project_id=project_id)
@@ -1355,12 +1845,238 @@ def get_jobs_for_build_from_db_or_qareport(build_id=None, force_fetch_from_qarep
         jobs = qa_report_api.get_jobs_for_build(build_id)
         get_classified_jobs(jobs, environment=environment)
         get_attachment_urls(jobs)
-        for job in jobs:
-            cache_qajob_to_database(job)
+        cache_qajobs_to_database(jobs, report_build=db_report_build)
 
     return jobs
 
 
+def poll_build(build, db_report_project=None):
+    '''
+        Fetch the jobs of the qa-report build, save the build with its status and numbers,
+        and ingest the jobs not ingested yet.
+        Return the ReportBuild saved
+    '''
+    jobs = qa_report_api.get_jobs_for_build(build.get('id'))
+    final_jobs = get_classified_jobs(jobs=jobs).get('final_jobs')
+    get_lkft_build_status(build, final_jobs)
+
+    db_report_build = cache_qabuild_to_database(build)
+    if db_report_build.qa_project is None:
+        db_report_build.qa_project = db_report_project
+    cache_qajobs_to_database(jobs, report_build=db_report_build)
+
+    numbers_of_result = get_test_result_number_for_build(build, final_jobs)
+    qa_report.TestNumbers.setHashValueForDatabaseRecord(db_report_build, numbers_of_result)
+    db_report_build.status = build.get('build_status')
+    if build.get('last_fetched_timestamp'):
+        db_report_build.fetched_at = build.get('last_fetched_timestamp')
+    db_report_build.save()
+    update_project_snapshot_for_build(db_report_build)
+    return db_report_build
+
+
+def poll_project_builds(qa_project, versions=None):
+    '''
+        Poll the builds of the qa-report project that might be changed since the last poll:
+        the builds newer than the polled_qa_build_id watermark of the project, and the builds
+        polled before but not completed or still being ingested.
+        versions: only the builds with these versions are polled when specified,
+                  like the describes of the kernel changes not reported yet,
+                  the other new builds are saved without their jobs, and polled
+                  later when their versions are specified
+        The first time the project is polled, the builds are checked back to
+        the oldest kernel change not reported yet.
+        Return the list of ReportBuild polled
+    '''
+    db_report_project = ReportProject.objects.filter(project_id=qa_project.get('id')).first()
+    if db_report_project is None:
+        db_report_project = cache_qaproject_to_database(qa_project)
+    polled_qa_build_id = db_report_project.polled_qa_build_id
+    polled_at = timezone.now()
+
+    oldest_timestamp = polled_at
+    if polled_qa_build_id == 0:
+        oldest_kernelchange_timestamp = KernelChange.objects_needs_report.filter(timestamp__isnull=False) \
+                                            .order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest_kernelchange_timestamp is not None:
+            oldest_timestamp = oldest_kernelchange_timestamp
+
+    builds_to_poll = []
+    builds_skipped = []
+    max_qa_build_id = polled_qa_build_id
+    builds_api_url = qa_report_api.get_builds_api_url(qa_project.get('id'))
+    for build in qa_report_api.iter_list_results(api_url=builds_api_url):
+        # builds are listed with the newest one first
+        if build.get('id') <= polled_qa_build_id:
+            break
+        max_qa_build_id = max(max_qa_build_id, build.get('id'))
+        if polled_qa_build_id == 0 and build.get('created_at') and \
+                qa_report_api.get_aware_datetime_from_str(build.get('created_at')) < oldest_timestamp:
+            # not needed by any kernel change not reported yet
+            break
+        if versions is None or build.get('version') in versions:
+            builds_to_poll.append(build)
+        else:
+            builds_skipped.append(build)
+
+    db_open_builds = ReportBuild.objects.filter(qa_project=db_report_project, qa_build_id__lte=polled_qa_build_id)
+    if versions is not None:
+        db_open_builds = db_open_builds.filter(version__in=versions)
+    db_open_builds = list(db_open_builds)
+    ingesting_report_build_ids = ingest_queue.get_ingesting_report_build_ids([db_report_build.id for db_report_build in db_open_builds])
+    for db_report_build in db_open_builds:
+        if db_report_build.status == 'JOBSCOMPLETED' and db_report_build.finished \
+                and db_report_build.id not in ingesting_report_build_ids:
+            continue
+        builds_to_poll.append(qa_report_api.get_build(db_report_build.qa_build_id))
+
+    db_report_builds = []
+    for build in builds_to_poll:
+        db_report_builds.append(poll_build(build, db_report_project=db_report_project))
+
+    # saved as not completed below the watermark,
+    # so that they are polled when their versions are specified
+    for build in builds_skipped:
+        db_report_build = cache_qabuild_to_database(build)
+        if db_report_build.qa_project is None:
+            db_report_build.qa_project = db_report_project
+            db_report_build.save(update_fields=['qa_project'])
+
+    # the watermark is only moved when all the builds are polled successfully
+    db_report_project.polled_qa_build_id = max_qa_build_id
+    db_report_project.polled_at = polled_at
+    db_report_project.save(update_fields=['polled_qa_build_id', 'polled_at'])
+
+    logger.info("Polled %d builds for project %s" % (len(db_report_builds), qa_project.get('full_name')))
+    return db_report_builds
+
+
+def poll_lkft_projects(versions=None):
+    '''
+        Poll the builds of all the lkft projects concurrently, see poll_project_builds
+        Return the list of ReportBuild polled
+    '''
+    lkft_projects = qa_report_api.get_lkft_qa_report_projects()
+    tasks = map_tasks(functools.partial(poll_project_builds, versions=versions), lkft_projects, name='poll_project_builds')
+    db_report_builds = []
+    for task in tasks:
+        if task.failed():
+            # polled again the next time with the watermark not changed
+            continue
+        db_report_builds.extend(task.result)
+    return db_report_builds
+
+
+def get_expected_report_projects(branch):
+    '''
+        Return the list of the project aliases from androidreportconfig
+        that are expected to have builds for the kernel changes of the branch
+    '''
+    androidreportconfig = get_androidreportconfig_module()
+    all_supported_kernels = {**androidreportconfig.get_all_report_kernels(), **androidreportconfig.get_all_boottime_report_kernels()}
+    all_supported_projects = {**androidreportconfig.get_all_report_projects(), **androidreportconfig.get_all_boottime_report_projects()}
+    categories = androidreportconfig.get_branch_categories_pair().get(branch, [branch, f'{branch}-boottime'])
+
+    project_aliases = []
+    for category in categories:
+        for project_alias_name in all_supported_kernels.get(category, []):
+            project_alias = all_supported_projects.get(project_alias_name, None)
+            if project_alias is not None:
+                project_aliases.append(project_alias)
+    return project_aliases
+
+
+def get_report_projects_without_builds(db_kernelchange, db_report_builds=[]):
+    '''
+        Return the list of the expected projects for the branch of the kernel change,
+        as project ids or group/slug, that have no build for the kernel change yet
+    '''
+    project_ids = set()
+    project_full_names = set()
+    for db_report_build in db_report_builds:
+        if db_report_build.qa_project is None:
+            continue
+        project_ids.add(str(db_report_build.qa_project.project_id))
+        project_full_names.add("%s/%s" % (db_report_build.qa_project.group, db_report_build.qa_project.slug))
+
+    projects_without_builds = []
+    for project_alias in get_expected_report_projects(db_kernelchange.branch):
+        if project_alias.get("project_id", None):
+            if str(project_alias.get("project_id")) not in project_ids:
+                projects_without_builds.append(str(project_alias.get("project_id")))
+        else:
+            project_full_name = "%s/%s" % (project_alias.get("group"), project_alias.get("slug"))
+            if project_full_name not in project_full_names:
+                projects_without_builds.append(project_full_name)
+    return projects_without_builds
+
+
+def update_kernel_change_with_report_builds(db_kernelchange, db_report_builds=[]):
+    '''
+        Set the result, numbers, duration and the reported flag of the kernel change
+        with the builds saved for it, the builds that have the describe as the version.
+        The kernel change is only completed when all the projects expected for its branch
+        have builds for it, see get_expected_report_projects.
+        Return the result, or None if there is no build for the kernel change yet.
+    '''
+    if len(db_report_builds) == 0:
+        return None
+
+    try:
+        projects_without_builds = get_report_projects_without_builds(db_kernelchange, db_report_builds)
+    except Exception as e:
+        # not reported until the expected projects could be checked
+        logger.error("Failed to get the expected projects for branch %s: %s" % (db_kernelchange.branch, e))
+        projects_without_builds = None
+
+    ingesting_report_build_ids = ingest_queue.get_ingesting_report_build_ids([db_report_build.id for db_report_build in db_report_builds])
+    statuses = set([db_report_build.status for db_report_build in db_report_builds])
+    if projects_without_builds is None:
+        result = 'HAS_JOBS_IN_PROGRESS'
+    elif len(projects_without_builds) > 0:
+        logger.info("No builds for %s with projects: %s" % (db_kernelchange.describe, ' '.join(projects_without_builds)))
+        result = 'HAS_QA_BUILD_NOT_FOUND'
+    elif 'JOBSNOTSUBMITTED' in statuses:
+        result = 'HAS_JOBS_NOT_SUBMITTED'
+    elif 'CANCELED' in statuses:
+        result = 'HAS_JOBS_CANCELED'
+    elif statuses == set(['JOBSCOMPLETED']) and len(ingesting_report_build_ids) == 0:
+        result = 'ALL_COMPLETED'
+    else:
+        result = 'HAS_JOBS_IN_PROGRESS'
+
+    test_numbers = qa_report.TestNumbers()
+    for db_report_build in db_report_builds:
+        test_numbers.addWithDatabaseRecord(db_report_build)
+        if db_report_build.kernel_change_id is None:
+            db_report_build.kernel_change = db_kernelchange
+            db_report_build.save(update_fields=['kernel_change'])
+    test_numbers.setValueForDatabaseRecord(db_kernelchange)
+
+    fetched_timestamps = [db_report_build.fetched_at for db_report_build in db_report_builds if db_report_build.fetched_at]
+    if len(fetched_timestamps) > 0 and db_kernelchange.timestamp is not None:
+        db_kernelchange.duration = (max(fetched_timestamps) - db_kernelchange.timestamp).total_seconds()
+    db_kernelchange.result = result
+    db_kernelchange.reported = (result == 'ALL_COMPLETED')
+    db_kernelchange.save()
+    return result
+
+
+def get_benchmark_measurements_for_job(job_id=None, lava_nick=None):
+    '''
+        Return the dict of (normalized suite, name) to (unit, measurement)
+        for all the testcases of the benchmark job
+    '''
+    job_measurements = {}
+    for (normalized_suite, suite, name, unit, measurement) in TestCase.objects.filter(job_id=job_id, lava_nick=lava_nick) \
+            .values_list('normalized_suite', 'suite', 'name', 'unit', 'measurement'):
+        if normalized_suite is None:
+            # records not backfilled yet
+            normalized_suite = normalize_suite(suite)
+        job_measurements[(normalized_suite, name)] = (unit, measurement)
+    return job_measurements
+
+
 def get_measurements_of_project(project_id=None,
                                 project_name=None,
                                 project_group=None,
@@ -1371,7 +2087,8 @@ def get_measurements_of_project(project_id=None,
                                 testcases=[],
                                 fetch_latest_from_qa_report=False,
                                 environment=None,
-                                per_page=0):
+                                per_page=0,
+                                queue=False):
     # if project_id is not None:
     #     db_report_project = ReportProject.objects.get(project_id=project_id)
     # elif project_group is None:
@@ -1408,7 +2125,7 @@ def get_measurements_of_project(project_id=None,
     for build in sorted_builds:
         jobs = get_jobs_for_build_from_db_or_qareport(build_id=build.get("id"), force_fetch_from_qareport=fetch_latest_from_qa_report)
         jobs_to_be_checked = get_classified_jobs(jobs=jobs, environment=environment).get('final_jobs')
-        download_attachments_save_result(jobs_to_be_checked)
+        download_attachments_save_result(jobs_to_be_checked, queue=queue)
 
         jobs_query = None
         for benchmark_job_name in expected_benchmark_jobs:
@@ -1430,7 +2147,7 @@ def get_measurements_of_project(project_id=None,
 
         test_case_hash = {}
         for test_case in test_case_res_s:
-            test_suite = re.sub('^\d+_', '', test_case.suite)
+            test_suite = test_case.normalized_suite or normalize_suite(test_case.suite)
             test_case_key = "{}|{}|{}|{}".format(test_case.lava_nick, test_case.job_id, test_suite, test_case.name)
             test_case_hash[test_case_key] = test_case
 
@@ -1615,7 +2332,8 @@ def list_builds(request):
             num_builds = BUILD_WITH_JOBS_NUMBER
         sorted_builds = sorted(builds[:num_builds], key=get_build_kernel_version, reverse=True)
         for build in sorted_builds:
-            builds_result.append(get_build_info(db_reportproject, build, fetch_latest_from_qa_report=fetch_latest_from_qa_report, environment=None))
+            builds_result.append(get_build_info(db_reportproject, build, fetch_latest_from_qa_report=fetch_latest_from_qa_report, environment=None,
+                                                queue=INGEST_QUEUE_ENABLED))
 
         #func = functools.partial(get_build_info, db_reportproject)
         #with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
@@ -1636,7 +2354,8 @@ def list_builds(request):
         benchmark_jobs_data_dict = get_measurements_of_project(project=project,
                                                                builds=builds,
                                                                fetch_latest_from_qa_report=fetch_latest_from_qa_report,
-                                                               per_page=per_page)
+                                                               per_page=per_page,
+                                                               queue=INGEST_QUEUE_ENABLED)
 
         boottime_jobs_data_dict = benchmark_jobs_data_dict.pop('boottime', None)
         if boottime_jobs_data_dict:
@@ -1656,46 +2375,29 @@ def list_builds(request):
                             })
 
 
-def get_lkft_bugs(summary_keyword=None, platform=None):
-    bugs = []
-
-    terms = [
+def get_lkft_bug_terms():
+    return [
                 {u'product': 'Linaro Android'},
                 {u'component': 'General'},
                 {u'op_sys': 'Android'},
                 {u'keywords': 'LKFT'}
             ]
-    if platform is not None:
-        terms.append({u'platform': platform})
-
-    for bug in bugzilla_instance.search_bugs(terms).bugs:
-        bug_dict = bugzilla.DotDict(bug)
-        if summary_keyword is not None and \
-            bug_dict.get('summary').find(summary_keyword) < 0:
-            continue
-        bugs.append(bug_dict)
 
-    def get_bug_summary(item):
-        return item.get('summary')
 
-    sorted_bugs = sorted(bugs, key=get_bug_summary)
-    return sorted_bugs
+def get_lkft_bugs(summary_keyword=None, platform=None):
+    # the bugs are read from the database, which are synced from bugzilla
+    # in the background when out of date, so pages still work when bugzilla is down
+    bug_store.sync_bugs_if_stale(bugzilla_instance, terms=get_lkft_bug_terms())
+    return bug_store.get_bugs(summary_keyword=summary_keyword, platform=platform)
 
 
-def find_bug_for_failure(failure, patterns=[], bugs=[]):
-    found_bug = None
-    for pattern in patterns:
-        if found_bug is not None:
-            break
-        for bug in bugs:
-            if pattern.search(bug.summary):
-                if failure.get('bugs'):
-                    failure['bugs'].append(bug)
-                else:
-                    failure['bugs'] = [bug]
-                found_bug = bug
-            if found_bug is not None:
-                break
+def find_bug_for_failure(failure, keys=[], bug_index=None):
+    found_bug = bug_index.find_bug(keys=keys)
+    if found_bug is not None:
+        if failure.get('bugs'):
+            failure['bugs'].append(found_bug)
+        else:
+            failure['bugs'] = [found_bug]
 
     return found_bug
 
@@ -1734,9 +2436,6 @@ def get_project_jobs(project, environment=None):
 @login_required
 @permission_required('lkft.admin_projects')
 def list_all_jobs(request):
-    import threading
-    threads = list()
-
     projects = []
     for project in qa_report_api.get_projects():
         project_full_name = project.get('full_name')
@@ -1753,12 +2452,8 @@ def list_all_jobs(request):
             continue
 
         projects.append(project)
-        t = threading.Thread(target=get_project_jobs, args=(project,))
-        threads.append(t)
-        t.start()
 
-    for t in threads:
-        t.join()
+    map_tasks(get_project_jobs, elements=projects)
 
     all_final_jobs = []
     all_resubmitted_jobs = []
@@ -1875,17 +2570,22 @@ def list_jobs(request):
     classified_jobs = get_classified_jobs(jobs=jobs, environment=environment)
     jobs_to_be_checked = classified_jobs.get('final_jobs')
     resubmitted_duplicated_jobs = classified_jobs.get('resubmitted_or_duplicated_jobs')
+    lava_jobs_info = get_lava_jobs_info(jobs=jobs_to_be_checked + resubmitted_duplicated_jobs)
     for job in resubmitted_duplicated_jobs:
         job['qa_job_id'] = job.get('id')
         if job.get('external_url') is None:
             continue
         lava_config = find_lava_config(job.get('external_url'))
-        job_lava_info = qa_report.LAVAApi(lava_config=lava_config).get_job(job_id=job['job_id'])
+        job_lava_info = lava_jobs_info.get(job.get('id'))
         lava_config_hostname = lava_config.get("hostname")
         job['actual_device'] = job_lava_info['actual_device']
         job['actual_device_url'] = f"https://{lava_config_hostname}/scheduler/device/{job_lava_info.actual_device}"
 
-    download_attachments_save_result(jobs=jobs, fetch_latest=fetch_latest_from_qa_report)
+    download_attachments_save_result(jobs=jobs, fetch_latest=fetch_latest_from_qa_report, queue=INGEST_QUEUE_ENABLED)
+    # the failures summary might be saved for the build when the jobs are ingested
+    if db_report_build is not None:
+        db_report_build.refresh_from_db(fields=['finished'])
+    failures_summary = get_build_failures_summary(db_report_build)
     failures = {}
     resubmitted_job_urls = []
     benchmarks_res = []
@@ -1894,7 +2594,7 @@ def list_jobs(request):
 
         lava_config = find_lava_config(job.get('external_url'))
         if lava_config is not None:
-            job_lava_info = qa_report.LAVAApi(lava_config=lava_config).get_job(job_id=job['job_id'])
+            job_lava_info = lava_jobs_info.get(job.get('id'))
             lava_config_hostname = lava_config.get("hostname")
             job['actual_device'] = job_lava_info['actual_device']
             job['actual_device_url'] = f"https://{lava_config_hostname}/scheduler/device/{job_lava_info.actual_device}"
@@ -1926,16 +2626,12 @@ def list_jobs(request):
             job_id = job.get('job_id')
             job_name = job.get('name')
 
+            # all the measurements of the job with one query
+            job_measurements = get_benchmark_measurements_for_job(job_id=job_id, lava_nick=lava_nick)
             for test_suite in sorted(expected_testsuites.keys()):
                 test_cases = expected_testsuites.get(test_suite)
                 for test_case in test_cases:
-                    try:
-                        test_case_res = TestCase.objects.get(job_id=job_id, lava_nick=lava_nick, suite__endswith='_%s' % test_suite, name=test_case)
-                        unit = test_case_res.unit
-                        measurement = test_case_res.measurement
-                    except TestCase.DoesNotExist:
-                        unit = '--'
-                        measurement = '--'
+                    (unit, measurement) = job_measurements.get((test_suite, test_case), ('--', '--'))
 
                     benchmarks_res.append({'job_name': job_name,
                                            'job_id': job_id,
@@ -1967,10 +2663,13 @@ def list_jobs(request):
                 'platform': platform,
                 'project_name': project_name,
                 }
-            numbers = extract(result_file_path, failed_testcases_all=failures, metadata=metadata)
+            failed_testcases = get_failed_testcases_from_summary(failures_summary, job.get('id'))
+            numbers = extract(result_file_path, failed_testcases_all=failures, metadata=metadata, failed_testcases=failed_testcases)
             job['numbers'] = numbers
 
     bugs = get_lkft_bugs(summary_keyword=project_name)
+    # built once for all the failures of the build
+    bug_index = BugSummaryIndex(bugs)
     bugs_reproduced = []
     failures_list = []
     for module_name in sorted(failures.keys()):
@@ -1999,23 +2698,22 @@ def list_jobs(request):
                 search_key = '%s %s' % (module_name, test_name)
             search_key_exact = search_key.replace('#arm64-v8a', '').replace('#armeabi-v7a', '')
 
-            pattern_testcase = re.compile(r'\b({0})\s+failed\b'.format(search_key_exact.replace('[', '\[').replace(']', '\]')))
-            pattern_testclass = re.compile(r'\b({0})\s+failed\b'.format(failure.get('test_class').replace('[', '\[').replace(']', '\]')))
-            pattern_module = re.compile(r'\b({0})\s+failed\b'.format(module_name.replace('[', '\[').replace(']', '\]')))
-            patterns = [pattern_testcase, pattern_testclass, pattern_module]
-            found_bug = find_bug_for_failure(failure, patterns=patterns, bugs=bugs)
+            # look for bugs with "<key> failed" in the summary for the testcase, test class and module
+            keys = [search_key_exact, failure.get('test_class'), module_name]
+            found_bug = find_bug_for_failure(failure, keys=keys, bug_index=bug_index)
             if found_bug is not None:
                 bugs_reproduced.append(found_bug)
 
     android_version = get_version_from_pname(pname=project_name)
     open_bugs = []
     bugs_not_reproduced = []
+    bug_ids_reproduced = set([bug.id for bug in bugs_reproduced])
     for bug in bugs:
         if bug.status == 'VERIFIED' or (bug.status == 'RESOLVED' and bug.resolution != 'WONTFIX'):
             continue
         if bug.version != android_version:
             continue
-        if bug in bugs_reproduced:
+        if bug.id in bug_ids_reproduced:
             open_bugs.append(bug)
         else:
             bugs_not_reproduced.append(bug)
@@ -2147,6 +2845,8 @@ def file_bug(request):
             bug.keywords = cd['keywords']
 
             bug_id = bugzilla_instance.post_bug(bug).id
+            # so that the new bug is listed soon
+            bug_store.mark_bugs_stale()
             bug_info = {
                            'bugzilla_show_bug_prefix': bugzilla_show_bug_prefix,
                            'bug_id': bug_id,
@@ -2223,7 +2923,8 @@ def file_bug(request):
             class_method = test_name.split('#')
             with zipfile.ZipFile(result_zip_path, 'r') as f_zip_fd:
                 try:
-                    root = ET.fromstring(remove_xml_unsupport_character(f_zip_fd.read(TEST_RESULT_XML_NAME).decode('utf-8')))
+                    with f_zip_fd.open(TEST_RESULT_XML_NAME) as f_result_fd:
+                        root = ET.parse(XmlCharRefFilter(f_result_fd)).getroot()
                     for elem in root.findall('.//Module[@name="%s"]' %(module_name)):
                         abi = elem.attrib['abi']
                         stacktrace_node = elem.find('.//TestCase[@name="%s"]/Test[@name="%s"]/Failure/StackTrace' %(class_method[0], class_method[1]))
@@ -2374,6 +3075,7 @@ def resubmit_job(request):
                 db_report_build = ReportBuild.objects.get(version=qa_build.get('version'), qa_project=db_reportproject)
                 db_report_build.status = 'JOBSINPROGRESS'
                 db_report_build.save()
+                update_project_snapshot_for_build(db_report_build)
 
                 if db_report_build.kernel_change:
                     db_report_build.kernel_change.reported = False
@@ -3027,6 +3729,230 @@ def new_build(request, branch, describe, name, number):
                             status=200)
 
 
+# qa-report job ids with the ingestion queued but not finished yet when INGEST_QUEUE_ENABLED is False,
+# so that the same job is not ingested twice when the callback is sent more than once
+queued_qa_job_ids = set()
+queued_qa_job_ids_lock = threading.Lock()
+
+
+def ingest_finished_job(qa_job_id, qa_job=None, fetch_latest=True):
+    '''
+        Cache the job to database and save its results, called when the job is finished.
+        qa-report is asked to fetch the job from LAVA when it does not have the result yet,
+        then the job is ingested when qa-report calls back after fetching it.
+        qa_job: the job from qa-report, it's fetched with qa_job_id when not specified
+        An exception is raised when the results of the job failed to be saved
+    '''
+    if qa_job is None:
+        qa_job = qa_report_api.get_job_with_id(qa_job_id)
+    if not qa_job.get('external_url'):
+        logger.info("job %s is not submitted to lava yet" % qa_job_id)
+        return None
+
+    if not qa_job.get('job_status') or qa_job.get('job_status') == 'Submitted' \
+            or qa_job.get('job_status') == 'Running':
+        res = qa_report_api.fetchjob(qa_job_id)
+        logger.info("Tried to fetch job with res.status_code=%s: %s" % (res.status_code, qa_job_id))
+        return None
+
+    ingest_summaries = download_attachments_save_result(jobs=[qa_job], fetch_latest=fetch_latest, workers=1)
+    db_report_job = ReportJob.objects.filter(job_url=qa_job.get('external_url')).select_related('report_build').order_by('id').first()
+    if db_report_job is not None and db_report_job.report_build is not None:
+        update_project_snapshot_for_build(db_report_job.report_build)
+
+    for summary in ingest_summaries:
+        if summary.get('result') == 'failed':
+            raise Exception("Failed to ingest job %s: %s" % (summary.get('job_url'), summary.get('error')))
+    return ingest_summaries
+
+
+def ingest_queued_task(task):
+    '''
+        Run by the runingestworkers command for the IngestTask claimed
+    '''
+    qa_job = task.job
+    if qa_job is None:
+        # queued by the callback with only the qa-report job id
+        qa_job = qa_report_api.get_job_with_id(task.qa_job_id)
+        if qa_job.get('external_url') and not ingest_queue.set_task_job_url(task, qa_job):
+            raise Exception("Task %s is not claimed by %s any more" % (task.id, task.claimed_by))
+    return ingest_finished_job(task.qa_job_id, qa_job=qa_job, fetch_latest=task.fetch_latest)
+
+
+def ingest_submitted_job(qa_job_id):
+    try:
+        return ingest_finished_job(qa_job_id)
+    finally:
+        with queued_qa_job_ids_lock:
+            queued_qa_job_ids.discard(str(qa_job_id))
+
+
+def queue_job_ingestion(qa_job_id):
+    '''
+        Queue the job to be ingested by the runingestworkers command,
+        or by the shared task executor when INGEST_QUEUE_ENABLED is False.
+        Return False if the ingestion of the job is queued already
+    '''
+    if INGEST_QUEUE_ENABLED:
+        return ingest_queue.enqueue_qa_job(qa_job_id, priority=ingest_queue.PRIORITY_CALLBACK)
+
+    with queued_qa_job_ids_lock:
+        if str(qa_job_id) in queued_qa_job_ids:
+            return False
+        queued_qa_job_ids.add(str(qa_job_id))
+    submit_task(ingest_submitted_job, qa_job_id, name='ingest_submitted_job')
+    return True
+
+
+@csrf_exempt
+def job_finished(request, qa_job_id):
+    '''
+        Callback for qa-report when the testjob is finished,
+        the job is ingested in the background, instead of waiting for the lkftreport cron job
+    '''
+    remote_addr = request.META.get("REMOTE_ADDR")
+    remote_host = request.META.get("REMOTE_HOST")
+    logger.info('request from remote_host=%s,remote_addr=%s' % (remote_host, remote_addr))
+    logger.info('request for finished job qa_job_id=%s' % qa_job_id)
+
+    if not queue_job_ingestion(qa_job_id):
+        err_msg = 'ingestion of job %s is already queued' % qa_job_id
+        logger.info(err_msg)
+        return HttpResponse("ERROR:%s" % err_msg, status=200)
+
+    return HttpResponse(status=200)
+
+
+@csrf_exempt
+def lava_job_finished(request, lava_nick, lava_job_id):
+    '''
+        Callback for the LAVA notification of the job, the job is found with the job url,
+        so it only works for the jobs that have been cached to database
+    '''
+    remote_addr = request.META.get("REMOTE_ADDR")
+    remote_host = request.META.get("REMOTE_HOST")
+    logger.info('request from remote_host=%s,remote_addr=%s' % (remote_host, remote_addr))
+    logger.info('request for finished lava job lava_nick=%s, lava_job_id=%s' % (lava_nick, lava_job_id))
+
+    lava_config = LAVA_SERVERS.get(lava_nick)
+    if lava_config is None:
+        err_msg = 'lava server %s is not supported' % lava_nick
+        logger.info(err_msg)
+        return HttpResponse("ERROR:%s" % err_msg, status=200)
+
+    job_url = "https://%s/scheduler/job/%s" % (lava_config.get('hostname'), lava_job_id)
+    qa_job_id = ReportJob.objects.filter(job_url=job_url).order_by('id').values_list('qa_job_id', flat=True).first()
+    if not qa_job_id:
+        err_msg = 'job %s is not cached yet' % job_url
+        logger.info(err_msg)
+        return HttpResponse("ERROR:%s" % err_msg, status=200)
+
+    if not queue_job_ingestion(qa_job_id):
+        err_msg = 'ingestion of job %s is already queued' % job_url
+        logger.info(err_msg)
+        return HttpResponse("ERROR:%s" % err_msg, status=200)
+
+    return HttpResponse(status=200)
+
+
+def get_build_for_comparison(build_id, user):
+    '''
+        Return the build, project and ReportBuild record for the build to be compared,
+        or None when the user has no permission to access the project
+    '''
+    build, db_report_build = get_build_from_database_or_qareport(build_id)
+    project_id = build.get('project').strip('/').split('/')[-1]
+    project, db_reportproject = get_project_from_database_or_qareport(project_id)
+    if not is_project_accessible(project_full_name=project.get('full_name'), user=user, is_public=project.get('is_public')):
+        return None
+
+    # the jobs are fetched from qa-report and cached when none is cached for the build yet,
+    # so that the jobs not ingested are counted for the builds not checked before
+    get_jobs_for_build_from_db_or_qareport(build_id=build_id)
+    # the results of these jobs are not in database yet, so not compared
+    report_jobs = ReportJob.objects.filter(report_build=db_report_build, resubmitted=False)
+    return {
+        'build': build,
+        'project': project,
+        'db_report_build': db_report_build,
+        'jobs_total': report_jobs.count(),
+        'jobs_not_ingested': report_jobs.filter(results_cached=False).count(),
+        }
+
+
+def get_builds_comparison(request):
+    '''
+        Compare the failures of the builds specified by base_build_id and target_build_id,
+        with the test results saved in database only, see regressions.compare_builds.
+        Return None when the user has no permission to access either of the projects
+    '''
+    base_build_id = request.GET.get('base_build_id', None)
+    target_build_id = request.GET.get('target_build_id', None)
+
+    base = get_build_for_comparison(base_build_id, request.user)
+    target = get_build_for_comparison(target_build_id, request.user)
+    if base is None or target is None:
+        return None
+
+    comparison = regressions.compare_builds(base.get('db_report_build'), target.get('db_report_build'))
+    return {
+        'base': base,
+        'target': target,
+        'regressions': comparison.get('regressions'),
+        'fixes': comparison.get('fixes'),
+        'persistent': comparison.get('persistent'),
+        }
+
+
+COMPARE_BUILDS_PARAMETERS_ERROR = "Both base_build_id and target_build_id need to be specified as qa-report build ids"
+
+
+def has_compare_builds_parameters(request):
+    for parameter in ('base_build_id', 'target_build_id'):
+        if not request.GET.get(parameter, '').isdigit():
+            return False
+    return True
+
+
+def compare_builds(request):
+    if not has_compare_builds_parameters(request):
+        return HttpResponseBadRequest(COMPARE_BUILDS_PARAMETERS_ERROR)
+
+    comparison = get_builds_comparison(request)
+    if comparison is None:
+        # the current user has no permission to access the project
+        return render(request, '401.html', status=401)
+
+    return render(request, 'lkft-compare-builds.html', comparison)
+
+
+def compare_builds_api(request):
+    if not has_compare_builds_parameters(request):
+        return JsonResponse({'error': COMPARE_BUILDS_PARAMETERS_ERROR}, status=400)
+
+    comparison = get_builds_comparison(request)
+    if comparison is None:
+        return JsonResponse({'error': 'no permission to access the projects of the builds'}, status=401)
+
+    def get_build_info(build_comparison):
+        build = build_comparison.get('build')
+        return {
+            'build_id': build.get('id'),
+            'version': build.get('version'),
+            'project': build_comparison.get('project').get('full_name'),
+            'jobs_total': build_comparison.get('jobs_total'),
+            'jobs_not_ingested': build_comparison.get('jobs_not_ingested'),
+            }
+
+    return JsonResponse({
+        'base': get_build_info(comparison.get('base')),
+        'target': get_build_info(comparison.get('target')),
+        'regressions': comparison.get('regressions'),
+        'fixes': comparison.get('fixes'),
+        'persistent': comparison.get('persistent'),
+        })
+
+
 def get_ci_build_info(build_name, build_number):
     ci_build_url = jenkins_api.get_job_url(name=build_name, number=build_number)
     try:
@@ -3391,16 +4317,13 @@ def list_branch_kernel_changes(request, branch):
             )
 
 
+androidreportconfig_url = "https://gitlab.com/Linaro/Android-Testing/squad-report/-/raw/master/squad_report/androidreportconfig.py"
+androidreportconfig_remote_module = RemoteModule("androidreportconfig", androidreportconfig_url,
+                                                 ANDROIDREPORTCONFIG_CACHE_PATH, ttl=ANDROIDREPORTCONFIG_TTL)
+
+
 def get_androidreportconfig_module():
-    module_name = "androidreportconfig"
-    androidreportconfig_url = "https://gitlab.com/Linaro/Android-Testing/squad-report/-/raw/master/squad_report/androidreportconfig.py"
-    androidreportconfig_src = download_url_content(androidreportconfig_url)
-    androidreportconfig_obj = compile(androidreportconfig_src, module_name, 'exec')
-    import imp
-    androidreportconfig = imp.new_module(module_name)
-    exec(androidreportconfig_obj, androidreportconfig.__dict__)
-    # not sure what will happen if androidreportconfig_src is ""
-    return androidreportconfig
+    return androidreportconfig_remote_module.get_module()
 
 
 def fetch_data_for_describe_kernelchange(branch=None, describe=None, fetch_latest_from_qa_report=False):
@@ -4061,6 +4984,12 @@ def list_projects_simple(request):
             # },
         ]
 
+    if not fetch_latest_from_qa_report:
+        # projects of all the groups with one query
+        group_db_report_projects = {}
+        for db_project in get_projects_with_snapshot(groups=[group.get('group_name') for group in groups]):
+            group_db_report_projects.setdefault(db_project.group, []).append(db_project)
+
     for group in groups:
         group_id = group.get('group_id')
         group_name = group.get('group_name')
@@ -4073,8 +5002,7 @@ def list_projects_simple(request):
             for target_project in projects:
                 cache_qaproject_to_database(target_project)
         else:
-            db_report_projects = ReportProject.objects.filter(group=group_name)
-            for db_project in db_report_projects:
+            for db_project in group_db_report_projects.get(group_name, []):
                 project = {
                             'full_name': qa_report_api.get_project_full_name_with_group_and_slug(group_name, db_project.slug),
                             'name': db_project.name,
@@ -4082,6 +5010,8 @@ def list_projects_simple(request):
                             'id': db_project.project_id,
                             'is_public': db_project.is_public,
                             'is_archived': db_project.is_archived,
+                            'last_build_status': db_project.snapshot.status,
+                            'numbers': db_project.snapshot.numbers,
                             }
                 projects.append(project)
 
@@ -4269,6 +5199,15 @@ def matrix(request):
         # }
     }
 
+    # numbers of the last build for all the projects with one query
+    project_numbers = {}
+    for db_report_project in get_projects_with_snapshot():
+        snapshot = db_report_project.snapshot
+        key = (db_report_project.group, db_report_project.name)
+        if key in project_numbers and (project_numbers[key][0] or 0) >= (snapshot.last_qa_build_id or 0):
+            continue
+        project_numbers[key] = (snapshot.last_qa_build_id, snapshot.numbers)
+
     android_os_projects_total = {}
     for branch, project_alias_names in supported_kernels.items():
         android_os_projects_branch = matrix_data.get(branch, None)
@@ -4286,14 +5225,10 @@ def matrix(request):
                 projects = []
                 android_os_projects_branch[android_version] = projects
 
-            db_report_builds = ReportBuild.objects.filter(qa_project__group=project_alias.get('group'), qa_project__name=project_alias.get('slug')).order_by('-qa_build_id')
             project_alias['numbers'] = qa_report.TestNumbers()
-            if len(db_report_builds) > 0:
-                db_report_build = db_report_builds[0]
-                project_alias['numbers'] = qa_report.TestNumbers().addWithDatabaseRecord(db_report_build)
-            if len(db_report_builds) > 1:
-                db_report_build_previous = db_report_builds[1]
-                project_alias['numbers'].number_regressions = project_alias['numbers'].number_failed - db_report_build_previous.number_failed
+            (last_qa_build_id, numbers) = project_numbers.get((project_alias.get('group'), project_alias.get('slug')), (None, None))
+            if last_qa_build_id is not None:
+                project_alias['numbers'] = qa_report.TestNumbers().addWithHash(numbers)
 
             if not project_alias in projects:
                 projects.append(project_alias)